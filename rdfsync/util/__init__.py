@@ -1,3 +1,4 @@
 from .namespace_constants import default_rdf_namespaces
 
 from .string_util import get_namespace, get_triple_predicate_str, get_triple_subject_str, StringValidationError
+from .cache import LRUCache
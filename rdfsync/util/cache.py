@@ -0,0 +1,95 @@
+""" Least recently used cache with an optional time to live, used to memoize the requests to wikibase"""
+from collections import OrderedDict
+import threading
+import time
+
+
+class LRUCache:
+    """
+    dictionary that keeps up to max_size entries, evicting the least recently used one when full.
+    entries older than ttl seconds are expired when they are read.
+    the number of hits, misses, evictions and expirations is kept in stats.
+    """
+
+    def __init__(self, max_size=10000, ttl=None, clock=time.monotonic):
+        """
+
+        Parameters
+        ----------
+        max_size: maximum number of entries
+        ttl: seconds after which an entry expires, never if None
+        clock: function that returns the current time in seconds
+        """
+        if max_size < 1:
+            raise ValueError("size of the cache must be 1 or higher")
+        if ttl is not None and ttl <= 0:
+            raise ValueError("time to live of the cache must be positive")
+        self.max_size = max_size
+        self.ttl = ttl
+        self.clock = clock
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0}
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """
+
+        Parameters
+        ----------
+        key: key of the entry
+        default: value returned if the key is not cached or expired
+
+        Returns
+        -------
+        the cached value of the key, or the default
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl is not None and self.clock() - entry[1] > self.ttl:
+                del self._entries[key]
+                self.stats['expirations'] += 1
+                entry = None
+            if entry is None:
+                self.stats['misses'] += 1
+                return default
+            self._entries.move_to_end(key)
+            self.stats['hits'] += 1
+            return entry[0]
+
+    def put(self, key, value):
+        """
+        caches the value of a key, evicting the least recently used entry if the cache is full
+        """
+        with self._lock:
+            self._entries[key] = (value, self.clock())
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.stats['evictions'] += 1
+
+    def invalidate(self, key):
+        """
+        removes the entry of a key, if it is cached
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        """
+        removes every entry, keeping the stats
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def hit_rate(self):
+        """
+
+        Returns
+        -------
+        fraction of the reads that were hits, 0 if there were none
+        """
+        reads = self.stats['hits'] + self.stats['misses']
+        return self.stats['hits'] / reads if reads else 0.0
+
+    def __len__(self):
+        return len(self._entries)
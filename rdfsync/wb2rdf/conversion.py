@@ -6,6 +6,7 @@ from rdfsync.util.string_util import get_namespace, get_triple_predicate_str, ge
 from rdflib import URIRef, Literal
 import xml.etree.ElementTree as ET
 from rdfsync.util.namespace_constants import default_rdf_namespaces
+from rdfsync.util.cache import LRUCache
 import logging
 from rdflib.namespace import XSD
 
@@ -15,6 +16,63 @@ logger = logging.getLogger("conversion")
 # constants
 SAME_AS_LABEL = 'same as'
 RELATED_LINK_LABEL = 'related link'
+# maximum number of ids of a wbgetentities request
+MAX_IDS_PER_REQUEST = 50
+wb_id_regex = re.compile(r'[QP]\d+')
+# marks the values not found in a cache, as None is a valid value
+_MISSING = object()
+
+
+class EntitySnapshot:
+    """
+    labels, descriptions and claims of a wikibase item or property, with the english labels and related links they
+    reference, fetched once and shared by every step of its synchronization
+    """
+
+    def __init__(self, wb_id, entity, property_labels, related_links):
+        """
+
+        Parameters
+        ----------
+        wb_id: item or property ID
+        entity: json of the entity, with its labels, descriptions and claims
+        property_labels: english label of each property of the claims
+        related_links: related link of the entity and of the properties and values of its claims
+        """
+        self.wb_id = wb_id
+        self.labels = get_language_value_dictionary(entity.get('labels', {}))
+        self.descriptions = get_language_value_dictionary(entity.get('descriptions', {}))
+        self.claims = entity.get('claims', {})
+        self.property_labels = property_labels
+        self.related_links = related_links
+
+    @property
+    def related_link(self):
+        """
+        related link of the entity, '' if it has none
+        """
+        return self.related_links.get(self.wb_id, '')
+
+    def get_claims(self):
+        """
+
+        Returns
+        -------
+        the properties of the claims, without related link and same as
+        """
+        return [wb_property for wb_property in self.claims
+                if self.property_labels.get(wb_property) not in [RELATED_LINK_LABEL, SAME_AS_LABEL]]
+
+    def get_related_link_of_values_of_claims(self):
+        """
+
+        Returns
+        -------
+        a dictionary consisting of related link of the claims as keys and the claim values as values
+        """
+        return {self.related_links[wb_property]: [self.related_links[get_value_of_statement(statement)]
+                                                  for statement in self.claims[wb_property]]
+                for wb_property in self.get_claims()}
 
 
 class Converter:
@@ -23,7 +81,8 @@ class Converter:
     graph = ''
     preferred_format = ''
 
-    def __init__(self, endpoint: str, day_num=100, input_format='ttl', graph=Graph()):
+    def __init__(self, endpoint: str, day_num=100, input_format='ttl', graph=Graph(), cache_size=10000,
+                 cache_ttl=None):
         """
 
         Parameters
@@ -32,6 +91,8 @@ class Converter:
         day_num: number of days of last change in order to fetch the items changed
         input_format: rdf format: "xml", "n3", "turtle", "nt", "pretty-xml", "trix", "trig" and "nquads"
         graph: RDFLIB Graph()
+        cache_size: maximum number of entities, labels and related links kept in the caches of the run
+        cache_ttl: seconds after which the cached data of the wikibase is fetched again, never if None
         """
         # checks
         if day_num < 1:
@@ -43,6 +104,29 @@ class Converter:
         self.number_of_days = day_num
         self.graph = graph
         self.preferred_format = input_format
+        # caches shared by every synchronization of the run
+        self.entity_cache = LRUCache(cache_size, cache_ttl)
+        self.label_cache = LRUCache(cache_size, cache_ttl)
+        self.related_link_cache = LRUCache(cache_size, cache_ttl)
+
+    def cache_stats(self):
+        """
+
+        Returns
+        -------
+        dictionary with the hits, misses, evictions and expirations of the caches of entities, labels and
+        related links
+        """
+        return {'entities': dict(self.entity_cache.stats), 'labels': dict(self.label_cache.stats),
+                'related_links': dict(self.related_link_cache.stats)}
+
+    def clear_caches(self):
+        """
+        empties the caches, so the next synchronization fetches the wikibase data again
+        """
+        self.entity_cache.clear()
+        self.label_cache.clear()
+        self.related_link_cache.clear()
 
     def get_params_of_wbfeedrecentchanges(self):
         """
@@ -59,16 +143,17 @@ class Converter:
         return params
 
     @staticmethod
-    def get_params_of_wbgetentities(wb_id):
+    def get_params_of_wbgetentities(wb_id, props=None):
         """
 
         Parameters
         ----------
-        wb_id id of wikibase item or property
+        wb_id id of wikibase item or property, or several ids separated by '|'
+        props: parts of the entities to fetch separated by '|', like 'labels|claims'. all of them if None
 
         Returns
         -------
-        parameters of wbgetentities from api: action, format and ids ( id of item and property)
+        parameters of wbgetentities from api: action, format, ids ( id of item and property) and props
 
         """
         params = {
@@ -76,6 +161,8 @@ class Converter:
             'format': 'json',
             'ids': wb_id
         }
+        if props is not None:
+            params['props'] = props
         return params
 
     @staticmethod
@@ -148,6 +235,75 @@ class Converter:
         """
         return requests.get(self.API_ENDPOINT, params=self.get_params_of_wbgetentities(wb_id))
 
+    def wbgetentities(self, wb_ids, props=None, refresh=False):
+        """
+        fetches several entities with wbgetentities requests of up to MAX_IDS_PER_REQUEST ids.
+        the parts of the entities already in the cache are not fetched again, unless refresh is set.
+        entities that don't exist are returned with the 'missing' key, as the API gives them
+
+        Parameters
+        ----------
+        wb_ids: ids of wikibase items or properties
+        props: parts of the entities to fetch separated by '|', like 'labels|claims'. all of them if None
+        refresh: fetch the entities even if they are cached
+
+        Returns
+        -------
+        dictionary of the json of each entity by id
+
+        Raises
+        ------
+        ValueError: if the API answers with an error or without entities
+        """
+        ids = list(dict.fromkeys(wb_ids))
+        parts = props.split('|') if props is not None else []
+        entities = dict()
+        missing = []
+        for wb_id in ids:
+            entity = {part: self.entity_cache.get((wb_id, part), _MISSING) for part in parts}
+            if refresh or not parts or any(value is _MISSING for value in entity.values()):
+                missing.append(wb_id)
+            else:
+                entities[wb_id] = entity
+        for i in range(0, len(missing), MAX_IDS_PER_REQUEST):
+            params = self.get_params_of_wbgetentities('|'.join(missing[i:i + MAX_IDS_PER_REQUEST]), props)
+            data = requests.get(self.API_ENDPOINT, params=params).json()
+            if 'error' in data or 'entities' not in data:
+                error = data.get('error', {})
+                logger.error('wbgetentities of <' + params['ids'] + '> failed: ' + str(error.get('info', data)))
+                raise ValueError("wbgetentities failed: " + str(error.get('code', 'no entities in the response')))
+            for wb_id, entity in data['entities'].items():
+                # redirected ids are answered with the entity they redirect to
+                wb_id = entity.get('redirects', {}).get('from', wb_id)
+                for part in parts:
+                    self.entity_cache.put((wb_id, part), entity.get(part, {}))
+                entities[wb_id] = entity
+        return entities
+
+    def get_english_labels(self, wb_ids):
+        """
+
+        Parameters
+        ----------
+        wb_ids: ids of wikibase items or properties
+
+        Returns
+        -------
+        dictionary of the english label of each id, None if it has no english label
+        """
+        labels = dict()
+        missing = []
+        for wb_id in wb_ids:
+            label = self.label_cache.get(wb_id, _MISSING)
+            if label is _MISSING:
+                missing.append(wb_id)
+            else:
+                labels[wb_id] = label
+        for wb_id, entity in self.wbgetentities(missing, 'labels').items():
+            labels[wb_id] = get_english_label(entity)
+            self.label_cache.put(wb_id, labels[wb_id])
+        return labels
+
     def wbgetclaims(self, wb_id):
         """
 
@@ -160,14 +316,29 @@ class Converter:
         response of wbgetclaims transformed to a list of claims
 
         """
-        claims = []
-        data = requests.get(self.API_ENDPOINT, params=self.get_params_of_wbgetclaims(wb_id))
-        for wb_property in data.json()['claims']:
-            data = self.wbgetentity(wb_property)
-            if self.get_labels_of_item_or_property(data, wb_property)['en']['value'] not in [RELATED_LINK_LABEL,
-                                                                                             SAME_AS_LABEL]:
-                claims.append(wb_property)
-        return claims
+        return self.get_entity_snapshot(wb_id).get_claims()
+
+    def get_entity_snapshot(self, wb_id):
+        """
+        fetches an item or property with the english labels of its properties and the related links of the entity
+        and of the properties and values of its claims, in as few requests as possible
+
+        Parameters
+        ----------
+        wb_id: item or property ID
+
+        Returns
+        -------
+        EntitySnapshot of the item or property
+        """
+        # the synchronized entity is always fetched, so its changes since the last sync are seen
+        entity = self.wbgetentities([wb_id], 'labels|descriptions|claims', refresh=True).get(wb_id, {})
+        claims = entity.get('claims', {})
+        values = [get_value_of_statement(statement) for statements in claims.values() for statement in statements]
+        # the entity was just cached, so only its properties and values are fetched
+        self.related_link_cache.invalidate(wb_id)
+        related_links = self.get_related_links([wb_id] + list(claims) + values)
+        return EntitySnapshot(wb_id, entity, self.get_english_labels(claims), related_links)
 
     def wbfeedrecentchanges(self):
         """
@@ -195,15 +366,7 @@ class Converter:
         -------
         dictionary of language and the value of a label or description
         """
-        language_value_dict = dict()
-        request = self.wbgetentity(wb_id)
-        data = request.json()['entities'][wb_id][information]
-        for lang in data:
-            def_lang = lang
-            if str(lang) == str('es-formal'):
-                def_lang = 'es'
-            language_value_dict[def_lang] = data[lang]['value']
-        return language_value_dict
+        return get_language_value_dictionary(self.wbgetentities([wb_id], information)[wb_id][information])
 
     @staticmethod
     def get_information_of_item_or_property(request, wb_id, information):
@@ -246,15 +409,53 @@ class Converter:
         -------
         related link of wb_id
         """
-        if re.match(r'([QP])\d+\b', wb_id) is None:
-            return str(wb_id)  # it is not a wikibase item or property
-        rl = ''
-        data = requests.get(self.API_ENDPOINT, params=self.get_params_of_wbgetclaims(wb_id))
-        for wb_property in data.json()['claims']:
-            req = self.wbgetentity(wb_property)
-            if self.get_labels_of_item_or_property(req, wb_property)['en']['value'] == RELATED_LINK_LABEL:
-                rl = data.json()['claims'][wb_property][0]['mainsnak']['datavalue']['value']
-        return rl
+        return self.get_related_links([wb_id])[wb_id]
+
+    def get_related_links(self, wb_ids):
+        """
+        resolves the related links of several items or properties at once: their claims are fetched in batches,
+        and then the labels of the properties of those claims. the related links and labels are cached for the run
+
+        Parameters
+        ----------
+        wb_ids: item or prop IDs. values that are not IDs are their own related link
+
+        Returns
+        -------
+        dictionary of the related link of each id, '' if it has none or it doesn't exist
+        """
+        related_links = dict()
+        to_resolve = []
+        for wb_id in dict.fromkeys(wb_ids):
+            if wb_id_regex.fullmatch(str(wb_id)) is None:
+                related_links[wb_id] = str(wb_id)  # it is not a wikibase item or property
+                continue
+            rl = self.related_link_cache.get(wb_id, _MISSING)
+            if rl is _MISSING:
+                to_resolve.append(wb_id)
+            else:
+                related_links[wb_id] = rl
+        if not to_resolve:
+            return related_links
+
+        entities = self.wbgetentities(to_resolve, 'labels|claims')
+        for wb_id, entity in entities.items():
+            self.label_cache.put(wb_id, get_english_label(entity))
+        claims = {wb_id: entity.get('claims', {}) for wb_id, entity in entities.items()}
+        labels = self.get_english_labels({wb_property for claims_of_entity in claims.values()
+                                          for wb_property in claims_of_entity})
+        for wb_id in to_resolve:
+            rl = ''
+            for wb_property, statements in claims.get(wb_id, {}).items():
+                if labels.get(wb_property) == RELATED_LINK_LABEL:
+                    rl = statements[0]['mainsnak']['datavalue']['value']
+            related_links[wb_id] = rl
+            # only the related links of the entities in the response are known
+            if wb_id in entities:
+                self.related_link_cache.put(wb_id, rl)
+            else:
+                logger.warning('wbgetentities did not return <' + wb_id + '>')
+        return related_links
 
     def get_related_link_of_values_of_a_claim_in_wb(self, claim_id):
         """
@@ -267,27 +468,7 @@ class Converter:
         -------
         a dictionary consisting of related link of the claims as keys and the claim values as values
         """
-        claim_with_its_values = dict()
-        data = requests.get(self.API_ENDPOINT, params=self.get_params_of_wbgetclaims(claim_id))
-        for wb_property in data.json()['claims']:
-            req = self.wbgetentity(wb_property)
-            rl_of_claim = self.get_related_link_of_a_wb_item_or_property(wb_property)
-            if self.get_labels_of_item_or_property(req, wb_property)['en']['value'] != RELATED_LINK_LABEL and \
-                    self.get_labels_of_item_or_property(req, wb_property)['en']['value'] != SAME_AS_LABEL:
-                index = 0
-                rl_claim_values = []
-                while index < len(data.json()['claims'][wb_property]):
-                    link = ""
-                    try:
-                        link = self.get_related_link_of_a_wb_item_or_property(
-                            data.json()['claims'][wb_property][index]['mainsnak']['datavalue']['value']['id'])
-                    except TypeError:
-                        link = self.get_related_link_of_a_wb_item_or_property(
-                            data.json()['claims'][wb_property][index]['mainsnak']['datavalue']['value'])
-                    rl_claim_values.append(link)
-                    index += 1
-                claim_with_its_values[rl_of_claim] = rl_claim_values
-        return claim_with_its_values
+        return self.get_entity_snapshot(claim_id).get_related_link_of_values_of_claims()
 
     def execute_synchronization(self, wb_id: str):
         """
@@ -304,14 +485,16 @@ class Converter:
         -------
         the resulting rdf graph
         """
-        if re.match(r'([QP])\d+\b', wb_id) is None:
+        if wb_id_regex.fullmatch(str(wb_id)) is None:
             logger.error("wrong id of wikibase Item or Property")
             raise ValueError("wrong id of wikibase Item or Property")
 
         logger.warning('Sync in the wikibase <' + self.API_ENDPOINT + '>.')
         pattern = re.compile(r'\s+')  # no spaces
+        # the wikibase data of the subject is fetched once and shared by every step
+        snapshot = self.get_entity_snapshot(wb_id)
         # subject info
-        subject_rl = self.get_related_link_of_a_wb_item_or_property(wb_id)
+        subject_rl = snapshot.related_link
         subject_name = re.sub(pattern, '', get_triple_subject_str(subject_rl))
         # name check
         if not subject_rl:
@@ -338,27 +521,25 @@ class Converter:
         bnodes_of_wb = dict()
 
         # _______________________ SUBJECT RDF DATA ____________________#
-        # getting the predicates and objects in the graph for the subject searched
-        for subject, predicate, rdf_object in self.graph:
-            if str(subject) == str(subject_rl):
-                # checking if the subject really exists in rdf file
-                subjects_check.append(str(subject))
-
-                # labels and comments ( label and description in wb)
-                if str(get_triple_predicate_str(predicate)) == 'label':
-                    language_of_label = repr(rdf_object).split("lang='")[1].split("')")[0]
-                    labels_of_subject_rdf[language_of_label] = str(rdf_object)
-                elif str(get_triple_predicate_str(predicate)) == 'comment':
-                    language_of_descr = repr(rdf_object).split("lang='")[1].split("')")[0]
-                    descriptions_of_subject_rdf[language_of_descr] = str(rdf_object)
-                else:
-                    predicates_of_subject.append(str(predicate))
-                    objects = []
-                    # if key already exists, we append the objects
-                    if str(predicate) in predicate_and_object_dictionary:
-                        objects = predicate_and_object_dictionary[str(predicate)]
-                    objects.append(rdf_object)
-                    predicate_and_object_dictionary[str(predicate)] = objects
+        # getting the predicates and objects in the graph for the subject searched, through the subject index of
+        # the graph, so the cost doesn't depend on the size of the graph
+        for predicate, rdf_object in self.graph.predicate_objects(URIRef(subject_rl)):
+            # checking if the subject really exists in rdf file
+            subjects_check.append(str(subject_rl))
+
+            # labels and comments ( label and description in wb)
+            if str(get_triple_predicate_str(predicate)) == 'label':
+                labels_of_subject_rdf[get_language_of_literal(rdf_object)] = str(rdf_object)
+            elif str(get_triple_predicate_str(predicate)) == 'comment':
+                descriptions_of_subject_rdf[get_language_of_literal(rdf_object)] = str(rdf_object)
+            else:
+                predicates_of_subject.append(str(predicate))
+                objects = []
+                # if key already exists, we append the objects
+                if str(predicate) in predicate_and_object_dictionary:
+                    objects = predicate_and_object_dictionary[str(predicate)]
+                objects.append(rdf_object)
+                predicate_and_object_dictionary[str(predicate)] = objects
 
         # _______________________                  ____________________#
         # _______________________ SEPARATING BNODES from NON BNODES in RDF ____________________#
@@ -382,9 +563,9 @@ class Converter:
 
         # _______________________ SUBJECT WIKIBASE DATA ____________________#
         # copying claims of item in wikibase
-        for claim in self.wbgetclaims(wb_id):
-            claims_of_wb_item.append(str(self.get_related_link_of_a_wb_item_or_property(claim)))
-        claim_and_value_dictionary = self.get_related_link_of_values_of_a_claim_in_wb(wb_id)
+        for claim in snapshot.get_claims():
+            claims_of_wb_item.append(str(snapshot.related_links[claim]))
+        claim_and_value_dictionary = snapshot.get_related_link_of_values_of_claims()
         # _______________________                  ____________________#
         # _______________________ SEPARATING BNODES from NON BNODES in RDF ____________________#
         cv_temp_dict = dict()
@@ -407,8 +588,8 @@ class Converter:
         # _______________________                  ____________________#
 
         # labels and descriptions
-        labels_of_subject_wb = self.get_information_of_item_or_property_as_dictionary(wb_id, 'labels')
-        descriptions_of_subject_wb = self.get_information_of_item_or_property_as_dictionary(wb_id, 'descriptions')
+        labels_of_subject_wb = snapshot.labels
+        descriptions_of_subject_wb = snapshot.descriptions
         # _______________________                  ____________________#
 
         # _______________________ SUBJECT EXISTS IN WB AND NOT RDF ____________________#
@@ -751,3 +932,68 @@ class Converter:
         request = self.wbsearchentities(label_to_search)
         item_id = request.json()['search'][0]['id']
         return item_id
+
+
+def get_english_label(entity):
+    """
+
+    Parameters
+    ----------
+    entity: json of a wikibase item or property
+
+    Returns
+    -------
+    the english label of the entity, None if it has none
+    """
+    return entity.get('labels', {}).get('en', {}).get('value')
+
+
+def get_value_of_statement(statement):
+    """
+
+    Parameters
+    ----------
+    statement: json of a claim of a wikibase item or property
+
+    Returns
+    -------
+    the id of the value if it is an item or property, otherwise the value as string
+    """
+    value = statement['mainsnak']['datavalue']['value']
+    if isinstance(value, dict):
+        return value['id'] if 'id' in value else str(value)
+    return value
+
+
+def get_language_value_dictionary(data):
+    """
+
+    Parameters
+    ----------
+    data: labels or descriptions of a wikibase item or property
+
+    Returns
+    -------
+    dictionary of language and the value of a label or description
+    """
+    language_value_dict = dict()
+    for lang in data:
+        def_lang = lang
+        if str(lang) == str('es-formal'):
+            def_lang = 'es'
+        language_value_dict[def_lang] = data[lang]['value']
+    return language_value_dict
+
+
+def get_language_of_literal(rdf_object):
+    """
+
+    Parameters
+    ----------
+    rdf_object: object of a triple
+
+    Returns
+    -------
+    the language tag of the object if it is a literal with language, otherwise None
+    """
+    return rdf_object.language if isinstance(rdf_object, Literal) else None
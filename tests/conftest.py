@@ -1,10 +1,16 @@
 from unittest import mock
 
 import pytest
+import threading
 from wikidataintegrator import wdi_core
 
+from wbsync.external.bootstrap_cache import BootstrapCache
 from wbsync.external.uri_factory import URIFactoryMock
 from wbsync.triplestore import WikibaseAdapter
+from wbsync.triplestore.edit_entity_writer import EditEntityWriter
+from wbsync.triplestore.entity_cache import EntityCache
+from wbsync.triplestore.transport import RequestsTransport
+from wbsync.util.literal_conversion import LiteralBatchConverter
 
 FACTORY = URIFactoryMock()
 
@@ -44,8 +50,20 @@ def mocked_adapter(id_generator):
         writer_mock.update = mock.MagicMock()
         adapter._local_item_engine = mock.MagicMock(return_value=writer_mock)
         adapter._local_login = mock.MagicMock()
+        adapter.api_url = ''
+        adapter._bootstrap_cache = BootstrapCache(path=None)
+        adapter._bootstrap_lock = threading.Lock()
+        adapter._bootstrap_invalidations = 0
         adapter._mappings_prop = mock.MagicMock()
         adapter._related_link_prop = mock.MagicMock()
         adapter._uri_set_for_sameas = set()
         adapter._uris_factory = URIFactoryMock()
+        adapter._creations_lock = threading.Lock()
+        adapter._creations = {}
+        adapter._literal_converter = LiteralBatchConverter()
+        adapter._entity_cache = EntityCache()
+        adapter._transport = RequestsTransport()
+        adapter._edit_writer = EditEntityWriter('', adapter._local_login, adapter._transport)
+        adapter._direct_writes = False
+        adapter._lightweight_term_edits = True
         yield adapter
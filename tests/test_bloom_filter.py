@@ -0,0 +1,123 @@
+from types import SimpleNamespace
+
+import pytest
+
+from wbsync.external.bloom_filter import BloomFilter, BloomFilterURIFactory
+from wbsync.external.uri_factory import InMemoryURIFactory, URIFactory
+from wbsync.util.error import InvalidArgumentError
+
+EXAMPLE = 'https://example.org/onto#'
+
+
+class CountingFactory(InMemoryURIFactory):
+
+    def __init__(self, uris=None):
+        super().__init__(uris)
+        self.lookups = 0
+
+    def get_uri(self, uriRef):
+        self.lookups += 1
+        return super().get_uri(uriRef)
+
+    def get_uris(self, uris):
+        uris = list(uris)
+        self.lookups += len(uris)
+        return super().get_uris(uris)
+
+
+def uri(name):
+    return SimpleNamespace(uri=EXAMPLE + name)
+
+
+def test_bloom_filter():
+    bloom = BloomFilter(1000, false_positive_rate=0.01)
+    for i in range(1000):
+        bloom.add(f'Concept{i}')
+    assert all(f'Concept{i}' in bloom for i in range(1000))
+    false_positives = sum(f'Other{i}' in bloom for i in range(10000))
+    assert false_positives < 300
+    assert len(bloom) == 1000 and bloom.expected_false_positive_rate() == pytest.approx(0.01, rel=0.2)
+
+    assert BloomFilter(1000000, max_bytes=1024).size_bytes == 1024
+    with pytest.raises(InvalidArgumentError):
+        BloomFilter(1000, false_positive_rate=1.5)
+
+
+def test_misses_are_answered_locally():
+    inner = CountingFactory({EXAMPLE + 'Person': 'Q1'})
+    factory = BloomFilterURIFactory(inner)
+    assert factory.get_uri(uri('Person')) == 'Q1'
+    assert factory.get_uri(uri('City')) is None
+    assert factory.get_uris([EXAMPLE + f'Concept{i}' for i in range(100)]) == {}
+    assert inner.lookups < 5
+
+    factory.post_uri(uri('City'), 'Q2')
+    factory.post_uris({EXAMPLE + 'Town': 'Q3'})
+    assert factory.get_uris([EXAMPLE + 'City', EXAMPLE + 'Town', EXAMPLE + 'Village']) == \
+        {EXAMPLE + 'City': 'Q2', EXAMPLE + 'Town': 'Q3'}
+    assert factory.stats['lookups'] == 105
+    assert factory.stats['filtered'] + factory.stats['false_positives'] + 3 == 105
+
+
+def test_filter_grows_with_the_uris():
+    inner = InMemoryURIFactory()
+    factory = BloomFilterURIFactory(inner, capacity=10)
+    factory.post_uris({EXAMPLE + f'Concept{i}': f'Q{i}' for i in range(100)})
+    assert len(factory._filters) == 1 and factory._filters[0].capacity >= 100
+    assert all(factory.get_uri(uri(f'Concept{i}')) == f'Q{i}' for i in range(100))
+    factory.reset_factory()
+    assert factory.get_uri(uri('Concept1')) is None and not inner.state
+
+
+def test_factories_without_known_uris():
+    class RemoteFactory(URIFactory):
+        def get_uri(self, uriRef):
+            return 'Q1'
+
+        def post_uri(self, uriRef, wb_uri):
+            pass
+
+    assert not RemoteFactory.enumerable
+    with pytest.raises(InvalidArgumentError):
+        BloomFilterURIFactory(RemoteFactory())
+    factory = BloomFilterURIFactory(RemoteFactory(), uris=[EXAMPLE + 'Person'])
+    assert factory.get_uri(uri('Person')) == 'Q1' and factory.get_uri(uri('City')) is None
+
+
+def test_filters_are_added_for_factories_without_known_uris():
+    class RemoteFactory(URIFactory):
+        def get_uri(self, uriRef):
+            return 'Q1'
+
+        def post_uri(self, uriRef, wb_uri):
+            pass
+
+    factory = BloomFilterURIFactory(RemoteFactory(), uris=[EXAMPLE + 'Person'], capacity=10)
+    factory.post_uris({EXAMPLE + f'Concept{i}': f'Q{i}' for i in range(1000)})
+    factory.post_uris({EXAMPLE + f'Term{i}': f'Q{i}' for i in range(5000)})
+    assert [len(bloom) for bloom in factory._filters] == [1, 1000, 5000]
+    assert all(len(bloom) <= bloom.capacity for bloom in factory._filters)
+    uris = [EXAMPLE + 'Person'] + [EXAMPLE + f'Concept{i}' for i in range(1000)] + \
+        [EXAMPLE + f'Term{i}' for i in range(5000)]
+    assert factory._might_contain(uris) == uris
+    false_positives = len(factory._might_contain([EXAMPLE + f'Other{i}' for i in range(10000)]))
+    assert false_positives < 500
+
+
+def test_uris_are_in_the_filter_before_they_are_posted():
+    in_filter = []
+
+    class ObservedFactory(InMemoryURIFactory):
+        def post_uri(self, uriRef, wb_uri):
+            in_filter.append(factory._might_contain([uriRef.uri]) == [uriRef.uri])
+            super().post_uri(uriRef, wb_uri)
+
+        def post_uris(self, uris):
+            in_filter.append(factory._might_contain(uris) == list(uris))
+            super().post_uris(uris)
+
+    factory = BloomFilterURIFactory(ObservedFactory())
+    factory.post_uri(uri('Person'), 'Q1')
+    factory.post_uris({EXAMPLE + 'City': 'Q2'})
+    assert in_filter == [True, True]
+    assert factory.enumerable
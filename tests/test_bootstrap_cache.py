@@ -0,0 +1,56 @@
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+
+from wbsync.external.bootstrap_cache import BootstrapCache
+
+API_URL = 'https://example.org/w/api.php'
+
+
+def test_ids_are_persisted_per_api_url(tmp_path):
+    path = str(tmp_path / 'bootstrap.json')
+    cache = BootstrapCache(path)
+    cache.set(API_URL, 'mappings_prop', 'P1')
+    cache.set('https://other.org/w/api.php', 'mappings_prop', 'P7')
+
+    cache = BootstrapCache(path)
+    assert cache.get(API_URL, 'mappings_prop') == 'P1'
+    assert cache.get(API_URL, 'related_link_prop') is None
+    assert cache.get('https://other.org/w/api.php', 'mappings_prop') == 'P7'
+
+
+def test_invalidate(tmp_path):
+    path = str(tmp_path / 'bootstrap.json')
+    cache = BootstrapCache(path)
+    cache.set(API_URL, 'mappings_prop', 'P1')
+    cache.invalidate(API_URL)
+    assert cache.get(API_URL, 'mappings_prop') is None
+    assert BootstrapCache(path).get(API_URL, 'mappings_prop') is None
+
+
+def test_unreadable_files_are_ignored(tmp_path):
+    path = tmp_path / 'bootstrap.json'
+    path.write_text('not json')
+    assert BootstrapCache(str(path)).get(API_URL, 'mappings_prop') is None
+
+
+def test_memory_only_cache():
+    cache = BootstrapCache(path=None)
+    cache.set(API_URL, 'mappings_prop', 'P1')
+    assert cache.get(API_URL, 'mappings_prop') == 'P1'
+
+
+def test_concurrent_dumps(tmp_path):
+    path = str(tmp_path / 'bootstrap.json')
+    caches = [BootstrapCache(path) for _ in range(8)]
+    barrier = threading.Barrier(len(caches))
+
+    def dump(i):
+        barrier.wait()
+        for _ in range(20):
+            caches[i].set(API_URL, 'mappings_prop', f'P{i}')
+
+    with ThreadPoolExecutor(max_workers=len(caches)) as executor:
+        list(executor.map(dump, range(len(caches))))
+    assert BootstrapCache(path).get(API_URL, 'mappings_prop') in {f'P{i}' for i in range(len(caches))}
+    assert [file.name for file in tmp_path.iterdir()] == ['bootstrap.json']
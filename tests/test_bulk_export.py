@@ -0,0 +1,82 @@
+import io
+import json
+
+from wbsync.external.uri_factory import URIFactory
+from wbsync.triplestore import BulkExportManager, LiteralElement, TripleInfo, URIElement
+from wbsync.util.uri_constants import RDFS_LABEL, SKOS_ALTLABEL, XSD_BASE
+
+EXAMPLE = 'https://example.org/onto#'
+
+
+class DictFactory(URIFactory):
+    def __init__(self, uris=None):
+        self.uris = dict(uris or {})
+
+    def get_uri(self, uriRef):
+        return self.uris.get(uriRef.uri)
+
+    def post_uri(self, uriRef, wb_uri):
+        self.uris[uriRef.uri] = wb_uri
+
+
+def triple(subject, predicate, objct, isAdded=True):
+    return TripleInfo(URIElement(EXAMPLE + subject), URIElement(predicate), objct, isAdded=isAdded)
+
+
+def test_new_entities_are_exported_as_json_lines(tmp_path):
+    factory = DictFactory()
+    manager = BulkExportManager(factory, first_item_id=10, first_property_id=2, related_link_prop='P1')
+    manager.create_triple(triple('Person', RDFS_LABEL, LiteralElement('Persona', lang='es')))
+    manager.create_triple(triple('Person', SKOS_ALTLABEL, LiteralElement('Human', lang='en')))
+    res = manager.create_triple(triple('Person', EXAMPLE + 'livesIn', URIElement(EXAMPLE + 'City')))
+    manager.create_triple(triple('Person', EXAMPLE + 'age', LiteralElement(42, datatype=XSD_BASE + 'integer')))
+    manager.remove_triple(triple('Person', SKOS_ALTLABEL, LiteralElement('Human', lang='en')))
+    assert res.successful and res.result == 'Q10'
+
+    json_path = tmp_path / 'entities.jsonl'
+    assert manager.export(json_lines_path=str(json_path)) == 4
+    entities = [json.loads(line) for line in json_path.read_text(encoding='utf-8').splitlines()]
+    assert [(entity['id'], entity['type']) for entity in entities] == \
+        [('Q10', 'item'), ('Q11', 'item'), ('P2', 'property'), ('P3', 'property')]
+
+    person = entities[0]
+    assert person['labels'] == {'en': {'language': 'en', 'value': 'Person'},
+                                'es': {'language': 'es', 'value': 'Persona'}}
+    assert person['aliases'] == {}
+    assert person['claims']['P1'][0]['mainsnak']['datavalue']['value'] == EXAMPLE + 'Person'
+    assert person['claims']['P2'][0]['mainsnak']['datavalue']['value']['numeric-id'] == 11
+    assert person['claims']['P3'][0]['mainsnak']['datavalue']['value']['amount'] == '+42'
+    assert entities[2]['datatype'] == 'wikibase-item'
+    assert entities[3]['datatype'] == 'quantity'
+    assert factory.uris == {EXAMPLE + 'Person': 'Q10', EXAMPLE + 'City': 'Q11',
+                            EXAMPLE + 'livesIn': 'P2', EXAMPLE + 'age': 'P3'}
+
+
+def test_bootstrap_props_are_created_by_the_export():
+    manager = BulkExportManager(DictFactory())
+    manager.create_triple(triple('Person', RDFS_LABEL, LiteralElement('Person', lang='en')))
+    output = io.StringIO()
+    assert manager.write_json_lines(output) == 2
+    person, related_link = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert related_link['id'] == 'P1' and related_link['datatype'] == 'url'
+    assert list(person['claims']) == ['P1']
+
+
+def test_quickstatements_export():
+    factory = DictFactory({EXAMPLE + 'Madrid': 'Q5', EXAMPLE + 'name': 'P7'})
+    manager = BulkExportManager(factory, first_item_id=20, first_property_id=10, related_link_prop='P1')
+    manager.create_triple(triple('Person', EXAMPLE + 'bornIn', URIElement(EXAMPLE + 'Madrid')))
+    manager.create_triple(triple('Madrid', RDFS_LABEL, LiteralElement('Madrid', lang='es')))
+    manager.remove_triple(triple('Madrid', EXAMPLE + 'name', LiteralElement('Mayrit')))
+    manager.remove_triple(triple('Madrid', RDFS_LABEL, LiteralElement('Madrid', lang='en')))
+
+    output = io.StringIO()
+    assert manager.write_quickstatements(output) == 6
+    assert output.getvalue().splitlines() == [
+        'CREATE',
+        'LAST\tLen\t"Person"',
+        f'Q20\tP1\t"{EXAMPLE}Person"',
+        'Q20\tP10\tQ5',
+        '-Q5\tP7\t"Mayrit"',
+        'Q5\tLes\t"Madrid"'
+    ]
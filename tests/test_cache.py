@@ -0,0 +1,47 @@
+import pytest
+
+from rdfsync.util.cache import LRUCache
+
+
+class Clock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = LRUCache(max_size=2)
+    cache.put('Q1', 'http://example.org/Spain')
+    cache.put('P1', None)
+    assert cache.get('Q1') == 'http://example.org/Spain'
+    cache.put('Q2', 'http://example.org/Europe')
+    assert cache.get('P1', 'missing') == 'missing'
+    assert cache.get('Q2') == 'http://example.org/Europe' and len(cache) == 2
+    assert cache.stats == {'hits': 2, 'misses': 1, 'evictions': 1, 'expirations': 0}
+    assert cache.hit_rate() == pytest.approx(2 / 3)
+
+
+def test_entries_expire():
+    clock = Clock()
+    cache = LRUCache(ttl=10, clock=clock)
+    cache.put('Q1', 'http://example.org/Spain')
+    clock.now = 5
+    assert cache.get('Q1') == 'http://example.org/Spain'
+    clock.now = 11
+    assert cache.get('Q1') is None and len(cache) == 0
+    assert cache.stats['expirations'] == 1
+
+    with pytest.raises(ValueError):
+        LRUCache(max_size=0)
+
+
+def test_entries_are_invalidated():
+    cache = LRUCache()
+    cache.put('Q1', 'http://example.org/Spain')
+    cache.put('Q2', 'http://example.org/Europe')
+    cache.invalidate('Q1')
+    cache.invalidate('Q3')
+    assert cache.get('Q1') is None and cache.get('Q2') == 'http://example.org/Europe'
@@ -0,0 +1,201 @@
+from unittest import mock
+
+import pytest
+import threading
+
+from wbsync.triplestore import CoalescingBuffer, LiteralElement, ModificationResult, \
+    TripleInfo, URIElement
+from wbsync.util.error import InvalidArgumentError
+from wbsync.util.uri_constants import RDFS_LABEL
+
+EXAMPLE = 'https://example.org/onto#'
+
+
+class FakeClock():
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def store():
+    store = mock.MagicMock()
+    store.batch_update = mock.MagicMock(return_value=ModificationResult(successful=True))
+    return store
+
+
+def triple(subject, predicate, objct, isAdded=True):
+    return TripleInfo(URIElement(EXAMPLE + subject), URIElement(predicate), objct, isAdded=isAdded)
+
+
+def flushed_changes(store):
+    return [(call[0][0].uri, [(str(t.object), t.isAdded) for t in call[0][1]])
+            for call in store.batch_update.call_args_list]
+
+
+def test_changes_are_merged_per_subject(store):
+    buffer = CoalescingBuffer(store)
+    label = LiteralElement('Person', lang='en')
+    buffer.create_triple(triple('Person', RDFS_LABEL, label))
+    buffer.batch_update(URIElement(EXAMPLE + 'City'), [triple('City', RDFS_LABEL, LiteralElement('City'))])
+    buffer.create_triple(triple('Person', RDFS_LABEL, label))
+    buffer.create_triple(triple('Person', EXAMPLE + 'livesIn', URIElement(EXAMPLE + 'City')))
+    assert len(buffer) == 3
+    store.batch_update.assert_not_called()
+
+    results = buffer.flush()
+    assert len(results) == 2
+    assert flushed_changes(store) == [
+        (EXAMPLE + 'Person', [(str(label), True), (str(URIElement(EXAMPLE + 'City')), True)]),
+        (EXAMPLE + 'City', [(str(LiteralElement('City')), True)])
+    ]
+    store.prepare.assert_called_once()
+    assert len(buffer) == 0
+    assert buffer.flush() == []
+
+
+def test_final_state_of_repeated_changes(store):
+    buffer = CoalescingBuffer(store)
+    added = LiteralElement('added then removed')
+    readded = LiteralElement('removed then added')
+    removed = LiteralElement('removed twice')
+    buffer.create_triple(triple('Person', RDFS_LABEL, added))
+    buffer.remove_triple(triple('Person', RDFS_LABEL, added))
+    buffer.remove_triple(triple('Person', RDFS_LABEL, readded))
+    buffer.create_triple(triple('Person', RDFS_LABEL, readded))
+    buffer.remove_triple(triple('Person', RDFS_LABEL, removed))
+    buffer.remove_triple(triple('Person', RDFS_LABEL, removed))
+    assert len(buffer) == 4
+    buffer.flush()
+    assert flushed_changes(store) == [
+        (EXAMPLE + 'Person', [(str(added), False), (str(readded), False), (str(readded), True),
+                              (str(removed), False)])
+    ]
+
+
+def test_removals_keep_the_order_of_their_predicate(store):
+    buffer = CoalescingBuffer(store)
+    lives_in = EXAMPLE + 'livesIn'
+    city, town = URIElement(EXAMPLE + 'City'), URIElement(EXAMPLE + 'Town')
+    buffer.create_triple(triple('Person', lives_in, town))
+    buffer.remove_triple(triple('Person', lives_in, city))
+    buffer.create_triple(triple('Person', lives_in, town))
+    buffer.create_triple(triple('Person', RDFS_LABEL, LiteralElement('Person')))
+    buffer.flush()
+    # the removal may remove every claim of the predicate, so Town is added again after it
+    assert flushed_changes(store) == [
+        (EXAMPLE + 'Person', [(str(town), True), (str(city), False), (str(town), True),
+                              (str(LiteralElement('Person')), True)])
+    ]
+
+
+def test_flush_on_size(store):
+    buffer = CoalescingBuffer(store, max_pending=2)
+    buffer.create_triple(triple('Person', RDFS_LABEL, LiteralElement('a')))
+    store.batch_update.assert_not_called()
+    buffer.create_triple(triple('City', RDFS_LABEL, LiteralElement('b')))
+    assert store.batch_update.call_count == 2
+    assert len(buffer) == 0
+
+
+def test_flush_on_age(store):
+    clock = FakeClock()
+    on_flush = mock.MagicMock()
+    buffer = CoalescingBuffer(store, max_age=10, on_flush=on_flush, clock=clock)
+    buffer.create_triple(triple('Person', RDFS_LABEL, LiteralElement('a')))
+    clock.now = 5
+    buffer.create_triple(triple('Person', RDFS_LABEL, LiteralElement('b')))
+    store.batch_update.assert_not_called()
+    clock.now = 10
+    buffer.create_triple(triple('Person', RDFS_LABEL, LiteralElement('c')))
+    assert store.batch_update.call_count == 1
+    on_flush.assert_called_once()
+
+
+def test_idle_buffer_is_flushed_by_the_timer(store):
+    flushed = threading.Event()
+    buffer = CoalescingBuffer(store, max_age=0.05, on_flush=lambda results: flushed.set())
+    buffer.create_triple(triple('Person', RDFS_LABEL, LiteralElement('a')))
+    assert flushed.wait(5)
+    store.batch_update.assert_called_once()
+    assert len(buffer) == 0
+
+
+def test_failed_flushes_are_surfaced(store):
+    store.batch_update.return_value = ModificationResult(successful=False, message="Conflict")
+    buffer = CoalescingBuffer(store, max_pending=2)
+    assert buffer.create_triple(triple('Person', RDFS_LABEL, LiteralElement('a'))).successful
+    result = buffer.create_triple(triple('Person', RDFS_LABEL, LiteralElement('b')))
+    assert not result.successful and 'Conflict' in result.message
+    assert result.result == [store.batch_update.return_value]
+
+    with buffer:
+        buffer.create_triple(triple('City', RDFS_LABEL, LiteralElement('c')))
+    assert buffer.failed_results == [store.batch_update.return_value]
+
+
+def test_unwritten_changes_are_kept_when_a_flush_raises(store):
+    store.batch_update = mock.MagicMock(side_effect=[ModificationResult(successful=True), ConnectionError()] +
+                                        [ModificationResult(successful=True)] * 3)
+    buffer = CoalescingBuffer(store)
+    for subject in ('Person', 'City', 'Town'):
+        buffer.create_triple(triple(subject, RDFS_LABEL, LiteralElement(subject)))
+    with pytest.raises(ConnectionError):
+        buffer.flush()
+    store.finish.assert_called_once()
+    assert len(buffer) == 2
+
+    buffer.create_triple(triple('Country', RDFS_LABEL, LiteralElement('Country')))
+    buffer.remove_triple(triple('City', RDFS_LABEL, LiteralElement('City')))
+    assert all(result.successful for result in buffer.flush())
+    assert flushed_changes(store)[2:] == [
+        (EXAMPLE + 'City', [(str(LiteralElement('City')), False)]),
+        (EXAMPLE + 'Town', [(str(LiteralElement('Town')), True)]),
+        (EXAMPLE + 'Country', [(str(LiteralElement('Country')), True)])
+    ]
+    assert len(buffer) == 0
+
+
+def test_flushes_are_serialized(store):
+    writing = threading.Event()
+    release = threading.Event()
+    written = []
+
+    def batch_update(subject, triples):
+        if not written:
+            writing.set()
+            release.wait(5)
+        written.append(triples[0].object.content)
+        return ModificationResult(successful=True)
+
+    store.batch_update = mock.MagicMock(side_effect=batch_update)
+    buffer = CoalescingBuffer(store)
+    buffer.create_triple(triple('Person', RDFS_LABEL, LiteralElement('first')))
+    first = threading.Thread(target=buffer.flush)
+    first.start()
+    assert writing.wait(5)
+    buffer.create_triple(triple('Person', RDFS_LABEL, LiteralElement('second')))
+    second = threading.Thread(target=buffer.flush)
+    second.start()
+    second.join(0.1)
+    # the second flush waits until the first one is written
+    assert second.is_alive()
+    release.set()
+    first.join()
+    second.join()
+    assert written == ['first', 'second']
+
+
+def test_context_manager(store):
+    with CoalescingBuffer(store) as buffer:
+        buffer.create_triple(triple('Person', RDFS_LABEL, LiteralElement('a')))
+    store.batch_update.assert_called_once()
+
+
+def test_invalid_thresholds(store):
+    with pytest.raises(InvalidArgumentError):
+        CoalescingBuffer(store, max_pending=0)
+    with pytest.raises(InvalidArgumentError):
+        CoalescingBuffer(store, max_age=-1)
@@ -0,0 +1,200 @@
+import pytest
+
+from rdflib import RDFS, XSD, Graph, Literal, URIRef
+
+from rdfsync.wb2rdf import conversion
+from rdfsync.wb2rdf.conversion import Converter, MAX_IDS_PER_REQUEST
+
+ASIO = 'http://www.purl.org/hercules/asio/core#'
+
+
+def statement(value):
+    return {'mainsnak': {'datavalue': {'value': value}}}
+
+
+def entity(label, **claims):
+    return {'labels': {'en': {'language': 'en', 'value': label}},
+            'descriptions': {'en': {'language': 'en', 'value': label + ' description'}},
+            'claims': {prop: [statement(value) for value in values] for prop, values in claims.items()}}
+
+
+ENTITIES = {
+    'P1': entity('related link'),
+    'P2': entity('same as'),
+    'P3': entity('country', P1=[ASIO + 'country']),
+    'P4': entity('population', P1=[ASIO + 'population']),
+    'Q1': entity('Spain', P1=[ASIO + 'Spain'], P2=['http://example.org/Spain'],
+                 P3=[{'entity-type': 'item', 'id': 'Q2'}], P4=['47000000']),
+    'Q2': entity('Europe', P1=[ASIO + 'Europe'])
+}
+
+
+class FakeApi():
+    """ Wikibase API with wbgetentities over a dictionary of entities. """
+
+    def __init__(self, entities):
+        self.entities = entities
+        self.requests = []
+        self.error = None
+        self.omitted = set()
+
+    def get(self, url, params):
+        self.requests.append(params)
+        if self.error is not None:
+            return FakeResponse({'error': self.error})
+        ids = params['ids'].split('|')
+        assert len(ids) <= MAX_IDS_PER_REQUEST
+        props = params.get('props', 'labels|descriptions|claims').split('|')
+        return FakeResponse({'entities': {
+            wb_id: {prop: value for prop, value in self.entities[wb_id].items() if prop in props}
+            if wb_id in self.entities else {'id': wb_id, 'missing': ''}
+            for wb_id in ids if wb_id not in self.omitted}})
+
+
+class FakeResponse():
+
+    def __init__(self, data):
+        self.data = data
+
+    def json(self):
+        return self.data
+
+
+@pytest.fixture
+def api(monkeypatch):
+    api = FakeApi(dict(ENTITIES))
+    monkeypatch.setattr(conversion.requests, 'get', api.get)
+    return api
+
+
+def test_values_of_claims_are_resolved_in_batches(api):
+    converter = Converter(endpoint='http://wikibase/w/api.php')
+    assert converter.get_related_link_of_values_of_a_claim_in_wb('Q1') == {
+        ASIO + 'country': [ASIO + 'Europe'],
+        ASIO + 'population': ['47000000']
+    }
+    # claims of the item, and labels and claims of the properties and values, which include the related link
+    assert len(api.requests) == 2
+    assert converter.wbgetclaims('Q1') == ['P3', 'P4']
+    assert converter.get_related_link_of_a_wb_item_or_property('Q2') == ASIO + 'Europe'
+    assert converter.get_related_link_of_a_wb_item_or_property('47000000') == '47000000'
+
+
+def test_requests_are_split_by_number_of_ids(api):
+    for i in range(100, 220):
+        api.entities[f'Q{i}'] = entity(f'Concept {i}', P1=[ASIO + f'Concept{i}'])
+    converter = Converter(endpoint='http://wikibase/w/api.php')
+    related_links = converter.get_related_links([f'Q{i}' for i in range(100, 220)])
+    assert related_links['Q219'] == ASIO + 'Concept219'
+    assert [len(params['ids'].split('|')) for params in api.requests] == [50, 50, 20, 1]
+    assert all(params['props'] in ('labels|claims', 'labels') for params in api.requests)
+
+
+def test_missing_entities_have_no_related_link(api):
+    converter = Converter(endpoint='http://wikibase/w/api.php')
+    assert converter.get_related_links(['Q2', 'Q404']) == {'Q2': ASIO + 'Europe', 'Q404': ''}
+
+
+def test_failed_requests_raise(api):
+    api.error = {'code': 'maxlag', 'info': 'Waiting for a database server'}
+    converter = Converter(endpoint='http://wikibase/w/api.php')
+    with pytest.raises(ValueError):
+        converter.get_related_links(['Q2'])
+    with pytest.raises(ValueError):
+        converter.get_entity_snapshot('Q1')
+
+
+def test_ids_must_be_whole(api):
+    converter = Converter(endpoint='http://wikibase/w/api.php')
+    assert converter.get_related_links(['Q2-statement', 'Q2']) == {'Q2-statement': 'Q2-statement',
+                                                                   'Q2': ASIO + 'Europe'}
+    with pytest.raises(ValueError):
+        converter.execute_synchronization('Q1 ')
+
+
+def test_entities_are_cached_for_the_run(api):
+    converter = Converter(endpoint='http://wikibase/w/api.php')
+    converter.get_related_link_of_values_of_a_claim_in_wb('Q1')
+    requests_of_first_item = len(api.requests)
+    assert converter.get_related_links(['P3', 'Q2']) == {'P3': ASIO + 'country', 'Q2': ASIO + 'Europe'}
+    assert len(api.requests) == requests_of_first_item
+    stats = converter.cache_stats()
+    assert stats['related_links']['hits'] > 0 and stats['labels']['hits'] > 0
+
+    # the synchronized entity itself is fetched again, but not its properties and values
+    assert converter.get_related_link_of_values_of_a_claim_in_wb('Q1') == {
+        ASIO + 'country': [ASIO + 'Europe'],
+        ASIO + 'population': ['47000000']
+    }
+    assert converter.wbgetclaims('Q1') == ['P3', 'P4']
+    assert [params['ids'] for params in api.requests[requests_of_first_item:]] == ['Q1', 'Q1']
+
+    converter.clear_caches()
+    converter.get_related_link_of_a_wb_item_or_property('Q2')
+    assert len(api.requests) > requests_of_first_item
+
+
+def test_entity_snapshot(api):
+    converter = Converter(endpoint='http://wikibase/w/api.php')
+    snapshot = converter.get_entity_snapshot('Q1')
+    assert len(api.requests) == 2
+    assert snapshot.related_link == ASIO + 'Spain'
+    assert snapshot.labels == {'en': 'Spain'} and snapshot.descriptions == {'en': 'Spain description'}
+    assert snapshot.get_claims() == ['P3', 'P4']
+    assert snapshot.get_related_link_of_values_of_claims() == {
+        ASIO + 'country': [ASIO + 'Europe'],
+        ASIO + 'population': ['47000000']
+    }
+
+
+def test_snapshots_see_changes_of_the_entity(api):
+    converter = Converter(endpoint='http://wikibase/w/api.php')
+    converter.get_entity_snapshot('Q1')
+    api.entities['Q1'] = entity('Spain', P1=[ASIO + 'Kingdom_of_Spain'], P4=['48000000'])
+    snapshot = converter.get_entity_snapshot('Q1')
+    assert snapshot.related_link == ASIO + 'Kingdom_of_Spain'
+    assert snapshot.get_related_link_of_values_of_claims() == {ASIO + 'population': ['48000000']}
+
+
+def test_entities_not_returned_are_not_cached(api):
+    converter = Converter(endpoint='http://wikibase/w/api.php')
+    api.omitted.add('Q2')
+    assert converter.get_related_links(['Q2']) == {'Q2': ''}
+    api.omitted.clear()
+    assert converter.get_related_links(['Q2']) == {'Q2': ASIO + 'Europe'}
+
+
+def test_synchronization_fetches_the_item_once(api):
+    graph = Graph()
+    spain = URIRef(ASIO + 'Spain')
+    graph.add((spain, RDFS.label, Literal('Spain', lang='en')))
+    graph.add((spain, RDFS.comment, Literal('A country', lang='en')))
+    graph.add((spain, URIRef(ASIO + 'country'), URIRef(ASIO + 'Asia')))
+    converter = Converter(endpoint='http://wikibase/w/api.php', graph=graph)
+    converter.execute_synchronization('Q1')
+
+    assert len(api.requests) == 2
+    assert set(graph) == {
+        (spain, RDFS.label, Literal('Spain', lang='en')),
+        (spain, RDFS.comment, Literal('Spain description', lang='en')),
+        (spain, URIRef(ASIO + 'country'), URIRef(ASIO + 'Europe')),
+        (spain, URIRef(ASIO + 'population'), Literal(47000000, datatype=XSD.integer))
+    }
+
+
+def test_synchronization_only_reads_the_subject(api):
+    graph = Graph()
+    spain = URIRef(ASIO + 'Spain')
+    for i in range(1000):
+        graph.add((URIRef(ASIO + f'Concept{i}'), RDFS.label, Literal(f'Concept {i}', lang='en')))
+    graph.add((spain, RDFS.label, Literal('Spain', lang='en')))
+    graph.add((spain, RDFS.label, Literal('España', lang='es')))
+    graph.add((spain, RDFS.comment, Literal('Spain description', lang='en')))
+    graph.add((spain, URIRef(ASIO + 'country'), URIRef(ASIO + 'Europe')))
+    converter = Converter(endpoint='http://wikibase/w/api.php', graph=graph)
+    converter.execute_synchronization('Q1')
+
+    # the label in a language that is not in wikibase is removed
+    assert set(graph.objects(spain, RDFS.label)) == {Literal('Spain', lang='en')}
+    assert (spain, URIRef(ASIO + 'population'), Literal(47000000, datatype=XSD.integer)) in graph
+    assert len(graph) == 1000 + 4
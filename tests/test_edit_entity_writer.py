@@ -0,0 +1,115 @@
+from unittest import mock
+
+import json
+import pytest
+
+from wikidataintegrator import wdi_core
+
+from wbsync.triplestore.edit_entity_writer import EditEntityWriter, EntityEdit
+
+ENTITY = {
+    'id': 'Q1',
+    'lastrevid': 10,
+    'aliases': {'en': [{'language': 'en', 'value': 'Human'}]},
+    'claims': {
+        'P2': [
+            {'id': 'Q1$a', 'mainsnak': {'property': 'P2', 'datavalue': {
+                'value': {'entity-type': 'item', 'numeric-id': 5, 'id': 'Q5'}, 'type': 'wikibase-entityid'}}},
+            {'id': 'Q1$b', 'mainsnak': {'property': 'P2', 'datavalue': {
+                'value': {'entity-type': 'item', 'numeric-id': 6, 'id': 'Q6'}, 'type': 'wikibase-entityid'}}}
+        ],
+        'P3': [
+            {'id': 'Q1$c', 'mainsnak': {'property': 'P3', 'datavalue': {
+                'value': 'abc', 'type': 'string'}}}
+        ]
+    }
+}
+
+
+class FakeRequestsResponse():
+    def __init__(self, text):
+        self.text = text
+
+
+def test_terms():
+    edit = EntityEdit('Q1')
+    edit.set_label('Person', 'en')
+    edit.set_label('', 'es')
+    edit.set_description('A person', 'en')
+    edit.add_alias('Individual', 'en')
+    edit.add_alias('Human', 'en')
+    assert not edit.needs_state
+    edit.remove_alias('Human', 'en')
+    edit.remove_alias('Nobody', 'en')
+    assert edit.needs_state
+    assert edit.to_json(ENTITY) == {
+        'labels': {'en': {'language': 'en', 'value': 'Person'},
+                   'es': {'language': 'es', 'remove': ''}},
+        'descriptions': {'en': {'language': 'en', 'value': 'A person'}},
+        'aliases': [{'language': 'en', 'value': 'Individual', 'add': ''},
+                    {'language': 'en', 'value': 'Human', 'remove': ''}]
+    }
+
+
+def test_only_changed_claims_are_sent():
+    edit = EntityEdit('Q1')
+    edit.add_claim(wdi_core.WDItemID(value='Q5', prop_nr='P2'))
+    edit.add_claim(wdi_core.WDItemID(value='Q7', prop_nr='P2'))
+    edit.remove_claims('P2', {'entity-type': 'item', 'numeric-id': 6, 'id': 'Q6'})
+    edit.remove_claims('P3')
+    assert edit.needs_state
+    claims = edit.to_json(ENTITY)['claims']
+    assert [claim['mainsnak']['datavalue']['value']['id'] for claim in claims[:-2]] == ['Q7']
+    assert claims[-2:] == [{'id': 'Q1$b', 'remove': ''}, {'id': 'Q1$c', 'remove': ''}]
+
+
+def test_readded_claims_are_kept():
+    edit = EntityEdit('Q1')
+    edit.remove_claims('P3', 'abc')
+    edit.add_claim(wdi_core.WDString(value='abc', prop_nr='P3'))
+    assert edit.to_json(ENTITY) == {}
+
+
+def test_new_property():
+    edit = EntityEdit(entity_type='property', property_datatype='string')
+    edit.set_label('altName')
+    assert not edit.needs_state
+    assert edit.to_json() == {'labels': {'en': {'language': 'en', 'value': 'altName'}}, 'datatype': 'string'}
+
+
+@mock.patch('wikidataintegrator.wdi_core.WDItemEngine.mediawiki_api_call',
+            return_value={'success': 1, 'entity': {'id': 'Q1', 'lastrevid': 11, 'claims': {}}})
+def test_write(mock_api_call):
+    login = mock.MagicMock()
+    writer = EditEntityWriter('www.example.org', login)
+    edit = EntityEdit('Q1')
+    edit.set_label('Person', 'en')
+    assert writer.write(edit, ENTITY) == {'id': 'Q1', 'lastrevid': 11, 'claims': {}}
+    payload = mock_api_call.call_args[1]['data']
+    assert payload['action'] == 'wbeditentity'
+    assert payload['id'] == 'Q1'
+    assert payload['baserevid'] == 10
+    # edits are marked like the ones of the item engines
+    assert payload['bot'] == '' and payload['summary'] == ''
+    assert json.loads(payload['data']) == {'labels': {'en': {'language': 'en', 'value': 'Person'}}}
+
+    # edits without changes are not sent
+    assert writer.write(EntityEdit('Q1'), ENTITY) is None
+    assert mock_api_call.call_count == 1
+
+
+@mock.patch('wikidataintegrator.wdi_core.WDItemEngine.mediawiki_api_call',
+            return_value={'error': {'code': 'editconflict', 'info': 'Edit conflict'}})
+def test_write_errors(_):
+    writer = EditEntityWriter('www.example.org', mock.MagicMock())
+    edit = EntityEdit(entity_type='item')
+    edit.set_label('Person', 'en')
+    with pytest.raises(wdi_core.WDApiError):
+        writer.write(edit)
+
+
+@mock.patch('requests.get', return_value=FakeRequestsResponse(json.dumps({'entities': {'Q1': ENTITY}})))
+def test_fetch(mock_get):
+    writer = EditEntityWriter('www.example.org', mock.MagicMock())
+    assert writer.fetch('Q1') == ENTITY
+    assert '&props=info|aliases|claims' in mock_get.call_args[0][0]
@@ -0,0 +1,57 @@
+import pytest
+
+from wbsync.triplestore.entity_cache import EntityCache
+from wbsync.util.error import InvalidArgumentError
+
+
+def test_get_returns_copies():
+    cache = EntityCache()
+    cache.update('Q1', {'claims': {}, 'lastrevid': 3})
+    entity = cache.get('Q1')
+    assert entity == {'id': 'Q1', 'claims': {}, 'lastrevid': 3}
+    entity['claims']['P1'] = []
+    assert cache.get('Q1')['claims'] == {}
+    assert cache.lastrevid('Q1') == 3
+
+
+def test_update_with_explicit_revision():
+    cache = EntityCache()
+    cache.update('Q1', {'claims': {}}, lastrevid=7)
+    assert cache.lastrevid('Q1') == 7
+
+
+def test_unusable_states_invalidate_the_entity():
+    cache = EntityCache()
+    cache.update('Q1', {'claims': {}, 'lastrevid': 3})
+    cache.update('Q1', {'claims': {}})
+    assert 'Q1' not in cache
+    cache.update('Q2', {'lastrevid': 3})
+    cache.update('Q3', None, lastrevid=3)
+    assert len(cache) == 0
+    assert cache.get('Q1') is None
+    assert cache.lastrevid('Q1') is None
+
+
+def test_invalidate_and_clear():
+    cache = EntityCache()
+    cache.update('Q1', {'claims': {}, 'lastrevid': 1})
+    cache.update('Q2', {'claims': {}, 'lastrevid': 1})
+    cache.invalidate('Q1')
+    cache.invalidate('Q404')
+    assert 'Q1' not in cache and 'Q2' in cache
+    cache.clear()
+    assert len(cache) == 0
+
+
+def test_least_recently_used_entities_are_evicted():
+    cache = EntityCache(max_size=2)
+    cache.update('Q1', {'claims': {}, 'lastrevid': 1})
+    cache.update('Q2', {'claims': {}, 'lastrevid': 1})
+    cache.get('Q1')
+    cache.update('Q3', {'claims': {}, 'lastrevid': 1})
+    assert 'Q1' in cache and 'Q3' in cache and 'Q2' not in cache
+    assert cache.lastrevid('Q2') is None
+    assert len(cache) == 2
+
+    with pytest.raises(InvalidArgumentError):
+        EntityCache(max_size=0)
@@ -0,0 +1,135 @@
+from unittest import mock
+
+import json
+import pytest
+import requests
+
+from wbsync.external.bootstrap_cache import BootstrapCache
+from wbsync.external.uri_factory import InMemoryURIFactory
+from wbsync.triplestore import LiteralElement, TripleInfo, URIElement, WikibaseAdapter
+from wbsync.triplestore.edit_entity_writer import EditEntityWriter, EntityEdit
+from wbsync.triplestore.fake_wikibase import FakeWikibase, FakeWikibaseTransport, start_server
+from wbsync.triplestore.transport import RequestsTransport
+from wbsync.util.uri_constants import RDFS_COMMENT, RDFS_LABEL
+
+API_URL = 'http://wikibase.example.org/w/api.php'
+EXAMPLE = 'https://example.org/onto#'
+
+
+def edit_entity(wikibase, data, **params):
+    return wikibase.handle(dict(params, action='wbeditentity', data=json.dumps(data)))
+
+
+@pytest.fixture
+def wikibase():
+    return FakeWikibase()
+
+
+def test_edit_and_get_entities(wikibase):
+    prop = edit_entity(wikibase, {'labels': {'en': {'language': 'en', 'value': 'same as'}},
+                                  'datatype': 'url'}, new='property')['entity']
+    assert prop['id'] == 'P1'
+    item = edit_entity(wikibase, {
+        'labels': {'en': {'language': 'en', 'value': 'Person'}},
+        'aliases': [{'language': 'en', 'value': 'Human', 'add': ''}],
+        'claims': [{'mainsnak': {'snaktype': 'value', 'property': 'P1',
+                                 'datavalue': {'value': 'https://example.org', 'type': 'string'}},
+                    'type': 'statement', 'rank': 'normal'}]
+    }, new='item')['entity']
+    assert item['id'] == 'Q1'
+    guid = item['claims']['P1'][0]['id']
+
+    item = edit_entity(wikibase, {
+        'labels': {'en': {'language': 'en', 'remove': ''}},
+        'aliases': [{'language': 'en', 'value': 'Human', 'remove': ''}],
+        'claims': [{'id': guid, 'remove': ''}]
+    }, id='Q1', baserevid=str(item['lastrevid']))['entity']
+    assert item['labels'] == {} and item['aliases'] == {} and item['claims'] == {}
+
+    entities = wikibase.handle({'action': 'wbgetentities', 'ids': 'Q1|Q404', 'props': 'info|claims'})['entities']
+    assert set(entities['Q1']) == {'id', 'type', 'lastrevid', 'modified', 'claims'}
+    assert entities['Q404'] == {'id': 'Q404', 'missing': ''}
+    assert wikibase.request_counts == {'wbeditentity': 3, 'wbgetentities': 1}
+
+
+def test_search_entities(wikibase):
+    edit_entity(wikibase, {'labels': {'en': {'language': 'en', 'value': 'related link'}},
+                           'descriptions': {'en': {'language': 'en', 'value': 'Link'}},
+                           'datatype': 'url'}, new='property')
+    edit_entity(wikibase, {'labels': {'en': {'language': 'en', 'value': 'related item'}}}, new='item')
+    res = wikibase.handle({'action': 'wbsearchentities', 'search': 'Related', 'type': 'property'})
+    assert res['search'] == [{'id': 'P1', 'label': 'related link', 'description': 'Link'}]
+
+
+def test_edit_errors(wikibase):
+    edit_entity(wikibase, {}, new='item')
+    edit_entity(wikibase, {'labels': {'en': {'language': 'en', 'value': 'Person'}}}, id='Q1')
+    assert edit_entity(wikibase, {}, id='Q1', baserevid='1')['error']['code'] == 'editconflict'
+    assert edit_entity(wikibase, {}, id='Q7')['error']['code'] == 'no-such-entity'
+    error = edit_entity(wikibase, {'claims': [{'mainsnak': {'property': 'P9'}}]}, id='Q1')['error']
+    assert error['messages'][0]['name'] == 'wikibase-validator-no-such-property'
+    assert wikibase.handle({'action': 'parse'})['error']['code'] == 'unknown_action'
+
+
+def test_latency():
+    sleep = mock.MagicMock()
+    wikibase = FakeWikibase(latency=0.25, sleep=sleep)
+    wikibase.handle({'action': 'wbgetentities', 'ids': 'Q1'})
+    sleep.assert_called_once_with(0.25)
+
+
+def test_adapter_with_fake_transport(wikibase):
+    adapter = WikibaseAdapter(API_URL, 'http://wikibase.example.org/sparql', 'user', 'pass',
+                              factory_of_uris=InMemoryURIFactory(),
+                              bootstrap_cache=BootstrapCache(path=None), direct_writes=True,
+                              transport=FakeWikibaseTransport(wikibase))
+    person, lives_in, city = URIElement(EXAMPLE + 'Person'), URIElement(EXAMPLE + 'livesIn'), \
+        URIElement(EXAMPLE + 'City')
+    results = [
+        adapter.create_triple(TripleInfo(person, URIElement(RDFS_LABEL), LiteralElement('Person', lang='en'))),
+        adapter.create_triple(TripleInfo(person, URIElement(RDFS_COMMENT), LiteralElement('A person', lang='en'))),
+        adapter.create_triple(TripleInfo(person, lives_in, city)),
+        adapter.remove_triple(TripleInfo(person, lives_in, city))
+    ]
+    assert all(res.successful for res in results)
+
+    related_link = adapter._related_link_prop
+    assert wikibase.entities[related_link]['datatype'] == 'url'
+    person_json = wikibase.entities[person.id]
+    assert person_json['labels']['en']['value'] == 'Person'
+    assert person_json['descriptions']['en']['value'] == 'A person'
+    assert list(person_json['claims']) == [related_link]
+    assert wikibase.entities[lives_in.id]['datatype'] == 'wikibase-item'
+
+
+def test_http_server(wikibase):
+    server = start_server(wikibase)
+    try:
+        url = f"http://{server.server_address[0]}:{server.server_address[1]}/w/api.php"
+        login = mock.MagicMock()
+        login.get_session = requests.Session
+        writer = EditEntityWriter(url, login, RequestsTransport())
+        edit = EntityEdit()
+        edit.set_label('Person', 'en')
+        assert writer.write(edit)['id'] == 'Q1'
+        assert writer.fetch('Q1', 'info')['lastrevid'] == 1
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_adapter_with_http_server(wikibase):
+    server = start_server(wikibase)
+    try:
+        url = f"http://{server.server_address[0]}:{server.server_address[1]}/w/api.php"
+        adapter = WikibaseAdapter(url, 'http://wikibase.example.org/sparql', 'user', 'pass',
+                                  factory_of_uris=InMemoryURIFactory(),
+                                  bootstrap_cache=BootstrapCache(path=None), direct_writes=True)
+        person = URIElement(EXAMPLE + 'Person')
+        res = adapter.create_triple(TripleInfo(person, URIElement(RDFS_LABEL), LiteralElement('Person', lang='en')))
+        assert res.successful
+        assert wikibase.entities[person.id]['labels']['en']['value'] == 'Person'
+        assert wikibase.request_counts['login'] == 1
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,91 @@
+from wbsync.external.uri_factory import InMemoryURIFactory
+from wbsync.synchronization import GraphDiffSyncAlgorithm, OntologySynchronizer
+from wbsync.synchronization.operations import execute_ops, optimize_ops
+from wbsync.triplestore import InMemoryMetrics, InMemoryTripleStore, LiteralElement, TripleInfo, URIElement
+from wbsync.triplestore.entity_model import EntityModel
+from wbsync.util.uri_constants import RDFS_COMMENT, RDFS_LABEL, SKOS_ALTLABEL
+
+EXAMPLE = 'https://example.org/onto#'
+
+SOURCE = f"""
+@prefix ex: <{EXAMPLE}> .
+@prefix rdfs: <http://www.w3.org/2000/01/rdf-schema#> .
+ex:Person rdfs:label "Person"@en ;
+    rdfs:comment "A human being"@en ;
+    ex:livesIn ex:City .
+"""
+
+TARGET = f"""
+@prefix ex: <{EXAMPLE}> .
+@prefix rdfs: <http://www.w3.org/2000/01/rdf-schema#> .
+ex:Person rdfs:label "Person"@en, "Persona"@es ;
+    ex:livesIn ex:Town .
+"""
+
+
+def triple(subject, predicate, objct, isAdded=True):
+    return TripleInfo(URIElement(EXAMPLE + subject), URIElement(predicate), objct, isAdded=isAdded)
+
+
+def test_triples_are_applied_like_in_a_wikibase():
+    store = InMemoryTripleStore()
+    store.create_triple(triple('Person', RDFS_LABEL, LiteralElement('Persona', lang='es')))
+    store.create_triple(triple('Person', SKOS_ALTLABEL, LiteralElement('Human', lang='en')))
+    store.create_triple(triple('Person', RDFS_COMMENT, LiteralElement('A human being', lang='en')))
+    store.create_triple(triple('Person', EXAMPLE + 'livesIn', URIElement(EXAMPLE + 'City')))
+    store.create_triple(triple('Person', EXAMPLE + 'livesIn', URIElement(EXAMPLE + 'City')))
+    store.remove_triple(triple('Person', RDFS_COMMENT, LiteralElement('A human being', lang='en')))
+
+    person = store.entity(EXAMPLE + 'Person').to_json()
+    city = store.entity(EXAMPLE + 'City')
+    lives_in = store.entity(EXAMPLE + 'livesIn')
+    assert person['labels'] == {'en': {'language': 'en', 'value': 'Person'},
+                                'es': {'language': 'es', 'value': 'Persona'}}
+    assert person['descriptions'] == {}
+    assert person['aliases'] == {'en': [{'language': 'en', 'value': 'Human'}]}
+    assert len(person['claims'][lives_in.id]) == 1
+    assert person['claims'][lives_in.id][0]['mainsnak']['datavalue']['value']['id'] == city.id
+    assert lives_in.etype == 'property' and lives_in.datatype == 'wikibase-item'
+    assert store.entity(EXAMPLE + 'Unknown') is None
+    assert store.operation_counts == {'create_triple': 5, 'remove_triple': 1,
+                                      'triples_added': 5, 'triples_removed': 1}
+
+
+def test_final_state_of_a_plan():
+    factory = InMemoryURIFactory({EXAMPLE + 'City': 'Q100'})
+    store = InMemoryTripleStore(EntityModel(factory), metrics=InMemoryMetrics())
+    synchronizer = OntologySynchronizer(GraphDiffSyncAlgorithm())
+    execute_ops(optimize_ops(synchronizer.synchronize('', SOURCE)), store)
+    results = execute_ops(optimize_ops(synchronizer.synchronize(SOURCE, TARGET)), store)
+
+    assert all(res.successful for res in results)
+    person = store.entity(EXAMPLE + 'Person').to_json()
+    lives_in = store.entity(EXAMPLE + 'livesIn').id
+    assert set(person['labels']) == {'en', 'es'}
+    assert person['descriptions'] == {}
+    assert [claim['mainsnak']['datavalue']['value']['id'] for claim in person['claims'][lives_in]] == \
+        [store.entity(EXAMPLE + 'Town').id]
+    # the existing entity of City is referenced by its id, not created again
+    assert EXAMPLE + 'City' not in store.model.allocated_ids
+    assert store.operation_counts['batch_update'] == 2
+    assert results.summary['batch_update']['calls'] == 1
+
+
+def test_plan_checks_leave_the_elements_to_the_wikibase(mocked_adapter):
+    synchronizer = OntologySynchronizer(GraphDiffSyncAlgorithm())
+    ops = optimize_ops(synchronizer.synchronize('', SOURCE))
+    store = InMemoryTripleStore(EntityModel(InMemoryURIFactory(), first_item_id=100, first_property_id=100))
+    assert all(res.successful for res in execute_ops(ops, store))
+    assert all(element.id is None for op in ops for triple in op.triples for element in triple.content
+               if not element.is_literal())
+
+    assert all(res.successful for res in execute_ops(ops, mocked_adapter))
+    wb_ids = {uri: mocked_adapter._uris_factory.get_uri(URIElement(uri))
+              for uri in (EXAMPLE + 'Person', EXAMPLE + 'livesIn', EXAMPLE + 'City')}
+    # the entities are created in the wikibase, not referenced by the ids of the model
+    assert None not in wb_ids.values()
+    assert set(wb_ids.values()).isdisjoint(store.model.allocated_ids.values())
+
+
+def test_models_keep_their_uris_in_memory():
+    assert isinstance(EntityModel().uris_factory, InMemoryURIFactory)
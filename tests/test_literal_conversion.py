@@ -0,0 +1,110 @@
+import pytest
+
+from datetime import date, datetime, time, timedelta, timezone
+from decimal import Decimal
+from unittest import mock
+
+from rdflib.namespace import XSD
+from wikidataintegrator import wdi_core
+
+from wbsync.triplestore import LiteralElement
+from wbsync.util import literal_conversion
+from wbsync.util.literal_conversion import LiteralBatchConverter
+from wbsync.util.uri_constants import GEO_BASE
+
+
+@pytest.fixture
+def converter():
+    return LiteralBatchConverter()
+
+
+@pytest.fixture
+def literals():
+    return [
+        LiteralElement(date(2000, 11, 30), datatype=XSD.date),
+        LiteralElement(datetime(2000, 11, 30, 11, 30, 00), datatype=XSD.dateTime),
+        LiteralElement(datetime(2000, 11, 30, 11, 30, 00, tzinfo=timezone(timedelta(hours=2))),
+                       datatype=XSD.dateTime),
+        LiteralElement(time(4, 24, 0), datatype=XSD.time),
+        LiteralElement("Point(36.834 2.463)", datatype=f"{GEO_BASE}wktLiteral"),
+        LiteralElement("Point(12.3 -2.4635)", datatype=f"{GEO_BASE}wktLiteral"),
+        LiteralElement(-125, datatype=XSD.integer),
+        LiteralElement("12", datatype=XSD.integer),
+        LiteralElement("2.5", datatype=XSD.double),
+        LiteralElement(Decimal("1.25"), datatype=XSD.decimal),
+        LiteralElement(50, datatype=XSD.positiveInteger),
+        LiteralElement(-3, datatype=XSD.negativeInteger),
+        LiteralElement("Hello", datatype=XSD.string),
+    ]
+
+
+def test_batch_conversion_matches_single_conversion(converter, literals):
+    converter.convert(literals)
+    assert len(converter) == len(literals)
+    for literal in literals:
+        assert literal in converter
+        assert converter.to_wdi_datatype(literal, prop_nr='P1') == literal.to_wdi_datatype(prop_nr='P1')
+
+
+def test_fallback_without_pandas(converter, literals):
+    with mock.patch.object(literal_conversion, 'pd', None):
+        converter.convert(literals)
+    assert len(converter) == len(literals)
+    for literal in literals:
+        assert converter.to_wdi_datatype(literal, prop_nr='P1') == literal.to_wdi_datatype(prop_nr='P1')
+
+
+def test_repeated_literals_are_converted_once(converter):
+    literals = [LiteralElement(date(2000, 11, 30), datatype=XSD.date) for _ in range(5)]
+    with mock.patch.dict(literal_conversion.datatype2converter,
+                         {str(XSD.date): mock.MagicMock(side_effect=lambda _, c: [{'time': 'x'}] * len(c))}):
+        converter.convert(literals)
+        converter.convert(literals)
+        group_converter = literal_conversion.datatype2converter[str(XSD.date)]
+        group_converter.assert_called_once()
+        assert group_converter.call_args[0][1] == [date(2000, 11, 30)]
+    assert len(converter) == 1
+
+
+def test_untyped_and_unsupported_literals_are_not_converted(converter):
+    literals = [
+        LiteralElement("test"),
+        LiteralElement("목소리", lang='ko'),
+        LiteralElement("12", datatype="invented"),
+        LiteralElement(True, datatype=XSD.boolean),
+        LiteralElement("not a number", datatype=XSD.integer),
+        LiteralElement("not a date", datatype=XSD.date),
+    ]
+    converter.convert(literals)
+    assert len(converter) == 0
+    assert converter.to_wdi_datatype(literals[0], prop_nr='P1') == wdi_core.WDString(value="test", prop_nr='P1')
+    with pytest.raises(NotImplementedError):
+        converter.to_wdi_datatype(literals[3], prop_nr='P1')
+
+
+def test_out_of_bounds_dates_are_converted_one_by_one(converter):
+    literals = [LiteralElement(date(1492, 10, 12), datatype=XSD.date),
+                LiteralElement(date(2000, 11, 30), datatype=XSD.date)]
+    converter.convert(literals)
+    for literal in literals:
+        assert converter.to_wdi_datatype(literal, prop_nr='P1') == literal.to_wdi_datatype(prop_nr='P1')
+
+
+def test_equal_values_with_different_lexical_forms_are_converted_apart(converter):
+    literals = [
+        LiteralElement(datetime(2020, 1, 1, 12, 0, tzinfo=timezone(timedelta(hours=2))), datatype=XSD.dateTime),
+        LiteralElement(datetime(2020, 1, 1, 10, 0, tzinfo=timezone.utc), datatype=XSD.dateTime),
+        LiteralElement(Decimal("1.1"), datatype=XSD.decimal),
+        LiteralElement(Decimal("1.10"), datatype=XSD.decimal),
+    ]
+    converter.convert(literals)
+    assert len(converter) == len(literals)
+    for literal in literals:
+        assert converter.to_wdi_datatype(literal, prop_nr='P1') == literal.to_wdi_datatype(prop_nr='P1')
+
+
+def test_decimals_keep_their_precision(converter):
+    literal = LiteralElement("3.14159265358979323846", datatype=XSD.decimal)
+    converter.convert([literal])
+    quantity = converter.to_wdi_datatype(literal, prop_nr='P1')
+    assert quantity.get_value()[0] == "+3.14159265358979323846"
@@ -4,7 +4,7 @@ from datetime import date, datetime, time
 
 from wikidataintegrator import wdi_core
 
-from wbsync.util.mappings import datatype2wdiobject, datatype2wdidtype
+from wbsync.util.mappings import datatype2wdiclass, datatype2wdiobject, datatype2wdidtype
 from wbsync.util.uri_constants import GEO_BASE, XSD_BASE
 
 def test_time_mapping():
@@ -44,3 +44,19 @@ def test_string():
     result = datatype2wdiobject[f"{XSD_BASE}string"]("Hello", prop_nr=-1)
     expected = wdi_core.WDString(value="Hello", prop_nr=-1)
     assert result == expected
+
+def test_wdiclass_table_matches_created_objects():
+    samples = {
+        f"{GEO_BASE}wktLiteral": "Point(36.834 2.463)",
+        f"{XSD_BASE}dateTime": datetime(2000, 11, 30, 11, 30, 00),
+        f"{XSD_BASE}decimal": 2.5,
+        f"{XSD_BASE}negativeInteger": -3,
+        f"{XSD_BASE}string": "Hello",
+    }
+    for datatype, content in samples.items():
+        wdi_class = datatype2wdiclass[datatype]
+        assert isinstance(datatype2wdiobject[datatype](content, prop_nr=-1), wdi_class)
+        assert wdi_class.DTYPE == datatype2wdidtype[datatype]
+
+def test_wdiclass_table_covers_all_datatypes():
+    assert set(datatype2wdiclass) == set(datatype2wdiobject) - {f"{XSD_BASE}boolean"}
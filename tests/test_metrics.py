@@ -0,0 +1,135 @@
+from unittest import mock
+
+import json
+import pytest
+import requests
+import threading
+
+from wbsync.external.bootstrap_cache import BootstrapCache
+from wbsync.external.uri_factory import InMemoryURIFactory
+from wbsync.synchronization import AdditionOperation
+from wbsync.synchronization.operations import execute_ops
+from wbsync.triplestore import InMemoryMetrics, LiteralElement, TripleInfo, URIElement, WikibaseAdapter
+from wbsync.triplestore.fake_wikibase import FakeWikibase, FakeWikibaseTransport
+from wbsync.triplestore.metrics import collect_calls, measure, record_call
+from wbsync.triplestore.transport import InstrumentedTransport, RequestsTransport
+from wbsync.util.uri_constants import RDFS_LABEL
+
+EXAMPLE = 'https://example.org/onto#'
+
+
+def test_in_memory_metrics():
+    metrics = InMemoryMetrics(buckets=(0.1, 1))
+    metrics.record('wbeditentity', 0.05, 100, True)
+    metrics.record('wbeditentity', 0.5, 50, False)
+    metrics.record('wbgetentities', 2, 10, True)
+    summary = metrics.summary()
+    assert summary['wbeditentity'] == {
+        'calls': 2, 'failures': 1, 'latency': 0.55, 'payload_bytes': 150,
+        'latency_histogram': {0.1: 1, 1: 1, float('inf'): 0}
+    }
+    assert summary['wbgetentities']['latency_histogram'] == {0.1: 0, 1: 0, float('inf'): 1}
+
+    metrics.reset()
+    assert metrics.summary() == {}
+
+
+def test_measure():
+    metrics = mock.MagicMock()
+    with measure(metrics, 'wbgetentities', 5):
+        pass
+    with pytest.raises(ValueError):
+        with measure(metrics, 'wbeditentity'):
+            raise ValueError()
+    assert [(call[0][0], call[0][2], call[0][3]) for call in metrics.record.call_args_list] == \
+        [('wbgetentities', 5, True), ('wbeditentity', 0, False)]
+
+    with measure(None, 'wbgetentities'):
+        pass
+
+
+def test_instrumented_transport():
+    metrics = InMemoryMetrics()
+    transport = InstrumentedTransport(FakeWikibaseTransport(FakeWikibase()), metrics)
+    transport.get('http://wikibase.example.org/w/api.php?action=wbgetentities&ids=Q1')
+    transport.post('http://wikibase.example.org/w/api.php', {'action': 'wbeditentity', 'id': 'Q1'}, None)
+    summary = metrics.summary()
+    assert summary['wbgetentities']['failures'] == 0
+    assert summary['wbeditentity']['failures'] == 1
+    assert summary['wbeditentity']['payload_bytes'] == len('action=wbeditentity&id=Q1')
+
+
+class ScriptedAdapter(requests.adapters.BaseAdapter):
+    """ Adapter of a requests session that answers with the given JSON bodies. """
+
+    def __init__(self, bodies):
+        super().__init__()
+        self.bodies = list(bodies)
+
+    def send(self, request, **kwargs):
+        response = requests.Response()
+        response.status_code = 200
+        response._content = json.dumps(self.bodies.pop(0)).encode('utf-8')
+        response.request = request
+        response.url = request.url
+        return response
+
+    def close(self):
+        pass
+
+
+def test_retried_attempts_are_recorded():
+    api_url = 'http://wikibase.example.org/w/api.php'
+    session = requests.Session()
+    session.mount('http://', ScriptedAdapter([{'error': {'code': 'maxlag', 'lag': 0}},
+                                              {'success': 1, 'entity': {'id': 'Q1'}}]))
+    inner = RequestsTransport()
+    inner.login = mock.MagicMock(return_value=mock.MagicMock(**{'get_session.return_value': session}))
+    metrics = InMemoryMetrics()
+    transport = InstrumentedTransport(inner, metrics)
+    login = transport.login('user', 'pass', api_url)
+    assert transport.post(api_url, {'action': 'wbeditentity', 'id': 'Q1'}, login)['success'] == 1
+    summary = metrics.summary()
+    assert summary['wbeditentity']['calls'] == 2
+    assert summary['wbeditentity']['failures'] == 1
+
+
+def test_collect_calls_of_the_current_thread():
+    metrics = InMemoryMetrics()
+    with collect_calls() as calls:
+        record_call(metrics, 'wbeditentity', 0.1, 10, True)
+        other = threading.Thread(target=record_call, args=(metrics, 'wbgetentities', 0.1, 10, True))
+        other.start()
+        other.join()
+    record_call(metrics, 'wbeditentity', 0.1, 10, True)
+    assert set(calls.summary()) == {'wbeditentity'}
+    assert calls.summary()['wbeditentity']['calls'] == 1
+    assert metrics.summary()['wbeditentity']['calls'] == 2
+    assert metrics.summary()['wbgetentities']['calls'] == 1
+
+
+def test_execute_ops_summary():
+    metrics = InMemoryMetrics()
+    adapter = WikibaseAdapter('http://wikibase.example.org/w/api.php', 'http://wikibase.example.org/sparql',
+                              'user', 'pass', factory_of_uris=InMemoryURIFactory(),
+                              bootstrap_cache=BootstrapCache(path=None), direct_writes=True,
+                              transport=FakeWikibaseTransport(FakeWikibase()), metrics=metrics)
+    ops = [AdditionOperation(URIElement('https://example.org/onto#Person'), URIElement(RDFS_LABEL),
+                             LiteralElement('Person', lang='en'))]
+    results = execute_ops(ops, adapter)
+    assert all(res.successful for res in results)
+    # the related link property is searched and created, then the item is created and edited
+    assert results.summary['wbsearchentities']['calls'] == 1
+    assert results.summary['wbeditentity']['calls'] == 3
+    assert 'login' not in results.summary
+    assert metrics.summary()['login']['calls'] == 1
+
+
+def test_item_engine_calls_are_recorded(mocked_adapter):
+    mocked_adapter.metrics = InMemoryMetrics()
+    mocked_adapter.create_triple(TripleInfo(URIElement('https://example.org/onto#Person'),
+                                            URIElement(EXAMPLE + 'livesIn'), URIElement(EXAMPLE + 'City')))
+    summary = mocked_adapter.metrics.summary()
+    # the subject, object and predicate are created, then the subject is read and edited
+    assert summary['wbeditentity']['calls'] == 4
+    assert summary['wbgetentities']['calls'] == 1
@@ -3,8 +3,9 @@ from unittest import mock
 import pytest
 
 from wbsync.synchronization import AdditionOperation, BatchOperation, RemovalOperation
-from wbsync.synchronization.operations import optimize_ops
+from wbsync.synchronization.operations import execute_ops, optimize_ops
 from wbsync.triplestore import LiteralElement, TripleInfo, URIElement
+from wbsync.util.error import InvalidArgumentError
 from wbsync.util.uri_constants import RDFS_LABEL
 
 
@@ -66,6 +67,29 @@ def test_optimize_ops(triple):
         assert isinstance(op, BatchOperation)
 
 
+def test_execute_ops(mock_triplestore, triple):
+    triple_b = (URIElement('http://example.org/onto#Singer'), URIElement(RDFS_LABEL),
+                LiteralElement('Cantante', 'es'))
+    ops = [AdditionOperation(*triple), BatchOperation(triple_b[0], [TripleInfo(*triple_b)])]
+    results = execute_ops(ops, mock_triplestore)
+    mock_triplestore.prepare.assert_called_once_with([TripleInfo(*triple), TripleInfo(*triple_b)])
+    mock_triplestore.create_triple.assert_called_once_with(TripleInfo(*triple))
+    mock_triplestore.batch_update.assert_called_once_with(triple_b[0], [TripleInfo(*triple_b)])
+    assert results == [mock_triplestore.create_triple.return_value,
+                       mock_triplestore.batch_update.return_value]
+    mock_triplestore.finish.assert_called_once_with()
+
+
+def test_execute_ops_in_waves(mock_triplestore, triple):
+    ops = [AdditionOperation(*triple) for _ in range(5)]
+    results = execute_ops(ops, mock_triplestore, wave_size=2)
+    assert len(results) == 5
+    assert [len(call[0][0]) for call in mock_triplestore.prepare.call_args_list] == [2, 2, 1]
+
+    with pytest.raises(InvalidArgumentError):
+        execute_ops(ops, mock_triplestore, wave_size=0)
+
+
 def test_two_operations_with_same_triple_are_distinct(triple):
     add = AdditionOperation(*triple)
     remove = RemovalOperation(*triple)
@@ -0,0 +1,120 @@
+import threading
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from rdflib import Graph, Literal, URIRef
+
+from wbsync.triplestore import AnonymousElement, InMemoryMetrics, LiteralElement, TripleElement, TripleInfo, \
+    URIElement
+from wbsync.triplestore.sparql_update import SparqlUpdateManager, to_n3
+from wbsync.util.uri_constants import RDFS_LABEL, XSD_BASE
+
+EXAMPLE = 'https://example.org/onto#'
+
+
+class SparqlEndpoint():
+    """ SPARQL Update endpoint backed by a rdflib graph. """
+
+    def __init__(self):
+        self.graph = Graph()
+        self.updates = []
+        endpoint = self
+
+        class UpdateHandler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                update = self.rfile.read(int(self.headers['Content-Length'])).decode('utf-8')
+                endpoint.updates.append(update)
+                try:
+                    endpoint.graph.update(update)
+                    status = 204
+                except Exception:
+                    status = 400
+                self.send_response(status)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('localhost', 0), UpdateHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://localhost:{self.server.server_address[1]}/update"
+
+
+@pytest.fixture
+def endpoint():
+    endpoint = SparqlEndpoint()
+    yield endpoint
+    endpoint.server.shutdown()
+    endpoint.server.server_close()
+
+
+def triple(subject, predicate, objct, isAdded=True):
+    return TripleInfo(URIElement(EXAMPLE + subject), URIElement(predicate), objct, isAdded=isAdded)
+
+
+def test_changes_are_written_in_order(endpoint):
+    label = LiteralElement('Person "human"', lang='en')
+    age = LiteralElement(42, datatype=XSD_BASE + 'integer')
+    bnode = AnonymousElement('b1')
+    with SparqlUpdateManager(endpoint.url) as manager:
+        manager.create_triple(triple('Person', RDFS_LABEL, label))
+        manager.create_triple(triple('Person', EXAMPLE + 'age', age))
+        manager.create_triple(triple('Person', EXAMPLE + 'knows', bnode))
+        manager.remove_triple(triple('Person', EXAMPLE + 'age', age))
+        manager.create_triple(triple('Person', EXAMPLE + 'age', LiteralElement(43, datatype=XSD_BASE + 'integer')))
+        assert len(manager) == 5
+        assert not endpoint.updates
+
+    assert len(endpoint.updates) == 1
+    assert endpoint.updates[0].count('DATA {') == 3
+    person = URIRef(EXAMPLE + 'Person')
+    assert set(endpoint.graph) == {
+        (person, URIRef(RDFS_LABEL), Literal('Person "human"', lang='en')),
+        (person, URIRef(EXAMPLE + 'age'), Literal(43)),
+        (person, URIRef(EXAMPLE + 'knows'), URIRef(bnode.uri))
+    }
+
+
+def test_literals_keep_their_lexical_form(endpoint):
+    person = URIRef(EXAMPLE + 'Person')
+    age = URIRef(EXAMPLE + 'age')
+    literals = [Literal('01', datatype=URIRef(XSD_BASE + 'integer')),
+                Literal('unknown', datatype=URIRef(XSD_BASE + 'integer'))]
+    for literal in literals:
+        endpoint.graph.add((person, age, literal))
+    elements = [TripleElement.from_rdflib(literal) for literal in literals]
+    assert [to_n3(element) for element in elements] == [literal.n3() for literal in literals]
+
+    with SparqlUpdateManager(endpoint.url) as manager:
+        for element in elements:
+            manager.remove_triple(triple('Person', EXAMPLE + 'age', element, isAdded=False))
+    assert len(endpoint.graph) == 0
+
+
+def test_requests_are_sized_by_payload(endpoint):
+    metrics = InMemoryMetrics()
+    manager = SparqlUpdateManager(endpoint.url, max_payload_bytes=400, metrics=metrics)
+    triples = [triple(f'Concept{i}', RDFS_LABEL, LiteralElement(f'Concept {i}', lang='en')) for i in range(20)]
+    results = [manager.create_triple(t) for t in triples]
+    results.extend(manager.flush())
+
+    assert all(res.successful for res in results)
+    assert len(endpoint.graph) == 20
+    assert len(endpoint.updates) > 1
+    assert all(len(update.encode('utf-8')) <= 400 for update in endpoint.updates)
+    summary = metrics.summary()['sparql-update']
+    assert summary['calls'] == len(endpoint.updates)
+    assert summary['payload_bytes'] == sum(len(update.encode('utf-8')) for update in endpoint.updates)
+
+
+def test_failed_requests():
+    manager = SparqlUpdateManager('http://localhost:1/update', timeout=1.0)
+    manager.create_triple(triple('Person', RDFS_LABEL, LiteralElement('Person', lang='en')))
+    res, = manager.flush()
+    assert not res.successful
+    assert not manager.flush()
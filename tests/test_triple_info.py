@@ -1,10 +1,15 @@
 import pytest
 
+from datetime import date
+from unittest import mock
+
 from rdflib.term import BNode, Literal, URIRef
 from rdflib.namespace import XSD
-from wikidataintegrator.wdi_core import WDItemID, WDProperty, WDString, WDQuantity, WDMonolingualText
+from wikidataintegrator.wdi_core import WDItemID, WDProperty, WDString, WDQuantity, WDMonolingualText, \
+    WDTime
 
-from wbsync.triplestore import AnonymousElement, LiteralElement, TripleElement, TripleInfo, URIElement
+from wbsync.triplestore import AnonymousElement, ElementRegistry, LiteralElement, TripleElement, \
+    TripleInfo, URIElement
 from wbsync.util.error import InvalidArgumentError
 from wbsync.util.uri_constants import ASIO_BASE, GEO_BASE
 
@@ -105,6 +110,21 @@ def test_from_rdflib(rdflib_triple):
     assert bnode == f'{ASIO_BASE}/genid/cb0'
 
 
+def test_from_rdflib_with_registry(rdflib_triple):
+    registry = ElementRegistry()
+    triple_a = TripleInfo.from_rdflib(rdflib_triple, registry=registry)
+    triple_b = TripleInfo.from_rdflib(rdflib_triple, isAdded=False, registry=registry)
+    assert triple_a.subject is triple_b.subject
+    assert triple_a.predicate is triple_b.predicate
+    assert triple_a.object is not triple_b.object
+    assert len(registry) == 2
+    assert str(rdflib_triple[0]) in registry
+
+    bnode = TripleElement.from_rdflib(BNode('cb0'), registry)
+    assert bnode is TripleElement.from_rdflib(BNode('cb0'), registry)
+    assert len(registry) == 3
+
+
 def test_is_blank(string_literal, item_uri, anonymous_element):
     assert not string_literal.is_blank()
     assert not item_uri.is_blank()
@@ -162,6 +182,23 @@ def test_literal_wdi_dtype(string_literal, monolingual_literal, datatype_literal
     assert datatype_literal.wdi_dtype == WDQuantity.DTYPE
 
 
+def test_literal_wdi_class_does_not_create_wdi_objects():
+    date_literal = LiteralElement(date(2000, 11, 30), datatype=XSD.date)
+    with mock.patch.dict('wbsync.triplestore.triple_info.datatype2wdiobject', clear=True):
+        assert date_literal.wdi_class == WDTime
+        assert date_literal.wdi_dtype == WDTime.DTYPE
+
+    unknown_datatype = LiteralElement("12", datatype="invented")
+    assert unknown_datatype.wdi_class == WDString
+    assert unknown_datatype.wdi_dtype == WDString.DTYPE
+
+
+def test_literal_wdi_dtype_of_unimplemented_datatypes():
+    boolean_literal = LiteralElement(True, datatype=XSD.boolean)
+    with pytest.raises(NotImplementedError):
+        boolean_literal.wdi_dtype
+
+
 def test_literal_wdi_datatype(string_literal, monolingual_literal, datatype_literal):
     assert monolingual_literal.to_wdi_datatype(prop_nr=1) == monolingual_literal.wdi_class(value=monolingual_literal.content,
         language=monolingual_literal.lang, prop_nr=1)
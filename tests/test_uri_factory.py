@@ -0,0 +1,132 @@
+import pickle
+
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+from wbsync.external import uri_factory
+from wbsync.external.mmap_uri_factory import MmapURIFactory
+from wbsync.external.uri_factory import InMemoryURIFactory, SQLiteURIFactory
+
+EXAMPLE = 'https://example.org/onto#'
+
+
+def uri(name):
+    return SimpleNamespace(uri=EXAMPLE + name)
+
+
+def test_sqlite_factory(tmp_path):
+    path = str(tmp_path / 'uris.db')
+    factory = SQLiteURIFactory(path, pickle_path=None)
+    assert factory.get_uri(uri('Person')) is None
+    factory.post_uri(uri('Person'), 'Q1')
+    factory.post_uris({EXAMPLE + 'City': 'Q2', EXAMPLE + 'Person': 'Q3'})
+    assert factory.get_uri(uri('Person')) == 'Q3'
+    factory.close()
+
+    factory = SQLiteURIFactory(path)
+    assert factory.get_uri(uri('City')) == 'Q2'
+    assert len(factory) == 2
+    factory.post_uris({EXAMPLE + f'Concept{i}': f'Q{i}' for i in range(1200)})
+    found = factory.get_uris([EXAMPLE + f'Concept{i}' for i in range(0, 1300, 2)] + [EXAMPLE + 'City'])
+    assert len(found) == 601 and found[EXAMPLE + 'Concept1198'] == 'Q1198'
+    factory.reset_factory()
+    assert len(factory) == 0 and factory.get_uris([EXAMPLE + 'City']) == {}
+
+
+def test_sqlite_factory_migrates_the_pickle(tmp_path):
+    pickle_path = str(tmp_path / 'uris.pkl')
+    with open(pickle_path, 'wb') as f:
+        pickle.dump({EXAMPLE + 'Person': 'Q1', EXAMPLE + 'livesIn': 'P2'}, f)
+
+    factory = SQLiteURIFactory(str(tmp_path / 'uris.db'), pickle_path=pickle_path)
+    assert factory.get_uri(uri('livesIn')) == 'P2'
+    factory.post_uri(uri('Person'), 'Q5')
+    factory.close()
+
+    # the pickle is only migrated when the database is created
+    factory = SQLiteURIFactory(str(tmp_path / 'uris.db'), pickle_path=pickle_path)
+    assert factory.get_uri(uri('Person')) == 'Q5'
+
+
+def test_in_memory_sqlite_factory_skips_the_default_pickle(tmp_path, monkeypatch):
+    pickle_path = str(tmp_path / 'uris.pkl')
+    with open(pickle_path, 'wb') as f:
+        pickle.dump({EXAMPLE + 'Person': 'Q1'}, f)
+    monkeypatch.setattr(uri_factory, 'URIS_FILE', pickle_path)
+
+    assert SQLiteURIFactory(':memory:').get_uri(uri('Person')) is None
+    assert SQLiteURIFactory(':memory:', pickle_path=pickle_path).get_uri(uri('Person')) == 'Q1'
+
+
+def test_sqlite_factory_from_several_threads(tmp_path):
+    factory = SQLiteURIFactory(str(tmp_path / 'uris.db'), pickle_path=None)
+
+    def post(i):
+        factory.post_uri(uri(f'Concept{i}'), f'Q{i}')
+        return factory.get_uri(uri(f'Concept{i}'))
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        assert list(executor.map(post, range(200))) == [f'Q{i}' for i in range(200)]
+    assert len(factory) == 200
+
+
+def test_in_memory_factory():
+    factory = InMemoryURIFactory({EXAMPLE + 'Person': 'Q1'})
+    factory.post_uris({EXAMPLE + 'City': 'Q2'})
+    assert factory.get_uri(uri('Person')) == 'Q1' and factory.get_uri(uri('City')) == 'Q2'
+    assert InMemoryURIFactory().get_uri(uri('Person')) is None
+
+
+def test_mmap_factory(tmp_path):
+    path = str(tmp_path / 'uris.idx')
+    factory = MmapURIFactory(path, compact_threshold=None)
+    assert factory.get_uri(uri('Person')) is None
+    factory.post_uri(uri('Person'), 'Q1')
+    factory.post_uris({EXAMPLE + 'City': 'Q2', 'http://other.org/livesIn': 'P3'})
+    assert factory.compact() == 3
+    factory.post_uri(uri('Person'), 'Q4')
+    assert factory.get_uri(uri('Person')) == 'Q4'
+
+    # a new process reads the index and the delta
+    other = MmapURIFactory(path, compact_threshold=None)
+    assert other.get_uris([EXAMPLE + 'Person', EXAMPLE + 'Town', 'http://other.org/livesIn']) == \
+        {EXAMPLE + 'Person': 'Q4', 'http://other.org/livesIn': 'P3'}
+    factory.post_uri(uri('Town'), 'Q5')
+    assert other.get_uri(uri('Town')) is None
+    other.refresh()
+    assert other.get_uri(uri('Town')) == 'Q5'
+    factory.compact()
+    other.refresh()
+    assert other.get_uri(uri('Town')) == 'Q5' and len(other) == 4
+    factory.reset_factory()
+    assert len(factory) == 0 and factory.get_uri(uri('City')) is None
+
+
+def test_mmap_factory_index(tmp_path):
+    factory = MmapURIFactory(str(tmp_path / 'uris.idx'), compact_threshold=1000)
+    uris = {EXAMPLE + f'Concept{i}': f'Q{i}' for i in range(2500)}
+    factory.post_uris(uris)
+    # the delta is merged when it reaches the threshold
+    assert not factory._delta and factory._index.num_entries == 2500
+    assert factory._index.prefixes == [EXAMPLE]
+    assert factory.get_uris(list(uris) + [EXAMPLE + 'Concept2500']) == uris
+    assert dict(factory.items()) == uris
+
+
+def test_mmap_factory_imports_the_pickle(tmp_path):
+    pickle_path = str(tmp_path / 'uris.pkl')
+    with open(pickle_path, 'wb') as f:
+        pickle.dump({EXAMPLE + 'Person': 'Q1', EXAMPLE + 'livesIn': 'P2'}, f)
+    factory = MmapURIFactory(str(tmp_path / 'uris.idx'))
+    assert factory.import_pickle(pickle_path) == 2
+    assert factory.get_uri(uri('livesIn')) == 'P2'
+
+
+def test_known_uris(tmp_path):
+    uris = {EXAMPLE + 'Person': 'Q1', EXAMPLE + 'City': 'Q2'}
+    sqlite_factory = SQLiteURIFactory(str(tmp_path / 'uris.db'), pickle_path=None)
+    mmap_factory = MmapURIFactory(str(tmp_path / 'uris.idx'))
+    for factory in (InMemoryURIFactory(), sqlite_factory, mmap_factory):
+        factory.post_uris(uris)
+        factory.post_uri(uri('Town'), None)
+        assert set(factory.known_uris()) == set(uris)
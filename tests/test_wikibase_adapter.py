@@ -3,15 +3,19 @@ from unittest import mock
 import json
 import logging
 import pytest
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
 
 from wikidataintegrator import wdi_core
 
-from wbsync.external.uri_factory import URIFactoryMock
+from wbsync.external.uri_factory import InMemoryURIFactory, URIFactory, URIFactoryMock
 from wbsync.triplestore import URIElement, LiteralElement, ModificationResult, \
-    TripleInfo, WikibaseAdapter, AnonymousElement
+    TripleInfo, WikibaseAdapter, AnonymousElement, ElementRegistry
 from wbsync.triplestore.wikibase_adapter import DEFAULT_LANG, MAPPINGS_PROP_DESC, \
     RELATED_LINK_DESC, RELATED_LINK_LABEL, \
-    MAPPINGS_PROP_LABEL, is_same_as_activated
+    MAPPINGS_PROP_LABEL, bind_base_revision, is_same_as_activated
 
 from wbsync.util.uri_constants import ASIO_BASE, GEO_BASE, RDFS_LABEL, RDFS_COMMENT, \
     SKOS_ALTLABEL, SCHEMA_NAME, SCHEMA_DESCRIPTION, \
@@ -108,10 +112,17 @@ def triples():
     }
 
 
+@pytest.fixture
+def item_engine_term_edits(mocked_adapter):
+    """ Write the terms of the mocked adapter with the item engine, like the statements. """
+    mocked_adapter._lightweight_term_edits = False
+
+
 def raise_wdapierror(err_msg):
     raise wdi_core.WDApiError(err_msg)
 
 
+@pytest.mark.usefixtures('item_engine_term_edits')
 def test_alternative_description_uris(mocked_adapter, triples):
     desc_en = triples['desc_en']
     desc_en.predicate.uri = SCHEMA_DESCRIPTION
@@ -122,6 +133,7 @@ def test_alternative_description_uris(mocked_adapter, triples):
     writer.set_description.assert_has_calls(set_desc_calls, any_order=False)
 
 
+@pytest.mark.usefixtures('item_engine_term_edits')
 def test_alternative_label_uris(mocked_adapter, triples):
     label_en = triples['label_en']
     label_ko = triples['label_ko']
@@ -239,6 +251,124 @@ def test_existing_entity_is_not_created_again(mocked_adapter, triples):
                      append_value=[triple_b.predicate.id]) in writer.update.mock_calls
 
 
+def test_initial_load(mocked_adapter, triples):
+    registry = ElementRegistry()
+    person = registry.uri_element('https://example.org/onto#Person')
+    lives_in = registry.uri_element('https://example.org/onto#livesIn')
+    city = registry.uri_element('https://example.org/onto#City')
+    alt_name = registry.uri_element('https://example.org/onto#altName')
+    load_triples = [
+        TripleInfo(person, URIElement(RDFS_LABEL), LiteralElement('Person', lang='en')),
+        TripleInfo(person, lives_in, city),
+        TripleInfo(person, URIElement(RDFS_COMMENT), LiteralElement('A person', lang='en')),
+        TripleInfo(person, alt_name, LiteralElement('Human')),
+        TripleInfo(city, URIElement(RDFS_LABEL), LiteralElement('City', lang='en')),
+    ]
+    results = mocked_adapter.initial_load(load_triples, max_workers=1)
+    assert all(res.successful for res in results)
+    assert len(results) == 5  # 4 creations + 1 edit of person
+
+    assert (person.id, city.id, lives_in.id, alt_name.id) == ('Q1', 'Q2', 'P3', 'P4')
+    assert lives_in.etype == 'property'
+    assert mocked_adapter._uris_factory.get_uri(lives_in) == 'P3'
+
+    writer = mocked_adapter._local_item_engine(None)
+    login = mocked_adapter._local_login
+    write_calls = [
+        mock.call(login, entity_type='item', property_datatype=None),
+        mock.call(login, entity_type='item', property_datatype=None),
+        mock.call(login, entity_type='property', property_datatype='wikibase-item'),
+        mock.call(login, entity_type='property', property_datatype='string'),
+        mock.call(login, entity_type='item', property_datatype=None)
+    ]
+    assert writer.write.mock_calls == write_calls
+    # terms are written when the entities are created, entities are never fetched
+    assert writer.set_label.mock_calls == [mock.call('Person'), mock.call('Person', 'en'),
+                                          mock.call('City'), mock.call('City', 'en'),
+                                          mock.call('livesIn'), mock.call('altName')]
+    writer.set_description.assert_called_once_with('A person', 'en')
+    assert mock.call('Q1') not in mocked_adapter._local_item_engine.mock_calls
+    assert mock.call(data=[city.to_wdi_datatype(prop_nr='P3')], append_value=['P3']) in writer.update.mock_calls
+
+
+def test_initial_load_skips_triples_of_failed_entities(mocked_adapter, triples):
+    triple = triples['wditemid']
+    writer = mocked_adapter._local_item_engine(None)
+    writer.write = mock.MagicMock(side_effect=['Q1', wdi_core.WDApiError({'error': {'code': 'failed', 'info': 'err'}}),
+                                               'P3'])
+    results = mocked_adapter.initial_load([triple], max_workers=1)
+    assert [res.successful for res in results] == [True, False, True, False]
+    assert writer.write.call_count == 3
+
+
+def test_initial_load_looks_up_the_uris_once(mocked_adapter, triples):
+    mocked_adapter._uris_factory.post_uri(triples['wditemid'].object, 'Q7')
+    mocked_adapter._uris_factory = mock.MagicMock(wraps=mocked_adapter._uris_factory)
+    results = mocked_adapter.initial_load([triples['wditemid'], triples['wdstring']], max_workers=1)
+    assert all(res.successful for res in results)
+    mocked_adapter._uris_factory.get_uris.assert_called_once()
+    mocked_adapter._uris_factory.get_uri.assert_not_called()
+
+
+def test_initial_load_turns_errors_into_failed_results(mocked_adapter, triples):
+    writer = mocked_adapter._local_item_engine(None)
+    writer.write = mock.MagicMock(side_effect=['Q1', 'P2', ConnectionError('connection reset')])
+    mocked_adapter.finish = mock.MagicMock()
+    results = mocked_adapter.initial_load([triples['wdstring']], max_workers=1)
+    assert [res.successful for res in results] == [True, True, False]
+    assert results[-1].message == 'connection reset'
+    mocked_adapter.finish.assert_called_once()
+
+    mocked_adapter.prepare = mock.MagicMock(side_effect=ConnectionError())
+    with pytest.raises(ConnectionError):
+        mocked_adapter.initial_load([triples['wdstring']])
+    assert mocked_adapter.finish.call_count == 2
+
+
+def test_interned_elements_are_resolved_once(mocked_adapter):
+    registry = ElementRegistry()
+    subject = registry.uri_element('https://example.org/onto#Person')
+    predicate = registry.uri_element('https://example.org/onto#altName')
+    mocked_adapter._uris_factory = mock.MagicMock(wraps=mocked_adapter._uris_factory)
+    mocked_adapter.create_triple(TripleInfo(subject, predicate, LiteralElement('Human')))
+    mocked_adapter.create_triple(TripleInfo(subject, predicate, LiteralElement('Individual')))
+
+    assert subject.id == 'Q1'
+    assert predicate.id == 'P2'
+    assert mocked_adapter._uris_factory.get_uri.call_count == 2
+
+
+def test_concurrent_lookups_create_entities_once(mocked_adapter):
+    uris = [f'https://example.org/onto#Concept{i}' for i in range(4)]
+    created = []
+    lock = threading.Lock()
+
+    def write(_, **kwargs):
+        time.sleep(0.01)
+        with lock:
+            created.append(kwargs['entity_type'])
+            return f'Q{len(created)}'
+
+    mocked_adapter._local_item_engine(None).write = mock.MagicMock(side_effect=write)
+    # a new element for each lookup, so no lookup is short-circuited by the interned ids
+    lookups = [URIElement(uri) for uri in uris for _ in range(16)]
+    barrier = threading.Barrier(16)
+
+    def lookup(element):
+        barrier.wait()
+        return element.uri, mocked_adapter._get_wb_id_of(element, element.wdi_proptype)
+
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        results = list(executor.map(lookup, lookups))
+
+    assert len(created) == len(uris)
+    ids = {}
+    for uri, wb_id in results:
+        assert ids.setdefault(uri, wb_id) == wb_id
+    assert sorted(ids.values()) == sorted(f'Q{i}' for i in range(1, len(uris) + 1))
+    assert mocked_adapter._creations == {}
+
+
 @mock.patch('requests.get', side_effect=mocked_requests_prop_existing)
 def test_get_or_create_mappings_existing(mock_get, mocked_adapter, triples):
     mocked_adapter.api_url = 'www.example.org'
@@ -265,13 +395,74 @@ def test_init(mock_get, mock_login, mock_item_engine):
     SPARQL_URL = 'https://hercules-demo.wiki.opencura.com/QueryService'
     USER = 'test'
     PASS = 'testPass123'
-    adapter = WikibaseAdapter(API_URL, SPARQL_URL, USER, PASS, URI_SET_FOR_SAMEAS)
+    adapter = WikibaseAdapter(API_URL, SPARQL_URL, USER, PASS, URI_SET_FOR_SAMEAS,
+                              factory_of_uris=InMemoryURIFactory())
     assert adapter.api_url == API_URL
     assert adapter.sparql_url == SPARQL_URL
     mock_login.assert_has_calls([mock.call(USER, PASS, API_URL)])
     mock_item_engine.assert_has_calls([mock.call(API_URL, SPARQL_URL)])
 
 
+@mock.patch('requests.get', side_effect=mocked_requests_prop_existing)
+def test_bootstrap_props_are_resolved_lazily(mock_get, mocked_adapter):
+    mocked_adapter.api_url = 'www.example.org'
+    mocked_adapter._mappings_prop = None
+    mocked_adapter._related_link_prop = None
+    assert mock_get.call_count == 0
+    assert mocked_adapter._mappings_prop == 'P42'
+    assert mocked_adapter._mappings_prop == 'P42'
+    assert mock_get.call_count == 1
+    assert mocked_adapter._bootstrap_cache.get('www.example.org', 'mappings_prop') == 'P42'
+
+    # a new adapter of the same wikibase reads the id from the cache
+    mocked_adapter._mappings_prop = None
+    assert mocked_adapter._mappings_prop == 'P42'
+    assert mock_get.call_count == 1
+
+
+@pytest.mark.usefixtures('item_engine_term_edits')
+def test_unknown_property_invalidates_bootstrap_props(mocked_adapter, triples):
+    mocked_adapter._bootstrap_cache.set(mocked_adapter.api_url, 'mappings_prop', 'P42')
+    mocked_adapter._mappings_prop = 'P42'
+    writer = mocked_adapter._local_item_engine(None)
+    writer.write = mock.MagicMock(side_effect=wdi_core.WDApiError({'error': {
+        'code': 'modification-failed', 'info': 'Property P42 not found',
+        'messages': [{'name': 'wikibase-validator-no-such-property'}]
+    }}))
+    triple = triples['desc_en']
+    triple.subject.id = 'Q7'
+    assert not mocked_adapter.create_triple(triple).successful
+    assert mocked_adapter._bootstrap_cache.get(mocked_adapter.api_url, 'mappings_prop') is None
+    assert mocked_adapter._mappings_prop_id is None
+
+
+def test_creation_is_retried_with_new_bootstrap_props(mocked_adapter):
+    mocked_adapter._related_link_prop = 'P42'
+    mocked_adapter._get_or_create_related_link_prop = mock.MagicMock(return_value='P43')
+    writer = mocked_adapter._local_item_engine(None)
+    writer.write = mock.MagicMock(side_effect=[wdi_core.WDApiError({'error': {
+        'code': 'modification-failed', 'info': 'Property P42 not found',
+        'messages': [{'name': 'wikibase-validator-no-such-property'}]
+    }}), 'Q1'])
+    person = URIElement('https://example.org/onto#Person')
+    assert mocked_adapter._get_wb_id_of(person, None) == 'Q1'
+    assert mocked_adapter._related_link_prop == 'P43'
+    assert mocked_adapter._uris_factory.get_uri(person) == 'Q1'
+
+
+def test_failed_creations_are_not_posted(mocked_adapter, triples):
+    writer = mocked_adapter._local_item_engine(None)
+    writer.write = mock.MagicMock(side_effect=wdi_core.WDApiError({'error': {
+        'code': 'failed-save', 'info': 'The save has failed.'}}))
+    triple = triples['wdstring']
+    res = mocked_adapter.create_triple(triple)
+    assert not res.successful and res.message == 'The save has failed.'
+    assert triple.subject.id is None
+    assert mocked_adapter._uris_factory.get_uri(triple.subject) is None
+    assert writer.write.call_count == 1
+
+
+@pytest.mark.usefixtures('item_engine_term_edits')
 def test_label_no_lang_uses_default_lang(mocked_adapter, triples):
     triple = triples['label_no_lang']
     mocked_adapter.create_triple(triple)
@@ -286,6 +477,7 @@ def test_label_no_lang_uses_default_lang(mocked_adapter, triples):
     assert writer.set_label.call_count == 2  # labra + related link
 
 
+@pytest.mark.usefixtures('item_engine_term_edits')
 def test_label_with_no_hashtag_is_inferred(mocked_adapter, triples):
     triple = triples['no_hashtag']
     mocked_adapter.create_triple(triple)
@@ -300,6 +492,7 @@ def test_label_with_no_hashtag_is_inferred(mocked_adapter, triples):
     assert writer.set_label.call_count == 2
 
 
+@pytest.mark.usefixtures('item_engine_term_edits')
 def test_long_description_is_shortened(mocked_adapter, triples):
     triple = triples['desc_long']
     mocked_adapter.create_triple(triple)
@@ -339,6 +532,282 @@ def test_modification_result_is_returned(mocked_adapter, triples):
     assert res.message == ""
 
 
+def test_prepare_converts_literals(mocked_adapter, triples):
+    triple = triples['literal_datatype']
+    mocked_adapter.prepare([triple, triples['wdstring'], triples['label_en']])
+    assert triple.object in mocked_adapter._literal_converter
+    assert len(mocked_adapter._literal_converter) == 1
+
+    mocked_adapter.create_triple(triple)
+    writer = mocked_adapter._local_item_engine(None)
+    update_call = mock.call(data=[triple.object.to_wdi_datatype(prop_nr=triple.predicate.id)],
+                            append_value=[triple.predicate.id])
+    assert update_call in writer.update.mock_calls
+
+
+def mocked_requests_wbgetentities(url):
+    ids = url.split('&ids=')[1].split('&')[0].split('|')
+    entities = {entity_id: {'id': entity_id, 'claims': {}, 'lastrevid': 1} for entity_id in ids}
+    entities['Q404'] = {'id': 'Q404', 'missing': ''}
+    return FakeRequestsResponse(json.dumps({'entities': entities}))
+
+
+@mock.patch('requests.get', side_effect=mocked_requests_wbgetentities)
+def test_prefetch_entities_in_batches(mock_get, mocked_adapter):
+    mocked_adapter.api_url = 'www.example.org'
+    ids = [f'Q{i}' for i in range(1, 121)]
+    mocked_adapter.prefetch_entities(ids + ['Q1', 'Q404'])
+    assert mock_get.call_count == 3
+    requested_ids = [call[0][0].split('&ids=')[1].split('&')[0].split('|') for call in mock_get.call_args_list]
+    assert [len(batch) for batch in requested_ids] == [50, 50, 21]
+    assert len(mocked_adapter._entity_cache) == 120
+
+    # already prefetched entities are not requested again
+    mocked_adapter.prefetch_entities(['Q1', 'Q2'])
+    assert mock_get.call_count == 3
+
+
+@mock.patch('requests.get', side_effect=mocked_requests_wbgetentities)
+@pytest.mark.usefixtures('item_engine_term_edits')
+def test_prepare_prefetches_known_subjects(mock_get, mocked_adapter, triples):
+    mocked_adapter.api_url = 'www.example.org'
+    known = triples['desc_en']
+    mocked_adapter._uris_factory.post_uri(known.subject, 'Q7')
+    mocked_adapter.prepare([known, triples['desc_es'], triples['label_en']])
+    assert mock_get.call_count == 1
+    assert 'Q7' in mocked_adapter._entity_cache
+    assert len(mocked_adapter._entity_cache) == 1
+
+    mocked_adapter.create_triple(known)
+    mocked_adapter.create_triple(known)
+    item_engine_calls = [
+        mock.call('Q7', item_data={'id': 'Q7', 'claims': {}, 'lastrevid': 1}),
+        mock.call('Q7')
+    ]
+    mocked_adapter._local_item_engine.assert_has_calls(item_engine_calls)
+    # the mocked write doesn't return the new state of the entity
+    assert 'Q7' not in mocked_adapter._entity_cache
+
+
+@pytest.mark.usefixtures('item_engine_term_edits')
+def test_writes_update_the_entity_cache(mocked_adapter, triples):
+    writer = mocked_adapter._local_item_engine(None)
+    writer.write = mock.MagicMock(return_value='Q7')
+    writer.wd_json_representation = {'claims': {}, 'descriptions': {}}
+    writer.lastrevid = 5
+    triple = triples['desc_en']
+    triple.subject.id = 'Q7'
+    mocked_adapter.create_triple(triple)
+    assert mocked_adapter._entity_cache.lastrevid('Q7') == 5
+
+    mocked_adapter._local_item_engine.reset_mock()
+    mocked_adapter.create_triple(triple)
+    mocked_adapter._local_item_engine.assert_called_once_with(
+        'Q7', item_data={'id': 'Q7', 'claims': {}, 'descriptions': {}, 'lastrevid': 5})
+
+    mocked_adapter.finish()
+    assert 'Q7' not in mocked_adapter._entity_cache
+
+
+@pytest.mark.usefixtures('item_engine_term_edits')
+def test_edit_conflicts_of_cached_entities_are_retried(mocked_adapter, triples):
+    writer = mocked_adapter._local_item_engine(None)
+    conflict = wdi_core.WDApiError({'error': {'code': 'editconflict', 'info': 'Edit conflict'}})
+    writer.write = mock.MagicMock(side_effect=[conflict, 'Q7', conflict])
+    mocked_adapter._entity_cache.update('Q7', {'claims': {}, 'lastrevid': 1})
+    triple = triples['desc_en']
+    triple.subject.id = 'Q7'
+    mocked_adapter._local_item_engine.reset_mock()
+
+    assert mocked_adapter.create_triple(triple).successful
+    item_engine_calls = [
+        mock.call('Q7', item_data={'id': 'Q7', 'claims': {}, 'lastrevid': 1}),
+        mock.call('Q7')
+    ]
+    mocked_adapter._local_item_engine.assert_has_calls(item_engine_calls)
+    assert writer.write.call_count == 2
+
+    # conflicts of freshly read entities are reported
+    assert not mocked_adapter.create_triple(triple).successful
+    assert writer.write.call_count == 3
+
+
+def test_bind_base_revision():
+    class FakeEngine():
+        def __init__(self):
+            self.payloads = []
+
+        def mediawiki_api_call(self, method, mediawiki_api_url=None, session=None, **kwargs):
+            self.payloads.append(kwargs['data'])
+
+    entity = FakeEngine()
+    bind_base_revision(entity, 12)
+    entity.mediawiki_api_call('POST', 'url', data={'action': 'wbeditentity'})
+    entity.mediawiki_api_call('GET', 'url', data={'action': 'wbgetentities'})
+    assert entity.payloads == [{'action': 'wbeditentity', 'baserevid': 12},
+                               {'action': 'wbgetentities'}]
+
+
+class FakeDirectWriter():
+    def __init__(self, entities=None):
+        self.entities = entities or {}
+        self.writes = []
+        self.fetch = mock.MagicMock(side_effect=lambda entity_id, props: self.entities.get(entity_id))
+
+    def write(self, edit, entity_json=None):
+        data = edit.to_json(entity_json)
+        self.writes.append((edit, data))
+        entity_id = edit.entity_id
+        if entity_id is None:
+            entity_id = ('P' if edit.entity_type == 'property' else 'Q') + str(len(self.writes))
+        return {'id': entity_id, 'lastrevid': len(self.writes), 'claims': {}}
+
+
+def test_direct_writes(mocked_adapter, triples):
+    mocked_adapter._direct_writes = True
+    mocked_adapter._edit_writer = FakeDirectWriter()
+    mocked_adapter._related_link_prop = 'P100'
+    results = [mocked_adapter.create_triple(triples['wditemid']),
+               mocked_adapter.create_triple(triples['desc_en'])]
+    assert all(res.successful for res in results)
+    mocked_adapter._local_item_engine.assert_not_called()
+
+    edits = mocked_adapter._edit_writer.writes
+    # Person, City and livesIn are created before the statement is written
+    assert [(edit.entity_id, edit.entity_type) for edit, _ in edits] == \
+        [(None, 'item'), (None, 'item'), (None, 'property'), ('Q1', 'item'), ('Q1', 'item')]
+    assert edits[2][1]['datatype'] == 'wikibase-item'
+    assert edits[2][1]['claims'][0]['mainsnak']['property'] == 'P100'
+    assert [claim['mainsnak']['datavalue']['value']['id'] for claim in edits[3][1]['claims']] == ['Q2']
+    assert edits[4][1] == {'descriptions': {'en': {'language': 'en', 'value': 'A person'}}}
+    assert mocked_adapter._entity_cache.lastrevid('Q1') == 5
+
+
+def test_direct_writes_remove_claims_by_guid(mocked_adapter, triples):
+    entity = {'id': 'Q7', 'lastrevid': 3, 'claims': {'P3': [
+        {'id': 'Q7$1', 'mainsnak': {'property': 'P3', 'datavalue': {
+            'value': {'entity-type': 'item', 'numeric-id': 8, 'id': 'Q8'}, 'type': 'wikibase-entityid'}}}
+    ]}}
+    mocked_adapter._direct_writes = True
+    mocked_adapter._edit_writer = FakeDirectWriter({'Q7': entity})
+    triple = triples['wditemid']
+    triple.subject.id, triple.predicate.id, triple.object.id = 'Q7', 'P3', 'Q8'
+
+    assert mocked_adapter.remove_triple(triple).successful
+    mocked_adapter._edit_writer.fetch.assert_called_once_with('Q7', 'info|aliases|claims')
+    assert mocked_adapter._edit_writer.writes[0][1] == {'claims': [{'id': 'Q7$1', 'remove': ''}]}
+
+    # the state of the entity returned by the write is used by the next edit
+    assert mocked_adapter.remove_triple(triple).successful
+    assert mocked_adapter._edit_writer.fetch.call_count == 1
+    assert len(mocked_adapter._edit_writer.writes) == 2
+
+
+def test_lightweight_term_edits(mocked_adapter, triples):
+    mocked_adapter._edit_writer = FakeDirectWriter({'Q7': {'id': 'Q7', 'lastrevid': 2, 'aliases': {}}})
+    subject = triples['desc_en'].subject
+    subject.id = 'Q7'
+    term_triples = [triples['desc_en'], TripleInfo(subject, triples['label_en'].predicate,
+                                                   triples['label_en'].object)]
+    assert mocked_adapter.batch_update(subject, term_triples).successful
+    mocked_adapter._local_item_engine.assert_not_called()
+    mocked_adapter._edit_writer.fetch.assert_not_called()
+    assert mocked_adapter._edit_writer.writes[0][1] == {
+        'labels': {'en': {'language': 'en', 'value': 'Jose Emilio Labra Gayo'}},
+        'descriptions': {'en': {'language': 'en', 'value': 'A person'}}
+    }
+
+    # only the aliases of the entity are fetched to remove an alias
+    mocked_adapter._entity_cache.clear()
+    alias = TripleInfo(subject, triples['alias_en'].predicate, triples['alias_en'].object)
+    mocked_adapter.remove_triple(alias)
+    mocked_adapter._edit_writer.fetch.assert_called_once_with('Q7', 'info|aliases')
+    mocked_adapter._local_item_engine.assert_not_called()
+
+
+def test_lightweight_term_edits_with_statements(mocked_adapter, triples):
+    mocked_adapter._edit_writer = FakeDirectWriter()
+    subject = triples['desc_en'].subject
+    statement = TripleInfo(subject, triples['wditemid'].predicate, triples['wditemid'].object)
+    mocked_adapter.batch_update(subject, [triples['desc_en'], statement])
+    assert not mocked_adapter._edit_writer.writes
+    mocked_adapter._local_item_engine(None).set_description.assert_called_once_with('A person', 'en')
+
+
+def related_links_page(*uris_and_ids):
+    return {'results': {'bindings': [
+        {'entity': {'value': f'http://wikibase.example.org/entity/{entity_id}'}, 'uri': {'value': uri}}
+        for uri, entity_id in uris_and_ids
+    ]}}
+
+
+@mock.patch('wikidataintegrator.wdi_core.WDItemEngine.execute_sparql_query')
+def test_warm_up_uri_factory(mock_query, mocked_adapter):
+    example = 'https://example.org/onto#'
+    mock_query.side_effect = [
+        related_links_page((example + 'Person', 'Q1'), (example + 'City', 'Q2')),
+        related_links_page((example + 'livesIn', 'P3'), (example + 'Person', 'Q9')),
+        related_links_page((example + 'altName', 'P4'))
+    ]
+    mocked_adapter.sparql_url = 'www.example.org/sparql'
+    mocked_adapter._related_link_prop = 'P5'
+    mocked_adapter._uris_factory.post_uri(URIElement(example + 'City'), 'Q20')
+    mocked_adapter._uris_factory = mock.MagicMock(wraps=mocked_adapter._uris_factory)
+
+    assert mocked_adapter.warm_up_uri_factory(page_size=2) == 3
+    assert mock_query.call_count == 3
+    # the related links are looked up in the factory at once
+    mocked_adapter._uris_factory.get_uris.assert_called_once()
+    mocked_adapter._uris_factory.get_uri.assert_not_called()
+    query = mock_query.call_args_list[1][0][0]
+    assert '"/P5"' in query and 'LIMIT 2 OFFSET 2' in query
+    assert mock_query.call_args_list[1][1] == {'endpoint': 'www.example.org/sparql'}
+
+    factory = mocked_adapter._uris_factory
+    assert factory.get_uri(URIElement(example + 'Person')) == 'Q1'
+    assert factory.get_uri(URIElement(example + 'City')) == 'Q20'
+    assert factory.get_uri(URIElement(example + 'altName')) == 'P4'
+
+
+def test_default_batch_uri_methods():
+    class DictFactory(URIFactory):
+        def __init__(self):
+            self.state = {}
+
+        def get_uri(self, uriRef):
+            return self.state.get(uriRef.uri)
+
+        def post_uri(self, uriRef, wb_uri):
+            self.state[uriRef.uri] = wb_uri
+
+    factory = DictFactory()
+    factory.post_uris({'https://example.org/onto#Person': 'Q1'})
+    assert factory.get_uri(URIElement('https://example.org/onto#Person')) == 'Q1'
+    assert factory.get_uris(['https://example.org/onto#Person', 'https://example.org/onto#City']) == \
+        {'https://example.org/onto#Person': 'Q1'}
+    assert factory.lookup('https://example.org/onto#Person') == 'Q1'
+    assert factory.lookup('https://example.org/onto#City') is None
+
+
+@mock.patch('requests.get', side_effect=mocked_requests_wbgetentities)
+def test_prepare_resolves_ids_in_bulk(mock_get, mocked_adapter):
+    registry = ElementRegistry()
+    person = registry.uri_element('https://example.org/onto#Person')
+    lives_in = registry.uri_element('https://example.org/onto#livesIn')
+    city = registry.uri_element('https://example.org/onto#City')
+    mocked_adapter._uris_factory.post_uris({person.uri: 'Q1', lives_in.uri: 'P2'})
+    mocked_adapter._uris_factory = mock.MagicMock(wraps=mocked_adapter._uris_factory)
+    triples = [TripleInfo(person, lives_in, city), TripleInfo(city, lives_in, person)]
+
+    assert mocked_adapter.resolve_ids(triples) == 2
+    mocked_adapter._uris_factory.get_uris.assert_called_once_with({person.uri, lives_in.uri, city.uri})
+    assert (person.id, lives_in.id, city.id) == ('Q1', 'P2', None)
+    mocked_adapter.prepare(triples)
+    mocked_adapter._uris_factory.get_uris.assert_called_with({city.uri})
+    mocked_adapter._uris_factory.get_uri.assert_not_called()
+
+
+@pytest.mark.usefixtures('item_engine_term_edits')
 def test_proptype(mocked_adapter, triples):
     triple = triples['proptype']
     mocked_adapter.create_triple(triple)
@@ -373,6 +842,7 @@ def test_remove_triple(mocked_adapter, triples):
     assert writer.update.call_count == 4  # 3 mappings + delete statement
 
 
+@pytest.mark.usefixtures('item_engine_term_edits')
 def test_remove_alias(mocked_adapter, triples):
     alias_es = triples['alias_es']
     alias_es_2 = triples['alias_es_2']
@@ -403,6 +873,7 @@ def test_remove_alias(mocked_adapter, triples):
     writer.get_aliases.assert_has_calls(get_alias_calls, any_order=False)
 
 
+@pytest.mark.usefixtures('item_engine_term_edits')
 def test_remove_nonexisting_alias(mocked_adapter, triples, caplog):
     alias_es = triples['alias_es']
     mocked_adapter._local_item_engine(None).get_aliases.return_value = []
@@ -427,6 +898,7 @@ def test_remove_nonexisting_alias(mocked_adapter, triples, caplog):
     assert "Alias individuo@es does not exist" in caplog.text
 
 
+@pytest.mark.usefixtures('item_engine_term_edits')
 def test_remove_description(mocked_adapter, triples):
     desc_es = triples['desc_es']
     mocked_adapter.create_triple(desc_es)
@@ -451,6 +923,7 @@ def test_remove_description(mocked_adapter, triples):
     writer.set_description.assert_has_calls(set_desc_calls, any_order=False)
 
 
+@pytest.mark.usefixtures('item_engine_term_edits')
 def test_remove_label(mocked_adapter, triples):
     label_en = triples['label_en']
     mocked_adapter.create_triple(label_en)
@@ -477,6 +950,7 @@ def test_remove_label(mocked_adapter, triples):
     writer.set_label.assert_has_calls(set_label_calls, any_order=False)
 
 
+@pytest.mark.usefixtures('item_engine_term_edits')
 def test_set_alias(mocked_adapter, triples):
     alias_en = triples['alias_en']
     alias_es = triples['alias_es']
@@ -502,6 +976,7 @@ def test_set_alias(mocked_adapter, triples):
     writer.set_aliases.assert_has_calls(set_alias_calls, any_order=False)
 
 
+@pytest.mark.usefixtures('item_engine_term_edits')
 def test_set_description(mocked_adapter, triples):
     desc_en = triples['desc_en']
     desc_es = triples['desc_es']
@@ -527,6 +1002,7 @@ def test_set_description(mocked_adapter, triples):
     writer.set_description.assert_has_calls(set_desc_calls, any_order=False)
 
 
+@pytest.mark.usefixtures('item_engine_term_edits')
 def test_set_label(mocked_adapter, triples):
     new_triple = triples['label_en']
     mocked_adapter.create_triple(new_triple)
@@ -568,6 +1044,7 @@ def test_is_sameAs_mapping_activated(mocked_adapter, triples):
     assert not is_same_as_activated(triples['desc_en'].subject, URI_SET_FOR_SAMEAS)
 
 
+@pytest.mark.usefixtures('item_engine_term_edits')
 def test_unknown_language(mocked_adapter, triples, caplog):
     triple = triples['label_unknown']
     mock_error_msg = {
@@ -588,6 +1065,7 @@ def test_unknown_language(mocked_adapter, triples, caplog):
     assert modification_result.message == mock_error_msg['error']['info']
 
 
+@pytest.mark.usefixtures('item_engine_term_edits')
 def test_utf_8(mocked_adapter, triples):
     triple_ko = triples['label_ko']
     mocked_adapter.create_triple(triple_ko)
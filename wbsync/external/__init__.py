@@ -1 +1,3 @@
-from .uri_factory import URIFactoryMock, URIFactory
+from .uri_factory import InMemoryURIFactory, SQLiteURIFactory, URIFactoryMock, URIFactory
+from .mmap_uri_factory import MmapURIFactory
+from .bloom_filter import BloomFilterURIFactory
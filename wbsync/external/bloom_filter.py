@@ -0,0 +1,222 @@
+""" Bloom filter layer that answers locally the lookups of unknown uris. """
+import logging
+import math
+import threading
+
+from hashlib import blake2b
+from typing import Iterable, List, Optional
+
+from .uri_factory import URIFactory
+from ..util.error import InvalidArgumentError
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FALSE_POSITIVE_RATE = 0.01
+MIN_CAPACITY = 1024
+
+
+class BloomFilter():
+    """ Probabilistic set of strings without false negatives.
+
+    The number of bits and hash functions is computed from the expected number of
+    elements and the false positive rate, and limited by the memory budget if given.
+
+    Parameters
+    ----------
+    capacity: int
+        Expected number of elements.
+    false_positive_rate: float
+        Expected probability that an element not added is reported as contained.
+    max_bytes: int, optional
+        Maximum size of the bit array. If the capacity and rate need more memory,
+        the rate is higher than expected.
+    """
+
+    def __init__(self, capacity: int, false_positive_rate: float = DEFAULT_FALSE_POSITIVE_RATE,
+                 max_bytes: Optional[int] = None):
+        if capacity < 1:
+            raise InvalidArgumentError("The capacity of the filter must be 1 or higher")
+        if not 0 < false_positive_rate < 1:
+            raise InvalidArgumentError("The false positive rate must be between 0 and 1")
+        if max_bytes is not None and max_bytes < 1:
+            raise InvalidArgumentError("The memory budget must be 1 byte or higher")
+        num_bits = math.ceil(-capacity * math.log(false_positive_rate) / math.log(2) ** 2)
+        if max_bytes is not None and num_bits > max_bytes * 8:
+            logger.warning("%d bytes are needed for %d uris with a false positive rate of %s, "
+                           "limited to %d bytes", math.ceil(num_bits / 8), capacity, false_positive_rate, max_bytes)
+            num_bits = max_bytes * 8
+        self.capacity = capacity
+        self.num_bits = max(num_bits, 8)
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.count = 0
+        self._bits = bytearray(math.ceil(self.num_bits / 8))
+
+    def add(self, value: str) -> None:
+        """ Add a string to the filter. """
+        for position in self._positions(value):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def expected_false_positive_rate(self) -> float:
+        """ Return the expected false positive rate with the current number of elements. """
+        return (1 - math.exp(-self.num_hashes * self.count / self.num_bits)) ** self.num_hashes
+
+    def __contains__(self, value: str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def size_bytes(self) -> int:
+        """ Size of the bit array. """
+        return len(self._bits)
+
+    def _positions(self, value: str) -> Iterable[int]:
+        # double hashing with both halves of a single digest
+        digest = blake2b(value.encode('utf-8'), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return ((first + i * second) % self.num_bits for i in range(self.num_hashes))
+
+
+class BloomFilterURIFactory(URIFactory):
+    """ Factory that answers locally the lookups of uris that another factory doesn't have.
+
+    The uris of the wrapped factory are kept in a Bloom filter, built when the
+    factory is created and updated on every post. Lookups of uris not in the filter,
+    which are mostly the uris of entities about to be created, are answered without
+    calling the wrapped factory; the rest are delegated to it. When the number of
+    uris exceeds the capacity, the filter is rebuilt with twice the number of uris.
+    If the factory is not `enumerable`, the filter can't be rebuilt, so the next
+    uris go to a new filter, twice as big, and lookups check all the filters.
+
+    The filter only knows the uris posted through this factory, so if other
+    processes post to the same factory, `rebuild` must be called to see their uris.
+    Uris are added to the filter before they are posted, so a lookup that runs
+    during a post never misses them.
+
+    Parameters
+    ----------
+    factory: :obj:`URIFactory`
+        Factory with the uris. It must be `enumerable`, unless `uris` is given.
+    false_positive_rate: float
+        Expected probability that the lookup of an unknown uri reaches the factory.
+    max_bytes: int, optional
+        Maximum size of the filter. If None, it grows with the number of uris.
+    capacity: int, optional
+        Expected number of uris. By default, twice the number of uris of the factory.
+    uris: iterable of str, optional
+        Uris of the factory, used instead of its `known_uris`.
+
+    Attributes
+    ----------
+    stats: dict
+        Number of `lookups`, of lookups answered by the filter (`filtered`) and of
+        lookups delegated for uris the factory didn't have (`false_positives`).
+    """
+
+    def __init__(self, factory: URIFactory, false_positive_rate: float = DEFAULT_FALSE_POSITIVE_RATE,
+                 max_bytes: Optional[int] = None, capacity: Optional[int] = None, uris: Iterable[str] = None):
+        self.factory = factory
+        self.false_positive_rate = false_positive_rate
+        self.max_bytes = max_bytes
+        self.stats = {'lookups': 0, 'filtered': 0, 'false_positives': 0}
+        self._lock = threading.RLock()
+        self._filters = []
+        self.rebuild(capacity, uris)
+
+    def rebuild(self, capacity: Optional[int] = None, uris: Iterable[str] = None) -> None:
+        """ Build the filter again with the uris of the factory.
+
+        Parameters
+        ----------
+        capacity: int, optional
+            Expected number of uris. By default, twice the number of uris of the factory.
+        uris: iterable of str, optional
+            Uris of the factory, used instead of its `known_uris`.
+
+        Raises
+        ------
+        InvalidArgumentError
+            If the uris are not given and the factory is not enumerable.
+        """
+        if uris is None and not self.factory.enumerable:
+            raise InvalidArgumentError(f"{type(self.factory).__name__} can't enumerate its uris, "
+                                       "so they must be given")
+        # posts wait for the new filter, so their uris are not lost
+        with self._lock:
+            uris = list(uris if uris is not None else self.factory.known_uris())
+            bloom = BloomFilter(capacity or max(2 * len(uris), MIN_CAPACITY), self.false_positive_rate,
+                                self.max_bytes)
+            for uri in uris:
+                bloom.add(uri)
+            self._filters = [bloom]
+        logger.debug("Built a filter of %d bytes with %d uris", bloom.size_bytes, len(uris))
+
+    def get_uri(self, uriRef):
+        if not self._might_contain([uriRef.uri]):
+            return None
+        wb_uri = self.factory.get_uri(uriRef)
+        if wb_uri is None:
+            self._count('false_positives', 1)
+        return wb_uri
+
+    def get_uris(self, uris):
+        candidates = self._might_contain(uris)
+        if not candidates:
+            return {}
+        found = self.factory.get_uris(candidates)
+        self._count('false_positives', len(set(candidates) - set(found)))
+        return found
+
+    def post_uri(self, uriRef, wb_uri):
+        # the uri is in the filter before it is in the factory, and a rebuild can't
+        # happen in between and leave it out
+        with self._lock:
+            self._add([uriRef.uri])
+            self.factory.post_uri(uriRef, wb_uri)
+
+    def post_uris(self, uris):
+        with self._lock:
+            self._add(uris)
+            self.factory.post_uris(uris)
+
+    @property
+    def enumerable(self):
+        return self.factory.enumerable
+
+    def known_uris(self):
+        return self.factory.known_uris()
+
+    def reset_factory(self):
+        self.factory.reset_factory()
+        self.rebuild(uris=[])
+
+    def _might_contain(self, uris: Iterable[str]) -> List[str]:
+        filters = self._filters
+        uris = list(uris)
+        candidates = [uri for uri in uris if any(uri in bloom for bloom in filters)]
+        with self._lock:
+            self.stats['lookups'] += len(uris)
+            self.stats['filtered'] += len(uris) - len(candidates)
+        return candidates
+
+    def _add(self, uris: Iterable[str]) -> None:
+        uris = list(uris)
+        with self._lock:
+            bloom = self._filters[-1]
+            if self.max_bytes is None and bloom.count + len(uris) > bloom.capacity:
+                total = sum(len(bloom) for bloom in self._filters) + len(uris)
+                if self.factory.enumerable:
+                    self.rebuild(2 * total)
+                else:
+                    # the uris of the full filter are unknown, so they stay there and
+                    # the new ones go to a bigger filter
+                    self._filters = self._filters + [BloomFilter(2 * total, self.false_positive_rate)]
+                bloom = self._filters[-1]
+            for uri in uris:
+                bloom.add(uri)
+
+    def _count(self, stat: str, value: int) -> None:
+        with self._lock:
+            self.stats[stat] += value
@@ -0,0 +1,67 @@
+"""
+"""
+import json
+import logging
+import os
+import threading
+
+from typing import Optional
+
+BOOTSTRAP_FILE = os.path.join(os.getcwd(), 'wb_bootstrap.json')
+
+logger = logging.getLogger(__name__)
+
+
+class BootstrapCache():
+    """ Ids of the properties discovered or created when bootstrapping an adapter.
+
+    Ids are stored per mediawiki API url in a JSON file, so later adapters of the same
+    wikibase don't need to look them up again.
+
+    Parameters
+    ----------
+    path : str, optional
+        Path of the JSON file of the cache. If None, ids are only kept in memory.
+    """
+
+    def __init__(self, path: Optional[str] = BOOTSTRAP_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._state = self._load()
+
+    def get(self, api_url: str, key: str) -> Optional[str]:
+        """ Return the id stored for a wikibase, or None if it is unknown. """
+        with self._lock:
+            return self._state.get(api_url, {}).get(key)
+
+    def set(self, api_url: str, key: str, entity_id: str) -> None:
+        """ Store the id of a bootstrap property of a wikibase. """
+        with self._lock:
+            self._state.setdefault(api_url, {})[key] = entity_id
+            self._dump()
+
+    def invalidate(self, api_url: str) -> None:
+        """ Remove every id stored for a wikibase. """
+        with self._lock:
+            if self._state.pop(api_url, None) is not None:
+                self._dump()
+
+    def _load(self) -> dict:
+        if self.path is None or not os.path.isfile(self.path):
+            return {}
+        try:
+            with open(self.path, 'r') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            logger.warning("Bootstrap cache %s could not be read. Ignoring it...", self.path)
+            return {}
+        return state if isinstance(state, dict) else {}
+
+    def _dump(self) -> None:
+        if self.path is None:
+            return
+        # a temporary file per process and thread, so concurrent dumps don't overwrite each other's
+        tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self._state, f)
+        os.replace(tmp_path, self.path)
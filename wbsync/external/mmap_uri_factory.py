@@ -0,0 +1,333 @@
+""" Read-optimized URI factory backed by a memory-mapped hash table file.
+
+The index file has the following layout, with every integer in little endian:
+
+- Header: magic, version, number of slots and entries, and the offsets and sizes of
+  the other sections.
+- Prefix table: JSON list with the namespace prefixes of the indexed uris.
+- Slots: open-addressing hash table, with linear probing, where each slot holds the
+  64-bit blake2b hash of an uri and the file offset of its record (0 if empty).
+- Records: prefix index, suffix and wikibase id of each uri.
+
+Since the file is only read through a memory map, processes using the same index
+share its pages and open it without loading it. Writes are appended to a small delta
+log next to the index, which is merged into it by `compact`.
+"""
+import json
+import logging
+import mmap
+import os
+import pickle
+import struct
+import threading
+
+from hashlib import blake2b
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .uri_factory import URIFactory, URIS_FILE
+from ..util.error import InvalidArgumentError
+
+logger = logging.getLogger(__name__)
+
+URIS_INDEX_FILE = os.path.join(os.getcwd(), 'uris.idx')
+DELTA_SUFFIX = '.delta'
+DEFAULT_COMPACT_THRESHOLD = 100000
+
+INDEX_MAGIC = b'WBURIIDX'
+INDEX_VERSION = 1
+# magic, version, reserved, slots, entries, prefixes offset, prefixes size, slots offset, records offset
+HEADER = struct.Struct('<8sIIQQQQQQ')
+# hash of the uri and offset of its record
+SLOT = struct.Struct('<QQ')
+# prefix index, size of the suffix and size of the wikibase id, followed by both
+RECORD = struct.Struct('<IIH')
+# maximum fraction of used slots
+MAX_LOAD_FACTOR = 0.5
+
+
+class MmapURIFactory(URIFactory):
+    """ Factory that looks up the uris in a memory-mapped hash table file.
+
+    Lookups read the index through a memory map, so opening the factory doesn't
+    load the mappings in memory and worker processes share the pages of the file.
+    Posted uris are appended to a delta log, which is kept in memory and takes
+    precedence over the index, and merged into a new index by `compact`, manually
+    or when the delta reaches `compact_threshold` entries.
+
+    A compaction rewrites the whole index while holding the lock of the factory, so
+    the post that triggers it, and every lookup and post of other threads, wait
+    until it ends, which takes seconds for millions of uris. Writers that can't
+    stall can pass a `compact_threshold` of None and call `compact` when they are
+    idle, like between synchronization runs.
+
+    The factory can be used from several threads. Several processes can read the
+    same index, but only one of them should post uris; readers see the uris posted
+    by others after calling `refresh`.
+
+    Parameters
+    ----------
+    path: str
+        Path of the index file. By default, uris.idx in the working directory. If it
+        doesn't exist, an empty index is created.
+    compact_threshold: int, optional
+        Number of entries of the delta that triggers a compaction. If None, the
+        delta is only merged when `compact` is called.
+    """
+
+    enumerable = True
+
+    def __init__(self, path: str = URIS_INDEX_FILE, compact_threshold: Optional[int] = DEFAULT_COMPACT_THRESHOLD):
+        if compact_threshold is not None and compact_threshold < 1:
+            raise InvalidArgumentError("The compaction threshold must be 1 or higher")
+        self.path = path
+        self.delta_path = path + DELTA_SUFFIX
+        self.compact_threshold = compact_threshold
+        self._lock = threading.RLock()
+        self._index = None
+        self._delta = {}
+        self._delta_size = 0
+        if not os.path.isfile(path):
+            write_index(path, {})
+        self._open_index()
+        self._read_delta()
+
+    def get_uri(self, uriRef):
+        uri = uriRef.uri
+        with self._lock:
+            if uri in self._delta:
+                return self._delta[uri]
+            return self._index.get(uri)
+
+    def get_uris(self, uris):
+        found = {}
+        with self._lock:
+            for uri in uris:
+                wb_uri = self._delta[uri] if uri in self._delta else self._index.get(uri)
+                if wb_uri is not None:
+                    found[uri] = wb_uri
+        return found
+
+    def post_uri(self, uriRef, wb_uri):
+        self.post_uris({uriRef.uri: wb_uri})
+
+    def post_uris(self, uris):
+        if not uris:
+            return
+        lines = ''.join(json.dumps([uri, wb_uri], ensure_ascii=False) + '\n' for uri, wb_uri in uris.items())
+        with self._lock:
+            with open(self.delta_path, 'a', encoding='utf-8') as f:
+                f.write(lines)
+                self._delta_size = f.tell()
+            self._delta.update(uris)
+            if self.compact_threshold is not None and len(self._delta) >= self.compact_threshold:
+                self.compact()
+
+    def compact(self) -> int:
+        """ Merge the delta into a new index file.
+
+        Returns
+        -------
+        int
+            Number of uris of the new index.
+        """
+        with self._lock:
+            uris = dict(self._index.items())
+            uris.update(self._delta)
+            return self._rewrite({uri: wb_uri for uri, wb_uri in uris.items() if wb_uri is not None})
+
+    def _rewrite(self, uris: Dict[str, str]) -> int:
+        with self._lock:
+            tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            write_index(tmp_path, uris)
+            self._index.close()
+            os.replace(tmp_path, self.path)
+            open(self.delta_path, 'w').close()
+            self._open_index()
+            self._delta = {}
+            self._delta_size = 0
+            logger.debug("Compacted %s with %d uris", self.path, len(uris))
+            return len(uris)
+
+    def import_pickle(self, pickle_path: str = URIS_FILE) -> int:
+        """ Import the uris of the pickle file of a :obj:`URIFactoryMock` and compact the index.
+
+        Returns
+        -------
+        int
+            Number of uris imported.
+        """
+        with open(pickle_path, 'rb') as f:
+            try:
+                uris = pickle.load(f)
+            except EOFError:
+                uris = {}
+        with self._lock:
+            self._delta.update(uris)
+            self.compact()
+        return len(uris)
+
+    def items(self) -> Iterator[Tuple[str, str]]:
+        """ Iterate over every uri of the factory and its wikibase id. """
+        with self._lock:
+            delta = dict(self._delta)
+            index_items = list(self._index.items())
+        for uri, wb_uri in index_items:
+            if uri not in delta:
+                yield uri, wb_uri
+        for uri, wb_uri in delta.items():
+            if wb_uri is not None:
+                yield uri, wb_uri
+
+    def known_uris(self):
+        return (uri for uri, _ in self.items())
+
+    def refresh(self) -> None:
+        """ Read the uris posted by other processes and reopen the index if it was compacted. """
+        with self._lock:
+            stat = os.stat(self.path)
+            if (stat.st_ino, stat.st_mtime_ns, stat.st_size) != self._index.stat_key:
+                self._index.close()
+                self._open_index()
+                self._delta = {}
+                self._delta_size = 0
+            self._read_delta()
+
+    def reset_factory(self):
+        self._rewrite({})
+
+    def close(self):
+        """ Close the memory map of the index. """
+        with self._lock:
+            self._index.close()
+
+    def __len__(self):
+        return sum(1 for _ in self.items())
+
+    def _open_index(self):
+        self._index = _MappedIndex(self.path)
+
+    def _read_delta(self):
+        if not os.path.isfile(self.delta_path):
+            return
+        if os.path.getsize(self.delta_path) < self._delta_size:
+            # compacted by another process
+            self._delta = {}
+            self._delta_size = 0
+        with open(self.delta_path, 'rb') as f:
+            f.seek(self._delta_size)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    # a post being written by another process
+                    break
+                self._delta_size += len(line)
+                try:
+                    uri, wb_uri = json.loads(line.decode('utf-8'))
+                except ValueError:
+                    logger.warning("Skipping invalid line of %s", self.delta_path)
+                    continue
+                self._delta[uri] = wb_uri
+
+
+class _MappedIndex():
+    """ Read-only view of an index file through a memory map. """
+
+    def __init__(self, path: str):
+        with open(path, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            self.stat_key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _, self.num_slots, self.num_entries, prefixes_offset, prefixes_size, \
+            self.slots_offset, self.records_offset = HEADER.unpack_from(self._map, 0)
+        if magic != INDEX_MAGIC or version != INDEX_VERSION:
+            self._map.close()
+            raise InvalidArgumentError(f"{path} is not a valid uri index")
+        self.prefixes = json.loads(self._map[prefixes_offset:prefixes_offset + prefixes_size].decode('utf-8'))
+        self._mask = self.num_slots - 1
+
+    def get(self, uri: str) -> Optional[str]:
+        uri_hash = hash_uri(uri)
+        slot = uri_hash & self._mask
+        while True:
+            slot_hash, record_offset = SLOT.unpack_from(self._map, self.slots_offset + slot * SLOT.size)
+            if record_offset == 0:
+                return None
+            if slot_hash == uri_hash:
+                record_uri, wb_uri, _ = self._read_record(record_offset)
+                if record_uri == uri:
+                    return wb_uri
+            slot = (slot + 1) & self._mask
+
+    def items(self) -> Iterator[Tuple[str, str]]:
+        offset = self.records_offset
+        for _ in range(self.num_entries):
+            uri, wb_uri, offset = self._read_record(offset)
+            yield uri, wb_uri
+
+    def close(self):
+        self._map.close()
+
+    def _read_record(self, offset: int) -> Tuple[str, str, int]:
+        prefix, suffix_size, id_size = RECORD.unpack_from(self._map, offset)
+        offset += RECORD.size
+        suffix = self._map[offset:offset + suffix_size].decode('utf-8')
+        offset += suffix_size
+        wb_uri = self._map[offset:offset + id_size].decode('utf-8')
+        return self.prefixes[prefix] + suffix, wb_uri, offset + id_size
+
+
+def hash_uri(uri: str) -> int:
+    """ Return the 64-bit hash of an uri used by the index. """
+    return int.from_bytes(blake2b(uri.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def split_namespace(uri: str) -> Tuple[str, str]:
+    """ Split an uri in its namespace prefix, up to its last '#' or '/', and its local name. """
+    position = max(uri.rfind('#'), uri.rfind('/')) + 1
+    return uri[:position], uri[position:]
+
+
+def write_index(path: str, uris: Dict[str, str]) -> None:
+    """ Write an index file with the given uris.
+
+    Parameters
+    ----------
+    path: str
+        Path of the index file.
+    uris: dict
+        Dictionary from each uri to its wikibase id.
+    """
+    prefixes: Dict[str, int] = {}
+    records = bytearray()
+    entries: List[Tuple[int, int]] = []
+    for uri, wb_uri in uris.items():
+        prefix, suffix = split_namespace(uri)
+        prefix_index = prefixes.setdefault(prefix, len(prefixes))
+        suffix, wb_uri = suffix.encode('utf-8'), wb_uri.encode('utf-8')
+        entries.append((hash_uri(uri), len(records)))
+        records += RECORD.pack(prefix_index, len(suffix), len(wb_uri)) + suffix + wb_uri
+
+    num_slots = 8
+    while num_slots * MAX_LOAD_FACTOR < len(entries):
+        num_slots *= 2
+    prefix_table = json.dumps(list(prefixes), ensure_ascii=False).encode('utf-8')
+    prefixes_offset = HEADER.size
+    slots_offset = prefixes_offset + len(prefix_table)
+    records_offset = slots_offset + num_slots * SLOT.size
+
+    slots = bytearray(num_slots * SLOT.size)
+    mask = num_slots - 1
+    for uri_hash, record_offset in entries:
+        slot = uri_hash & mask
+        while SLOT.unpack_from(slots, slot * SLOT.size)[1] != 0:
+            slot = (slot + 1) & mask
+        SLOT.pack_into(slots, slot * SLOT.size, uri_hash, records_offset + record_offset)
+
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(INDEX_MAGIC, INDEX_VERSION, 0, num_slots, len(entries), prefixes_offset,
+                            len(prefix_table), slots_offset, records_offset))
+        f.write(prefix_table)
+        f.write(slots)
+        f.write(records)
+        f.flush()
+        os.fsync(f.fileno())
+
@@ -2,11 +2,32 @@
 """
 import pickle
 import os
+import sqlite3
+import threading
 from abc import ABC, abstractmethod
+from typing import Dict, Iterable, Iterator, Optional
 
 URIS_FILE = os.path.join(os.getcwd(), 'uris.pkl')
+URIS_DB_FILE = os.path.join(os.getcwd(), 'uris.db')
+# uris looked up by each query of the SQLite factory, below the limit of variables of SQLite
+SQLITE_LOOKUP_CHUNK = 500
+SQLITE_MEMORY_PATH = ':memory:'
+# default pickle path of the SQLite factory, which depends on the path of the database
+_DEFAULT_PICKLE_PATH = object()
 
 class URIFactory(ABC):
+    """ Store of the wikibase id of each uri.
+
+    Factories implement the lookup and post of a single uri. The lookup and post of
+    several uris at once, by the string of each uri, fall back to them, and factories
+    backed by a database or a remote service should override them.
+
+    Enumerating the uris is an optional capability: factories that can do it set
+    `enumerable` to True and implement `known_uris`.
+    """
+
+    # whether the factory implements known_uris
+    enumerable = False
 
     @abstractmethod
     def get_uri(self, uriRef) -> str:
@@ -36,7 +57,230 @@ class URIFactory(ABC):
               Uri for the label .
           """
 
+    def lookup(self, uri: str) -> Optional[str]:
+        """ Gets the wikibase id of an uri.
+
+          Parameters
+          ----------
+          uri: str
+              Uri to find.
+
+          Returns
+          -------
+          str
+              Wikibase id of the uri, or None if it has no id.
+          """
+        return self.get_uris([uri]).get(uri)
+
+    def get_uris(self, uris: Iterable[str]) -> Dict[str, str]:
+        """ Gets the wikibase ids of several uris at once.
+
+          Factories backed by a database or a remote service should override this
+          method to look up all the uris in a few requests.
+
+          Parameters
+          ----------
+          uris: iterable of str
+              Uris to find.
+
+          Returns
+          -------
+          dict
+              Dictionary from each uri found to its wikibase id. Uris without id are left out.
+          """
+        found = {}
+        for uri in uris:
+            wb_uri = self.get_uri(_UriRef(uri))
+            if wb_uri is not None:
+                found[uri] = wb_uri
+        return found
+
+    def post_uris(self, uris: Dict[str, str]) -> None:
+        """ Posts the wikibase ids of several uris at once.
+
+          Factories that persist their state should override this method to save
+          all the ids in a single write.
+
+          Parameters
+          ----------
+          uris: dict
+              Dictionary from each uri to its wikibase id.
+          """
+        for uri, wb_uri in uris.items():
+            self.post_uri(_UriRef(uri), wb_uri)
+
+    def known_uris(self) -> Iterator[str]:
+        """ Iterates over the uris with a wikibase id.
+
+          Used to build the caches of the factory, like the filter of
+          :obj:`BloomFilterURIFactory`. Only available if `enumerable` is True.
+
+          Raises
+          ------
+          NotImplementedError
+              If the uris of the factory can't be enumerated.
+          """
+        raise NotImplementedError(f"{type(self).__name__} can't enumerate its uris")
+
+class _UriRef():
+    """ Uri given by its string to the single uri methods of a factory. """
+
+    __slots__ = ('uri',)
+
+    def __init__(self, uri: str):
+        self.uri = uri
+
+class InMemoryURIFactory(URIFactory):
+    """ Factory that keeps the uris in memory, without saving them.
+
+    Each instance has its own state, so it is suitable for tests and benchmarks.
+
+    Parameters
+    ----------
+    uris: dict, optional
+        Initial dictionary from each uri to its wikibase id.
+    """
+    enumerable = True
+
+    def __init__(self, uris: Dict[str, str] = None):
+        self.state = dict(uris or {})
+        self._lock = threading.Lock()
+
+    def get_uri(self, uriRef):
+        with self._lock:
+            return self.state.get(uriRef.uri)
+
+    def get_uris(self, uris):
+        with self._lock:
+            return {uri: self.state[uri] for uri in uris if self.state.get(uri) is not None}
+
+    def post_uri(self, uriRef, wb_uri):
+        with self._lock:
+            self.state[uriRef.uri] = wb_uri
+
+    def post_uris(self, uris):
+        with self._lock:
+            self.state.update(uris)
+
+    def known_uris(self):
+        with self._lock:
+            uris = [uri for uri, wb_uri in self.state.items() if wb_uri is not None]
+        return iter(uris)
+
+    def reset_factory(self):
+        with self._lock:
+            self.state = {}
+
+class SQLiteURIFactory(URIFactory):
+    """ Factory that stores the uris in a SQLite database in WAL mode.
+
+    Each post only writes the uris posted, so its cost doesn't depend on the number
+    of uris stored. The factory can be used from several threads, and several
+    processes can read the database while one of them writes to it.
+
+    When the database is created, the uris of the pickle file of
+    :obj:`URIFactoryMock` are imported into it if the file exists.
+
+    Parameters
+    ----------
+    path: str
+        Path of the database. By default, uris.db in the working directory.
+    pickle_path: str, optional
+        Path of the pickle file migrated when the database is created. If None,
+        nothing is migrated. By default, uris.pkl in the working directory, unless
+        the database is in memory (':memory:').
+    """
+    enumerable = True
+
+    def __init__(self, path: str = URIS_DB_FILE, pickle_path: Optional[str] = _DEFAULT_PICKLE_PATH):
+        if pickle_path is _DEFAULT_PICKLE_PATH:
+            pickle_path = URIS_FILE if path != SQLITE_MEMORY_PATH else None
+        self.path = path
+        created = path == SQLITE_MEMORY_PATH or not os.path.isfile(path)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        with self._lock:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._connection.execute("CREATE TABLE IF NOT EXISTS uris "
+                                     "(uri TEXT PRIMARY KEY, wb_uri TEXT) WITHOUT ROWID")
+        if created and pickle_path is not None and os.path.isfile(pickle_path):
+            self.import_pickle(pickle_path)
+
+    def get_uri(self, uriRef):
+        with self._lock:
+            row = self._connection.execute("SELECT wb_uri FROM uris WHERE uri = ?", (uriRef.uri,)).fetchone()
+        return row[0] if row is not None else None
+
+    def get_uris(self, uris):
+        uris = list(dict.fromkeys(uris))
+        found = {}
+        with self._lock:
+            for i in range(0, len(uris), SQLITE_LOOKUP_CHUNK):
+                chunk = uris[i:i + SQLITE_LOOKUP_CHUNK]
+                query = f"SELECT uri, wb_uri FROM uris WHERE uri IN ({', '.join('?' * len(chunk))})"
+                found.update((uri, wb_uri) for uri, wb_uri in self._connection.execute(query, chunk)
+                             if wb_uri is not None)
+        return found
+
+    def post_uri(self, uriRef, wb_uri):
+        with self._lock:
+            self._connection.execute("INSERT OR REPLACE INTO uris VALUES (?, ?)", (uriRef.uri, wb_uri))
+
+    def post_uris(self, uris):
+        with self._lock, self._connection:
+            self._connection.execute("BEGIN")
+            self._connection.executemany("INSERT OR REPLACE INTO uris VALUES (?, ?)", uris.items())
+
+    def import_pickle(self, pickle_path: str = URIS_FILE) -> int:
+        """ Import the uris of the pickle file of a :obj:`URIFactoryMock`.
+
+        Parameters
+        ----------
+        pickle_path: str
+            Path of the pickle file.
+
+        Returns
+        -------
+        int
+            Number of uris imported.
+        """
+        with open(pickle_path, 'rb') as f:
+            try:
+                uris = pickle.load(f)
+            except EOFError:
+                uris = {}
+        if uris:
+            self.post_uris(uris)
+        return len(uris)
+
+    def known_uris(self):
+        with self._lock:
+            rows = self._connection.execute("SELECT uri FROM uris WHERE wb_uri IS NOT NULL").fetchall()
+        return (uri for uri, in rows)
+
+    def reset_factory(self):
+        with self._lock:
+            self._connection.execute("DELETE FROM uris")
+
+    def close(self):
+        """ Close the connection to the database. """
+        with self._lock:
+            self._connection.close()
+
+    def __len__(self):
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM uris").fetchone()[0]
+
 class URIFactoryMock(URIFactory):
+    """ Factory that keeps the uris in memory and saves them in a pickle file.
+
+    Every instance shares the same state. Reads and writes of the state are
+    serialized by a lock, so the factory can be used from several threads, and the
+    file is replaced atomically, so it is never left half written.
+    """
+    enumerable = True
+
     class __URIFactoryMock():
         def __init__(self):
             if not os.path.isfile(URIS_FILE):
@@ -49,23 +293,46 @@ class URIFactoryMock(URIFactory):
                 except EOFError:
                     self.state = {}
 
+        def dump(self):
+            tmp_file = f"{URIS_FILE}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_file, 'wb') as f:
+                pickle.dump(self.state, f)
+            os.replace(tmp_file, URIS_FILE)
+
     instance = None
+    lock = threading.RLock()
 
     def __init__(self):
-        if not URIFactoryMock.instance:
-            URIFactoryMock.instance = URIFactoryMock.__URIFactoryMock()
+        with URIFactoryMock.lock:
+            if not URIFactoryMock.instance:
+                URIFactoryMock.instance = URIFactoryMock.__URIFactoryMock()
 
 
     def get_uri(self, uriRef):
-        return URIFactoryMock.instance.state[uriRef.uri] \
-            if uriRef.uri in URIFactoryMock.instance.state else None
+        with URIFactoryMock.lock:
+            return URIFactoryMock.instance.state.get(uriRef.uri)
+
+    def get_uris(self, uris):
+        with URIFactoryMock.lock:
+            state = URIFactoryMock.instance.state
+            return {uri: state[uri] for uri in uris if state.get(uri) is not None}
 
     def post_uri(self, uriRef, wb_uri):
-        URIFactoryMock.instance.state[uriRef.uri] = wb_uri
-        with open(URIS_FILE, 'wb') as f:
-            pickle.dump(URIFactoryMock.instance.state, f)
+        with URIFactoryMock.lock:
+            URIFactoryMock.instance.state[uriRef.uri] = wb_uri
+            URIFactoryMock.instance.dump()
+
+    def post_uris(self, uris):
+        with URIFactoryMock.lock:
+            URIFactoryMock.instance.state.update(uris)
+            URIFactoryMock.instance.dump()
+
+    def known_uris(self):
+        with URIFactoryMock.lock:
+            uris = [uri for uri, wb_uri in URIFactoryMock.instance.state.items() if wb_uri is not None]
+        return iter(uris)
 
     def reset_factory(self):
-        URIFactoryMock.instance.state = {}
-        with open(URIS_FILE, 'wb') as f:
-            pickle.dump(URIFactoryMock.instance.state, f)
+        with URIFactoryMock.lock:
+            URIFactoryMock.instance.state = {}
+            URIFactoryMock.instance.dump()
@@ -5,7 +5,7 @@ from typing import List
 from rdflib.compare import graph_diff, to_isomorphic
 from rdflib.graph import Graph
 
-from wbsync.triplestore import TripleInfo
+from wbsync.triplestore import ElementRegistry, TripleInfo
 from . import AdditionOperation, RemovalOperation, SyncOperation
 
 
@@ -50,19 +50,22 @@ class GraphDiffSyncAlgorithm(BaseSyncAlgorithm):
         _, removals_graph, additions_graph = graph_diff(source_g_iso,
                                                         target_g_iso)
 
-
-        additions_ops = self._create_add_ops_from(additions_graph)
-        removals_ops = self._create_remove_ops_from(removals_graph)
+        # elements are interned per run, so each URI is resolved only once
+        registry = ElementRegistry()
+        additions_ops = self._create_add_ops_from(additions_graph, registry)
+        removals_ops = self._create_remove_ops_from(removals_graph, registry)
         return removals_ops + additions_ops
 
-    def _create_add_ops_from(self, graph: Graph) -> List[AdditionOperation]:
-        return [AdditionOperation(*TripleInfo.from_rdflib(triple).content)
+    def _create_add_ops_from(self, graph: Graph,
+                             registry: ElementRegistry = None) -> List[AdditionOperation]:
+        return [AdditionOperation(*TripleInfo.from_rdflib(triple, registry=registry).content)
                 for triple in graph]
 
 
 
-    def _create_remove_ops_from(self, graph: Graph) -> List[RemovalOperation]:
-        return [RemovalOperation(*TripleInfo.from_rdflib(triple).content)
+    def _create_remove_ops_from(self, graph: Graph,
+                                registry: ElementRegistry = None) -> List[RemovalOperation]:
+        return [RemovalOperation(*TripleInfo.from_rdflib(triple, registry=registry).content)
                 for triple in graph]
 
 
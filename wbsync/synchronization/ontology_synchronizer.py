@@ -85,9 +85,11 @@ def _annotate_uris_etype(all_urielements: List[URIElement], source_model, target
             urielement.etype = 'property'
 
 def _extract_uris_from(ops: List[SyncOperation]) -> List[URIElement]:
-    return [el for op in ops
-            for el in op._triple_info
-            if el.is_uri]
+    # interned elements are shared between operations, annotate each instance once
+    unique_elements = {id(el): el for op in ops
+                       for el in op._triple_info
+                       if el.is_uri}
+    return list(unique_elements.values())
 
 def _filter_invalid_ops(ops: List[SyncOperation]) -> List[SyncOperation]:
     return list(filter(lambda op: op._triple_info.subject is not None and
@@ -4,6 +4,11 @@ from typing import List
 
 from ..triplestore import ModificationResult, TripleStoreManager, \
                           TripleElement, TripleInfo
+from ..triplestore.metrics import collect_calls
+from ..util.error import InvalidArgumentError
+
+# operations prepared together by execute_ops
+DEFAULT_WAVE_SIZE = 50
 
 
 class SyncOperation(ABC):
@@ -39,6 +44,11 @@ class BasicSyncOperation(SyncOperation):
     def __init__(self, sub: TripleElement, pred: TripleElement, obj: TripleElement):
         pass
 
+    @property
+    def triples(self) -> List[TripleInfo]:
+        """ Return the triples synchronized by this operation. """
+        return [self._triple_info]
+
     def __str__(self):
         return f"{self._triple_info.subject} - {self._triple_info.predicate} " \
                + f"- {self._triple_info.object}"
@@ -105,6 +115,61 @@ class BatchOperation(SyncOperation):
         return ''.join(res)
 
 
+class ExecutionResults(list):
+    """ Results of the operations executed by execute_ops.
+
+    Attributes
+    ----------
+    summary : dict
+        Metrics recorded by the triple store during the execution, by action. Empty
+        if the triple store has no metrics hook.
+    """
+
+    def __init__(self, results: List[ModificationResult] = (), summary: dict = None):
+        super().__init__(results)
+        self.summary = summary if summary is not None else {}
+
+
+def execute_ops(ops: List[SyncOperation], triple_store: TripleStoreManager,
+                wave_size: int = DEFAULT_WAVE_SIZE) -> ExecutionResults:
+    """ Execute a list of operations in the given triple store.
+
+    Operations are executed in waves. Before each wave, the triple store is prepared
+    with all the triples of its operations, so it can perform in bulk the work shared
+    by them. When every operation is executed, the triple store is finished.
+
+    Parameters
+    ----------
+    ops: list of SyncOperation
+        Basic or batch operations to be executed.
+    triple_store : :obj:`TripleStoreManager`
+        Instance of triple store manager
+    wave_size: int
+        Maximum number of operations of each wave.
+
+    Returns
+    -------
+    :obj:`ExecutionResults`
+        Results of each operation, in the same order as the operations, with a summary
+        of the metrics recorded by the triple store during the execution.
+    """
+    if wave_size < 1:
+        raise InvalidArgumentError("The size of the waves must be 1 or higher")
+
+    results = []
+    # only the calls of this thread are summarized, even if the triple store is shared
+    with collect_calls() as calls:
+        try:
+            for i in range(0, len(ops), wave_size):
+                wave = ops[i:i + wave_size]
+                triple_store.prepare([triple for op in wave for triple in op.triples])
+                results.extend(op.execute(triple_store) for op in wave)
+        finally:
+            triple_store.finish()
+    summary = calls.summary() if triple_store.metrics is not None else {}
+    return ExecutionResults(results, summary)
+
+
 def optimize_ops(ops: List[BasicSyncOperation]) -> List[BatchOperation]:
     """ Convert a list of basic operations into a list of batch operations.
 
@@ -1,10 +1,23 @@
-from .triple_info import AnonymousElement, TripleElement, URIElement, LiteralElement, TripleInfo
+from .triple_info import AnonymousElement, ElementRegistry, TripleElement, URIElement, LiteralElement, \
+    TripleInfo
+from .metrics import InMemoryMetrics, MetricsHook
 from .triplestore_manager import TripleStoreManager, ModificationResult
+from .coalescing_buffer import CoalescingBuffer
 from .wikibase_adapter import WikibaseAdapter
+from .in_memory import InMemoryTripleStore
+from .bulk_export import BulkExportManager
+from .sparql_update import SparqlUpdateManager
 
 __all__ = [
     'AnonymousElement',
+    'BulkExportManager',
+    'CoalescingBuffer',
+    'ElementRegistry',
+    'InMemoryMetrics',
+    'InMemoryTripleStore',
+    'MetricsHook',
     'ModificationResult',
+    'SparqlUpdateManager',
     'TripleStoreManager',
     'TripleInfo',
     'TripleElement',
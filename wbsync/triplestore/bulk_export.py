@@ -0,0 +1,284 @@
+import json
+import logging
+
+from typing import List, Optional, TextIO
+
+from . import TripleElement, TripleInfo, TripleStoreManager, ModificationResult
+from .entity_model import EntityModel, ModelEntity
+from ..external.uri_factory import SQLiteURIFactory, URIFactory
+
+logger = logging.getLogger(__name__)
+
+# unit of the quantities without unit
+QUANTITY_NO_UNIT = '1'
+
+
+class BulkExportManager(TripleStoreManager):
+    """ Triple store manager that writes the synchronized triples to bulk import files.
+
+    Instead of calling the wikibase API for each change, changes are applied to an
+    in-memory :obj:`EntityModel` and exported at the end of the synchronization, which
+    is much faster for initial loads and recoveries. Two formats are supported:
+
+    - JSON lines, with the JSON of an entity created by the synchronization in each
+      line, suitable for the import scripts of wikibase.
+    - QuickStatements v1 commands, which create the new items and also edit the
+      entities that already existed.
+
+    New entities get ids allocated locally, consecutive from the first ids given, so
+    the files must be imported in a wikibase whose next ids are those ones. Once the
+    files are exported, the ids are recorded in the uri factory.
+
+    Parameters
+    ----------
+    factory_of_uris : :obj:`URIFactory`, optional
+        Factory where the ids of the existing entities are looked up and the ids of
+        the new ones are recorded. By default, a :obj:`SQLiteURIFactory` is used.
+    first_item_id : int
+        Numeric id of the first item created by the export.
+    first_property_id : int
+        Numeric id of the first property created by the export.
+    related_link_prop : str, optional
+        Id of the related link property. If None, it is created by the export.
+    mappings_prop : str, optional
+        Id of the same as property. If None, it is created by the export if needed.
+    set_of_uris_for_asio : set
+        Uris whose entities also get a same as claim.
+    """
+
+    def __init__(self, factory_of_uris: URIFactory = None, first_item_id: int = 1, first_property_id: int = 1,
+                 related_link_prop: str = None, mappings_prop: str = None, set_of_uris_for_asio=frozenset()):
+        factory_of_uris = factory_of_uris if factory_of_uris is not None else SQLiteURIFactory()
+        self.model = EntityModel(factory_of_uris, first_item_id, first_property_id,
+                                 related_link_prop, mappings_prop, set_of_uris_for_asio)
+
+    def batch_update(self, subject: TripleElement, triples: List[TripleInfo]) -> ModificationResult:
+        """ Apply the changes of a set of triples with a given subject to the export.
+
+        Returns
+        -------
+        :obj:`ModificationResult`
+            Result of the operation, with the id of the subject.
+        """
+        return self._apply(triples)
+
+    def create_triple(self, triple_info: TripleInfo) -> ModificationResult:
+        """ Apply the addition of a triple to the export.
+
+        Returns
+        -------
+        :obj:`ModificationResult`
+            Result of the operation, with the id of the subject.
+        """
+        return self._apply([triple_info], added=True)
+
+    def remove_triple(self, triple_info: TripleInfo) -> ModificationResult:
+        """ Apply the removal of a triple to the export.
+
+        Returns
+        -------
+        :obj:`ModificationResult`
+            Result of the operation, with the id of the subject.
+        """
+        return self._apply([triple_info], added=False)
+
+    def prepare(self, triples: List[TripleInfo]) -> None:
+        """ Convert in bulk the literals of the triples that are going to be exported. """
+        self.model.prepare(triples)
+
+    def export(self, json_lines_path: str = None, quickstatements_path: str = None) -> int:
+        """ Write the export files and record the ids of the new entities in the uri factory.
+
+        Parameters
+        ----------
+        json_lines_path : str, optional
+            Path of the JSON lines file. If None, it is not written.
+        quickstatements_path : str, optional
+            Path of the QuickStatements file. If None, it is not written.
+
+        Returns
+        -------
+        int
+            Number of ids recorded in the uri factory.
+        """
+        if json_lines_path is not None:
+            with open(json_lines_path, 'w', encoding='utf-8') as f:
+                self.write_json_lines(f)
+        if quickstatements_path is not None:
+            with open(quickstatements_path, 'w', encoding='utf-8') as f:
+                self.write_quickstatements(f)
+        return self.record_ids()
+
+    def record_ids(self) -> int:
+        """ Record the ids allocated to the new entities in the uri factory.
+
+        Returns
+        -------
+        int
+            Number of ids recorded.
+        """
+        allocated_ids = dict(self.model.allocated_ids)
+        if allocated_ids:
+            self.model.uris_factory.post_uris(allocated_ids)
+        return len(allocated_ids)
+
+    def write_json_lines(self, file: TextIO) -> int:
+        """ Write the JSON of each new entity in a line of a file.
+
+        Changes of entities that already existed can't be represented in this format,
+        so they are left out with a warning.
+
+        Returns
+        -------
+        int
+            Number of entities written.
+        """
+        entities = self.model.new_entities()
+        for entity in entities:
+            file.write(json.dumps(entity.to_json(), ensure_ascii=False))
+            file.write('\n')
+        skipped = self.model.changed_entities()
+        if skipped:
+            logger.warning("Changes of %d existing entities can't be exported as JSON lines. "
+                           "Use the QuickStatements export to apply them", len(skipped))
+        return len(entities)
+
+    def write_quickstatements(self, file: TextIO) -> int:
+        """ Write the QuickStatements v1 commands of the export to a file.
+
+        Every new item is created first, in the order of its id, so statements can refer
+        to any of them. QuickStatements can't create properties, so new properties must
+        be imported beforehand, and changes that it can't express, like removals of
+        labels, are left out with a warning.
+
+        Returns
+        -------
+        int
+            Number of commands written.
+        """
+        commands = []
+        new_entities = self.model.new_entities()
+        new_properties = [entity.id for entity in new_entities if entity.etype == 'property']
+        if new_properties:
+            logger.warning("QuickStatements can't create properties. Import %s before the commands",
+                           ', '.join(new_properties))
+
+        new_items = [entity for entity in new_entities if entity.etype == 'item']
+        for entity in new_items:
+            commands.append('CREATE')
+            commands.extend(_term_commands('LAST', entity))
+        for entity in new_items:
+            commands.extend(_claim_commands(entity.id, entity))
+        for entity in self.model.changed_entities():
+            commands.extend(_removal_commands(entity))
+            commands.extend(_term_commands(entity.id, entity))
+            commands.extend(_claim_commands(entity.id, entity))
+
+        for command in commands:
+            file.write(command)
+            file.write('\n')
+        return len(commands)
+
+    def _apply(self, triples: List[TripleInfo], added: bool = None) -> ModificationResult:
+        entity_id = None
+        for triple in triples:
+            try:
+                entity_id = self.model.apply(triple, added)
+            except (ValueError, TypeError, NotImplementedError) as err:
+                logger.warning("Triple %s could not be exported: %s", triple, err)
+                return ModificationResult(successful=False, message=str(err))
+        return ModificationResult(successful=True, res=entity_id)
+
+
+def _claim_commands(entity_ref: str, entity: ModelEntity) -> List[str]:
+    commands = []
+    for prop_nr, claims in entity.claims.items():
+        for claim in claims:
+            value = _qs_value(claim)
+            if value is None:
+                logger.warning("Claim of %s in %s can't be expressed in QuickStatements. Skipping...",
+                               prop_nr, entity.id)
+                continue
+            commands.append(f"{entity_ref}\t{prop_nr}\t{value}")
+    return commands
+
+
+def _qs_string(value: str) -> str:
+    return '"' + ' '.join(str(value).split()) + '"'
+
+
+def _qs_value(claim: dict) -> Optional[str]:
+    datavalue = claim['mainsnak'].get('datavalue')
+    if datavalue is None:
+        return None
+    vtype, value = datavalue['type'], datavalue['value']
+    if vtype == 'wikibase-entityid':
+        if 'id' in value:
+            return value['id']
+        return ('P' if value.get('entity-type') == 'property' else 'Q') + str(value['numeric-id'])
+    if vtype == 'string':
+        return _qs_string(value)
+    if vtype == 'monolingualtext':
+        return f"{value['language']}:{_qs_string(value['text'])}"
+    if vtype == 'time':
+        return f"{value['time']}/{value['precision']}"
+    if vtype == 'globecoordinate':
+        return f"@{value['latitude']}/{value['longitude']}"
+    if vtype == 'quantity':
+        res = str(value['amount']).lstrip('+')
+        if 'lowerBound' in value and 'upperBound' in value:
+            res += f"[{str(value['lowerBound']).lstrip('+')},{str(value['upperBound']).lstrip('+')}]"
+        unit = value.get('unit', QUANTITY_NO_UNIT)
+        if unit != QUANTITY_NO_UNIT:
+            res += 'U' + unit.rsplit('/', 1)[-1].lstrip('Q')
+        return res
+    return None
+
+
+def _removal_commands(entity: ModelEntity) -> List[str]:
+    commands = []
+    for prop_nr, value in entity.removed_claims:
+        claim = None if value is None else {'mainsnak': {'property': prop_nr, 'datavalue': {
+            'type': _datavalue_type(value), 'value': value}}}
+        qs_value = _qs_value(claim) if claim is not None else None
+        if qs_value is None:
+            logger.warning("Removal of claims of %s in %s can't be expressed in QuickStatements. Skipping...",
+                           prop_nr, entity.id)
+            continue
+        commands.append(f"-{entity.id}\t{prop_nr}\t{qs_value}")
+    for lang, alias in entity.removed_aliases:
+        logger.warning("Removal of alias %s@%s of %s can't be expressed in QuickStatements. Skipping...",
+                       alias, lang, entity.id)
+    return commands
+
+
+def _datavalue_type(value) -> Optional[str]:
+    if isinstance(value, str):
+        return 'string'
+    if 'numeric-id' in value or 'entity-type' in value:
+        return 'wikibase-entityid'
+    if 'text' in value:
+        return 'monolingualtext'
+    if 'time' in value:
+        return 'time'
+    if 'latitude' in value:
+        return 'globecoordinate'
+    if 'amount' in value:
+        return 'quantity'
+    return None
+
+
+def _term_commands(entity_ref: str, entity: ModelEntity) -> List[str]:
+    commands = []
+    for prefix, terms in (('L', entity.labels), ('D', entity.descriptions)):
+        for lang, value in terms.items():
+            if value is None:
+                if not entity.is_new:
+                    logger.warning("Removal of %s@%s of %s can't be expressed in QuickStatements. Skipping...",
+                                   'label' if prefix == 'L' else 'description', lang, entity.id)
+                continue
+            commands.append(f"{entity_ref}\t{prefix}{lang}\t{_qs_string(value)}")
+    for lang, aliases in entity.aliases.items():
+        for alias in aliases:
+            commands.append(f"{entity_ref}\tA{lang}\t{_qs_string(alias)}")
+    return commands
@@ -0,0 +1,296 @@
+import logging
+import threading
+import time
+
+from collections import OrderedDict
+from typing import Callable, List
+
+from . import TripleElement, TripleInfo, TripleStoreManager, ModificationResult
+from ..util.error import InvalidArgumentError
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_PENDING_TRIPLES = 500
+DEFAULT_MAX_AGE = 30.0
+
+FlushCallback = Callable[[List[ModificationResult]], None]
+
+
+class CoalescingBuffer(TripleStoreManager):
+    """ Triple store manager that merges the changes of several plans before writing them.
+
+    Changes are kept in memory and grouped by subject, so an entity modified by several
+    plans close in time is edited once, with a batch update, when the buffer is flushed.
+    Repeated changes of the same triple are merged keeping the final state:
+
+    - An addition after an addition of the same triple is ignored.
+    - A removal after an addition replaces the addition.
+    - An addition after a removal is kept after the removal.
+    - A removal right after a removal of the same triple replaces it.
+
+    Triple stores may remove every claim of a property when one of its triples is
+    removed, like the item engine path of the wikibase adapter. So a removal is a
+    barrier for the predicate: the additions of the predicate made before it are never
+    merged with the ones made after it, and the changes of the predicate keep their order.
+
+    The buffer is flushed when the number of pending triples or the age of the oldest
+    pending change reach their thresholds, when `flush` is called, or when the buffer
+    is used as a context manager and the context is exited. The age is checked when
+    changes are added and by a timer thread, so an idle buffer is flushed too. The
+    timer is a daemon thread, so the buffer must be flushed before the program exits.
+    Flushes are serialized, so the changes are written in the order they were added.
+    If a flush raises, the changes of the subjects it didn't write are put back in the
+    buffer, before the changes added since, and written by the next flush.
+
+    A change that triggers a flush gets the results of the flush: it is only
+    successful if every batch update of the flush is. The failed results of the
+    flushes of the timer and the context manager are kept in `failed_results`.
+
+    Parameters
+    ----------
+    triple_store : :obj:`TripleStoreManager`
+        Triple store where the merged changes are written.
+    max_pending : int
+        Number of pending triples that triggers a flush.
+    max_age : float
+        Seconds after the first pending change that trigger a flush.
+    on_flush : callable, optional
+        Function called with the results of each flush.
+    clock : callable
+        Function that returns the current time in seconds.
+
+    Attributes
+    ----------
+    failed_results : list of :obj:`ModificationResult`
+        Failed results of the flushes that were not triggered by a caller.
+    """
+
+    def __init__(self, triple_store: TripleStoreManager, max_pending: int = DEFAULT_MAX_PENDING_TRIPLES,
+                 max_age: float = DEFAULT_MAX_AGE, on_flush: FlushCallback = None,
+                 clock: Callable[[], float] = time.monotonic):
+        if max_pending < 1:
+            raise InvalidArgumentError("The maximum number of pending triples must be 1 or higher")
+        if max_age < 0:
+            raise InvalidArgumentError("The maximum age of the pending changes can't be negative")
+        self.triple_store = triple_store
+        self.max_pending = max_pending
+        self.max_age = max_age
+        self._on_flush = on_flush
+        self._clock = clock
+        self.failed_results = []
+        self._lock = threading.Lock()
+        # held while writing, so concurrent flushes don't reorder the writes
+        self._flush_lock = threading.RLock()
+        self._timer = None
+        self._reset()
+
+    def batch_update(self, subject: TripleElement, triples: List[TripleInfo]) -> ModificationResult:
+        """ Buffer the changes of a set of triples with a given subject.
+
+        Returns
+        -------
+        :obj:`ModificationResult`
+            Successful result, unless the change triggers a flush that fails. The
+            result of the write is given by the flush.
+        """
+        return self._enqueue(triples)
+
+    def create_triple(self, triple_info: TripleInfo) -> ModificationResult:
+        """ Buffer the addition of a triple.
+
+        Returns
+        -------
+        :obj:`ModificationResult`
+            Successful result, unless the change triggers a flush that fails. The
+            result of the write is given by the flush.
+        """
+        return self._enqueue([_with_change(triple_info, isAdded=True)])
+
+    def remove_triple(self, triple_info: TripleInfo) -> ModificationResult:
+        """ Buffer the removal of a triple.
+
+        Returns
+        -------
+        :obj:`ModificationResult`
+            Successful result, unless the change triggers a flush that fails. The
+            result of the write is given by the flush.
+        """
+        return self._enqueue([_with_change(triple_info, isAdded=False)])
+
+    def flush(self) -> List[ModificationResult]:
+        """ Write the pending changes to the triple store, with a batch update per subject.
+
+        Returns
+        -------
+        list of :obj:`ModificationResult`
+            Results of the batch update of each subject.
+        """
+        with self._flush_lock:
+            with self._lock:
+                pending, pending_since = self._pending, self._first_change
+                self._reset()
+            written = set()
+            try:
+                return self._write(pending, written)
+            except Exception:
+                self._requeue(pending, pending_since, written)
+                raise
+
+    def _write(self, pending: OrderedDict, written: set) -> List[ModificationResult]:
+        subject_changes = [changes for changes in pending.values() if changes]
+        if not subject_changes:
+            return []
+
+        logger.info("Flushing changes of %d subjects", len(subject_changes))
+        results = []
+        try:
+            self.triple_store.prepare([triple for changes in subject_changes for triple in changes.triples()])
+            for changes in subject_changes:
+                results.append(self.triple_store.batch_update(changes.subject, changes.triples()))
+                written.add(changes.subject.uri)
+        finally:
+            self.triple_store.finish()
+        for result in results:
+            if not result.successful:
+                logger.warning("Error flushing buffered changes: %s", result.message)
+        if self._on_flush is not None:
+            self._on_flush(results)
+        return results
+
+    def _enqueue(self, triples: List[TripleInfo]) -> ModificationResult:
+        with self._lock:
+            if self._first_change is None:
+                self._first_change = self._clock()
+                self._schedule_flush()
+            for triple in triples:
+                self._merge(triple)
+            should_flush = self._pending_count >= self.max_pending or \
+                self._clock() - self._first_change >= self.max_age
+        if not should_flush:
+            return ModificationResult(successful=True, message="Change buffered")
+        results = self.flush()
+        failed = [result for result in results if not result.successful]
+        if failed:
+            return ModificationResult(successful=False, res=results, message="Error flushing buffered changes: " +
+                                      "; ".join(result.message for result in failed))
+        return ModificationResult(successful=True, message="Change buffered and flushed", res=results)
+
+    def _schedule_flush(self):
+        # called with the lock held when the first change is buffered
+        if self.max_age > 0:
+            self._timer = threading.Timer(self.max_age, self._flush_in_background)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _flush_in_background(self):
+        try:
+            results = self.flush()
+        except Exception:
+            logger.exception("Error flushing buffered changes")
+            return
+        self._keep_failed(results)
+
+    def _requeue(self, pending: OrderedDict, pending_since: float, written: set):
+        unwritten = [(uri, changes) for uri, changes in pending.items() if uri not in written and changes]
+        if not unwritten:
+            return
+        logger.warning("Changes of %d subjects were not written. Keeping them for the next flush...",
+                       len(unwritten))
+        with self._lock:
+            newer = self._pending
+            self._pending = OrderedDict(unwritten)
+            self._pending_count = sum(len(changes) for _, changes in unwritten)
+            for changes in newer.values():
+                for triple in changes.triples():
+                    self._merge(triple)
+            self._first_change = pending_since
+            if self._timer is None:
+                self._schedule_flush()
+
+    def _keep_failed(self, results: List[ModificationResult]):
+        with self._lock:
+            self.failed_results.extend(result for result in results if not result.successful)
+
+    def _merge(self, triple: TripleInfo):
+        subject = triple.subject
+        changes = self._pending.get(subject.uri)
+        if changes is None:
+            changes = self._pending[subject.uri] = _SubjectChanges(subject)
+        self._pending_count += changes.merge(triple)
+
+    def _reset(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._pending = OrderedDict()
+        self._pending_count = 0
+        self._first_change = None
+
+    def __len__(self):
+        return self._pending_count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._keep_failed(self.flush())
+
+
+class _SubjectChanges():
+    """ Pending changes of a subject, in the order they are written. """
+
+    def __init__(self, subject: TripleElement):
+        self.subject = subject
+        self._changes = OrderedDict()
+        # number of removals of each predicate, which separate its additions
+        self._removals = {}
+        # key of the last change of each predicate
+        self._last_changes = {}
+
+    def merge(self, triple: TripleInfo) -> int:
+        """ Merge a change with the pending ones and return the change of their number. """
+        predicate, object_key = triple.predicate.uri, _object_key(triple)
+        removals = self._removals.get(predicate, 0)
+        if triple.isAdded:
+            key = ('add', predicate, object_key, removals)
+            if key in self._changes:
+                return 0
+            self._changes[key] = triple
+            self._last_changes[predicate] = key
+            return 1
+
+        last_removal = ('remove', predicate, object_key, removals - 1)
+        if self._last_changes.get(predicate) == last_removal:
+            self._changes[last_removal] = triple
+            return 0
+        # the removal also applies to the triple added before it
+        replaced = self._changes.pop(('add', predicate, object_key, removals), None) is not None
+        key = ('remove', predicate, object_key, removals)
+        self._changes[key] = triple
+        self._last_changes[predicate] = key
+        self._removals[predicate] = removals + 1
+        return 0 if replaced else 1
+
+    def triples(self) -> List[TripleInfo]:
+        return list(self._changes.values())
+
+    def __len__(self):
+        return len(self._changes)
+
+
+def _object_key(triple: TripleInfo) -> tuple:
+    objct = triple.object
+    if objct.is_literal():
+        content = objct.content
+        try:
+            hash(content)
+        except TypeError:
+            content = repr(content)
+        return 'literal', content, str(objct.datatype) if objct.datatype else None, objct.lang
+    return 'uri', objct.uri
+
+
+def _with_change(triple: TripleInfo, isAdded: bool) -> TripleInfo:
+    if triple.isAdded == isAdded:
+        return triple
+    return TripleInfo(triple.subject, triple.predicate, triple.object, isAdded=isAdded)
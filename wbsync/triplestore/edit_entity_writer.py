@@ -0,0 +1,293 @@
+import json
+import logging
+
+from typing import List, Optional
+
+from wikidataintegrator import wdi_core
+from wikidataintegrator.wdi_config import config
+
+from .transport import RequestsTransport, Transport
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TERM_LANG = 'en'
+# parts of an entity needed to compute the claims and aliases of an edit
+STATE_PROPS = 'info|aliases|claims'
+# parts of an entity needed to compute the aliases of an edit
+TERMS_STATE_PROPS = 'info|aliases'
+
+
+class EntityEdit():
+    """ Changes to be applied to a wikibase entity in a single wbeditentity request.
+
+    Unlike the item engines of wikidataintegrator, an edit doesn't hold the state of
+    the entity. It only records the changes, and the JSON sent to the wikibase only
+    contains the added claims, the GUIDs of the removed claims and the modified terms.
+
+    Parameters
+    ----------
+    entity_id : str, optional
+        Id of the entity to be edited. If None, the edit creates a new entity.
+    entity_type : str
+        Type of the entity ('item' or 'property').
+    property_datatype : str, optional
+        Datatype of the entity when a new property is created.
+    """
+
+    def __init__(self, entity_id: str = None, entity_type: str = 'item', property_datatype: str = None):
+        self.entity_id = entity_id
+        self.entity_type = entity_type
+        self.property_datatype = property_datatype
+        self._labels = {}
+        self._descriptions = {}
+        self._added_aliases = []
+        self._removed_aliases = []
+        self._added_claims = []
+        self._removed_claims = []
+
+    @property
+    def is_term_only(self) -> bool:
+        """ Whether the edit only changes labels, descriptions and aliases. """
+        return not (self._added_claims or self._removed_claims)
+
+    @property
+    def needs_state(self) -> bool:
+        """ Whether the current claims or aliases of the entity are needed to compute the edit. """
+        return self.state_props is not None
+
+    @property
+    def state_props(self) -> Optional[str]:
+        """ Parts of the entity needed to compute the edit, as wbgetentities props, or None. """
+        if self.entity_id is None:
+            return None
+        if not self.is_term_only:
+            return STATE_PROPS
+        return TERMS_STATE_PROPS if self._removed_aliases else None
+
+    def set_label(self, label: str, lang: str = DEFAULT_TERM_LANG):
+        """ Set the label of a language. An empty label removes it. """
+        self._labels[lang] = label
+
+    def set_description(self, description: str, lang: str = DEFAULT_TERM_LANG):
+        """ Set the description of a language. An empty description removes it. """
+        self._descriptions[lang] = description
+
+    def add_alias(self, alias: str, lang: str = DEFAULT_TERM_LANG):
+        """ Add an alias to the entity. """
+        if (lang, alias) in self._removed_aliases:
+            self._removed_aliases.remove((lang, alias))
+        self._added_aliases.append((lang, alias))
+
+    def remove_alias(self, alias: str, lang: str = DEFAULT_TERM_LANG):
+        """ Remove an alias of the entity. """
+        self._added_aliases = [added for added in self._added_aliases if added != (lang, alias)]
+        self._removed_aliases.append((lang, alias))
+
+    def add_claim(self, statement: wdi_core.WDBaseDataType):
+        """ Add a claim with the value of a wdi statement. """
+        claim = statement.get_json_representation()
+        prop_nr, value = _claim_key(claim)
+        self._removed_claims = [removed for removed in self._removed_claims
+                                if removed[0] != prop_nr or not _same_value(removed[1], value)]
+        self._added_claims.append(claim)
+
+    def remove_claims(self, prop_nr: str, value=None):
+        """ Remove the claims of a property.
+
+        Parameters
+        ----------
+        prop_nr : str
+            Id of the property of the claims.
+        value : optional
+            Datavalue of the claims to be removed. If None, every claim of the property is removed.
+        """
+        self._added_claims = [claim for claim in self._added_claims
+                              if not claim_matches(claim, prop_nr, value)]
+        self._removed_claims.append((prop_nr, value))
+
+    def to_json(self, entity_json: dict = None) -> dict:
+        """ Return the data of the wbeditentity request of this edit.
+
+        Parameters
+        ----------
+        entity_json : dict, optional
+            Current state of the entity, used to find the GUIDs of the removed claims and
+            to skip the claims and aliases that already exist.
+
+        Returns
+        -------
+        dict
+            Data of the wbeditentity request.
+        """
+        entity_json = entity_json or {}
+        data = {}
+        if self._labels:
+            data['labels'] = {lang: _term(lang, label) for lang, label in self._labels.items()}
+        if self._descriptions:
+            data['descriptions'] = {lang: _term(lang, desc) for lang, desc in self._descriptions.items()}
+
+        aliases = self._aliases_json(entity_json.get('aliases', {}))
+        if aliases:
+            data['aliases'] = aliases
+
+        claims = self._claims_json(entity_json.get('claims', {}))
+        if claims:
+            data['claims'] = claims
+
+        if self.entity_id is None and self.entity_type == 'property':
+            data['datatype'] = self.property_datatype
+        return data
+
+    def _aliases_json(self, curr_aliases: dict) -> List[dict]:
+        def exists(lang, alias):
+            return any(curr['value'] == alias for curr in curr_aliases.get(lang, []))
+
+        aliases = []
+        for lang, alias in dict.fromkeys(self._added_aliases):
+            if not exists(lang, alias):
+                aliases.append({'language': lang, 'value': alias, 'add': ''})
+        for lang, alias in dict.fromkeys(self._removed_aliases):
+            if exists(lang, alias):
+                aliases.append({'language': lang, 'value': alias, 'remove': ''})
+            else:
+                logger.warning("Alias %s@%s does not exist for object %s. Skipping removal...",
+                               alias, lang, self.entity_id)
+        return aliases
+
+    def _claims_json(self, curr_claims: dict) -> List[dict]:
+        removed_guids = []
+        for prop_nr, value in self._removed_claims:
+            for claim in curr_claims.get(prop_nr, []):
+                if claim_matches(claim, prop_nr, value) and claim['id'] not in removed_guids:
+                    removed_guids.append(claim['id'])
+
+        claims = []
+        for claim in self._added_claims:
+            prop_nr, value = _claim_key(claim)
+            remaining = [curr for curr in curr_claims.get(prop_nr, [])
+                         if curr['id'] not in removed_guids] + claims
+            if not any(claim_matches(curr, prop_nr, value) for curr in remaining):
+                claims.append(claim)
+        return claims + [{'id': guid, 'remove': ''} for guid in removed_guids]
+
+
+class EditEntityWriter():
+    """ Writes entity edits to a wikibase with minimal wbeditentity requests.
+
+    Parameters
+    ----------
+    mediawiki_api_url : str
+        String with the url where the mediawiki API is accesible.
+    login : :obj:`wikidataintegrator.wdi_login.WDLogin`
+        Login used to write the edits.
+    transport : :obj:`Transport`, optional
+        Transport used to call the mediawiki API. By default, the API is called over HTTP.
+    """
+
+    def __init__(self, mediawiki_api_url: str, login, transport: Transport = None):
+        self.api_url = mediawiki_api_url
+        self._login = login
+        self._transport = transport if transport is not None else RequestsTransport()
+
+    def fetch(self, entity_id: str, props: str = STATE_PROPS) -> Optional[dict]:
+        """ Fetch the parts of an entity needed to compute its edits.
+
+        Parameters
+        ----------
+        entity_id : str
+            Id of the entity.
+        props : str
+            Parts of the entity to be fetched, as wbgetentities props. By default, its
+            revision, aliases and claims.
+
+        Returns
+        -------
+        dict
+            Partial JSON of the entity, or None if it does not exist.
+        """
+        query_res = self._transport.get(f"{self.api_url}?action=wbgetentities&ids={entity_id}" +
+                                        f"&props={props}&format=json")
+        entity_json = query_res.get('entities', {}).get(entity_id)
+        if entity_json is None or 'missing' in entity_json:
+            return None
+        return entity_json
+
+    def write(self, edit: EntityEdit, entity_json: dict = None, bot_account: bool = True,
+              edit_summary: str = '') -> Optional[dict]:
+        """ Apply an edit to the wikibase.
+
+        Parameters
+        ----------
+        edit : :obj:`EntityEdit`
+            Edit to be applied.
+        entity_json : dict, optional
+            Current state of the entity. Its lastrevid is sent as the base revision of the edit.
+        bot_account : bool
+            Whether the edit is marked as a bot edit, like in `WDItemEngine.write`.
+        edit_summary : str
+            Summary of the edit, like in `WDItemEngine.write`.
+
+        Returns
+        -------
+        dict
+            JSON of the entity returned by the wikibase after the edit, or None if the
+            edit didn't change the entity and no request was made.
+
+        Raises
+        ------
+        :obj:`wikidataintegrator.wdi_core.WDApiError`
+            If the wikibase rejects the edit.
+        """
+        data = edit.to_json(entity_json)
+        if not data and edit.entity_id is not None:
+            logger.debug("Edit of %s has no changes. Skipping write...", edit.entity_id)
+            return None
+
+        payload = {
+            'action': 'wbeditentity',
+            'data': json.dumps(data),
+            'format': 'json',
+            'token': self._login.get_edit_token(),
+            'summary': edit_summary,
+            'maxlag': config['MAXLAG']
+        }
+        if bot_account:
+            payload['bot'] = ''
+        if edit.entity_id is None:
+            payload['new'] = edit.entity_type
+        else:
+            payload['id'] = edit.entity_id
+            if entity_json is not None and 'lastrevid' in entity_json:
+                payload['baserevid'] = entity_json['lastrevid']
+
+        json_data = self._transport.post(self.api_url, payload, self._login)
+        if 'error' in json_data:
+            raise wdi_core.WDApiError(json_data)
+        return json_data['entity']
+
+
+def _claim_key(claim: dict):
+    mainsnak = claim['mainsnak']
+    return mainsnak['property'], mainsnak.get('datavalue', {}).get('value')
+
+
+def claim_matches(claim: dict, prop_nr: str, value) -> bool:
+    """ Returns whether a claim has the given property and datavalue (any datavalue if value is None). """
+    claim_prop, claim_value = _claim_key(claim)
+    return claim_prop == prop_nr and (value is None or _same_value(value, claim_value))
+
+
+def _same_value(value, other) -> bool:
+    if isinstance(value, dict) and isinstance(other, dict):
+        if 'numeric-id' in value or 'id' in value:
+            return value.get('id') == other.get('id') if 'id' in value and 'id' in other \
+                else value.get('numeric-id') == other.get('numeric-id')
+        # optional fields of the datavalues, like bounds or altitudes, are not compared
+        return all(other.get(key) == val for key, val in value.items() if val is not None)
+    return value == other
+
+
+def _term(lang: str, value: str) -> dict:
+    if not value:
+        return {'language': lang, 'remove': ''}
+    return {'language': lang, 'value': value}
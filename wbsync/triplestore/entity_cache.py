@@ -0,0 +1,94 @@
+import json
+import threading
+
+from collections import OrderedDict
+from typing import Optional
+
+from ..util.error import InvalidArgumentError
+
+DEFAULT_MAX_ENTITIES = 10000
+
+
+class EntityCache():
+    """ Last known state of the wikibase entities touched during a synchronization run.
+
+    Entities are stored as their wbgetentities JSON, including the lastrevid of the
+    revision they were read from or written to. Each call to get returns a new copy
+    of the JSON, so item engines can modify it freely. When the cache is full, the
+    least recently used entity is evicted. The cache can be shared by several threads.
+
+    Parameters
+    ----------
+    max_size : int
+        Maximum number of entities kept in the cache.
+    """
+
+    def __init__(self, max_size: int = DEFAULT_MAX_ENTITIES):
+        if max_size < 1:
+            raise InvalidArgumentError("The size of the cache must be 1 or higher")
+        self.max_size = max_size
+        self._entities = OrderedDict()
+        self._revisions = {}
+        self._lock = threading.Lock()
+
+    def get(self, entity_id: str) -> Optional[dict]:
+        """ Return a copy of the last known JSON of an entity, or None if it is not cached. """
+        with self._lock:
+            entity_json = self._entities.get(entity_id)
+            if entity_json is not None:
+                self._entities.move_to_end(entity_id)
+        return json.loads(entity_json) if entity_json is not None else None
+
+    def lastrevid(self, entity_id: str) -> Optional[int]:
+        """ Return the revision of the cached state of an entity, or None if it is not cached. """
+        with self._lock:
+            return self._revisions.get(entity_id)
+
+    def update(self, entity_id: str, entity_json: dict, lastrevid: int = None) -> None:
+        """ Store the last known state of an entity.
+
+        States without claims or without a revision id can't be used to edit the
+        entity, so the entity is removed from the cache instead.
+
+        Parameters
+        ----------
+        entity_id : str
+            Id of the entity.
+        entity_json : dict
+            JSON representation of the entity.
+        lastrevid : int, optional
+            Revision of the state, if it is not included in the JSON.
+        """
+        if not isinstance(entity_json, dict) or 'claims' not in entity_json:
+            self.invalidate(entity_id)
+            return
+        lastrevid = entity_json.get('lastrevid', lastrevid)
+        if not isinstance(lastrevid, int):
+            self.invalidate(entity_id)
+            return
+        entity_json = json.dumps(dict(entity_json, id=entity_id, lastrevid=lastrevid))
+        with self._lock:
+            self._entities[entity_id] = entity_json
+            self._entities.move_to_end(entity_id)
+            self._revisions[entity_id] = lastrevid
+            if len(self._entities) > self.max_size:
+                evicted_id, _ = self._entities.popitem(last=False)
+                del self._revisions[evicted_id]
+
+    def invalidate(self, entity_id: str) -> None:
+        """ Remove an entity from the cache. """
+        with self._lock:
+            self._entities.pop(entity_id, None)
+            self._revisions.pop(entity_id, None)
+
+    def clear(self) -> None:
+        """ Remove every entity from the cache. """
+        with self._lock:
+            self._entities.clear()
+            self._revisions.clear()
+
+    def __contains__(self, entity_id):
+        return entity_id in self._entities
+
+    def __len__(self):
+        return len(self._entities)
@@ -0,0 +1,361 @@
+""" In-memory model of the wikibase entities changed by a synchronization.
+
+Triple stores that don't write to a wikibase through its API, like the bulk exporter,
+apply the synchronized triples to the entities of an :obj:`EntityModel` instead.
+"""
+import logging
+import threading
+
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+
+from wikidataintegrator import wdi_core
+
+from . import TripleElement, TripleInfo
+from .edit_entity_writer import DEFAULT_TERM_LANG, claim_matches
+from .wikibase_adapter import MAPPINGS_PROP_DESC, MAPPINGS_PROP_LABEL, MAX_CHARACTERS_DESC, \
+    RELATED_LINK_DESC, RELATED_LINK_LABEL, NonLiteralElement, WikibaseAdapter, \
+    get_lang_from_literal, is_added, is_same_as_activated, try_infer_label_from
+from ..external.uri_factory import InMemoryURIFactory, URIFactory
+from ..util.error import InvalidArgumentError
+from ..util.literal_conversion import LiteralBatchConverter
+
+logger = logging.getLogger(__name__)
+
+ID_PREFIXES = {'item': 'Q', 'property': 'P'}
+
+
+class ModelEntity():
+    """ Wikibase entity held in memory.
+
+    Entities created in the model hold their whole state. Entities that already exist
+    in the wikibase only hold the changes applied to them, so the removals that can't
+    be checked against their state are recorded apart.
+
+    Parameters
+    ----------
+    entity_id : str
+        Id of the entity.
+    etype : str
+        Type of the entity ('item' or 'property').
+    datatype : str, optional
+        Datatype of the entity if it is a property.
+    is_new : bool
+        Whether the entity was created in the model.
+    """
+
+    def __init__(self, entity_id: str, etype: str = 'item', datatype: str = None, is_new: bool = False):
+        self.id = entity_id
+        self.etype = etype
+        self.datatype = datatype
+        self.is_new = is_new
+        # terms by language, None if the term was removed
+        self.labels = OrderedDict()
+        self.descriptions = OrderedDict()
+        self.aliases = OrderedDict()
+        self.claims = OrderedDict()
+        self.removed_aliases = []
+        self.removed_claims = []
+
+    @property
+    def has_changes(self) -> bool:
+        """ Whether any term or claim of the entity was set or removed. """
+        return bool(self.labels or self.descriptions or self.aliases or self.claims or
+                    self.removed_aliases or self.removed_claims)
+
+    def set_label(self, label: Optional[str], lang: str = DEFAULT_TERM_LANG):
+        """ Set the label of a language. A None label removes it. """
+        self.labels[lang] = label or None
+
+    def set_description(self, description: Optional[str], lang: str = DEFAULT_TERM_LANG):
+        """ Set the description of a language. A None description removes it. """
+        self.descriptions[lang] = description or None
+
+    def add_alias(self, alias: str, lang: str = DEFAULT_TERM_LANG):
+        """ Add an alias to the entity. """
+        if (lang, alias) in self.removed_aliases:
+            self.removed_aliases.remove((lang, alias))
+        aliases = self.aliases.setdefault(lang, [])
+        if alias not in aliases:
+            aliases.append(alias)
+
+    def remove_alias(self, alias: str, lang: str = DEFAULT_TERM_LANG):
+        """ Remove an alias of the entity. """
+        aliases = self.aliases.get(lang, [])
+        if alias in aliases:
+            aliases.remove(alias)
+            if not aliases:
+                del self.aliases[lang]
+        elif not self.is_new and (lang, alias) not in self.removed_aliases:
+            self.removed_aliases.append((lang, alias))
+
+    def add_claim(self, claim: dict):
+        """ Add a claim, given as its JSON, unless the entity has an equal claim. """
+        mainsnak = claim['mainsnak']
+        prop_nr, value = mainsnak['property'], mainsnak.get('datavalue', {}).get('value')
+        # a removal of every claim of the property is kept, it also applies to the wikibase claims
+        self.removed_claims = [(removed_prop, removed_value) for removed_prop, removed_value in self.removed_claims
+                               if removed_value is None or not claim_matches(claim, removed_prop, removed_value)]
+        prop_claims = self.claims.setdefault(prop_nr, [])
+        if not any(claim_matches(curr, prop_nr, value) for curr in prop_claims):
+            prop_claims.append(claim)
+
+    def remove_claims(self, prop_nr: str, value=None):
+        """ Remove the claims of a property.
+
+        Parameters
+        ----------
+        prop_nr : str
+            Id of the property of the claims.
+        value : optional
+            Datavalue of the claims to be removed. If None, every claim of the property is removed.
+        """
+        prop_claims = [claim for claim in self.claims.get(prop_nr, []) if not claim_matches(claim, prop_nr, value)]
+        if prop_claims:
+            self.claims[prop_nr] = prop_claims
+        else:
+            self.claims.pop(prop_nr, None)
+        if not self.is_new:
+            self.removed_claims.append((prop_nr, value))
+
+    def to_json(self) -> dict:
+        """ Return the JSON of the entity, in the format of wbgetentities.
+
+        Returns
+        -------
+        dict
+            JSON with the id, type, terms and claims of the entity, and its datatype if
+            it is a property. Removed terms are left out.
+        """
+        entity_json = OrderedDict(id=self.id, type=self.etype)
+        if self.etype == 'property':
+            entity_json['datatype'] = self.datatype
+        entity_json['labels'] = _terms_json(self.labels)
+        entity_json['descriptions'] = _terms_json(self.descriptions)
+        entity_json['aliases'] = {lang: [{'language': lang, 'value': alias} for alias in aliases]
+                                  for lang, aliases in self.aliases.items()}
+        entity_json['claims'] = {prop_nr: list(claims) for prop_nr, claims in self.claims.items()}
+        return entity_json
+
+
+class EntityModel():
+    """ Entities changed by a synchronization, built in memory from its triples.
+
+    Entities whose uri is not in the uri factory are created in the model, with ids
+    allocated locally in the order they are needed, and get the same label and related
+    link claims as the entities created by the wikibase adapter. The ids of the model
+    are kept in its own maps and never assigned to the triple elements, which are
+    shared with the other triple stores of the run. The model can be shared by several
+    threads.
+
+    Parameters
+    ----------
+    factory_of_uris : :obj:`URIFactory`, optional
+        Factory where the ids of the existing entities are looked up. By default, an
+        empty :obj:`InMemoryURIFactory`, so the uri files of the working directory are
+        not read or written.
+    first_item_id : int
+        Numeric id of the first item created in the model.
+    first_property_id : int
+        Numeric id of the first property created in the model.
+    related_link_prop : str, optional
+        Id of the related link property. If None, the property is created in the model
+        the first time it is needed.
+    mappings_prop : str, optional
+        Id of the same as property. If None, the property is created in the model the
+        first time it is needed.
+    set_of_uris_for_asio : set
+        Uris whose entities also get a same as claim.
+    """
+
+    def __init__(self, factory_of_uris: URIFactory = None, first_item_id: int = 1, first_property_id: int = 1,
+                 related_link_prop: str = None, mappings_prop: str = None, set_of_uris_for_asio=frozenset()):
+        if first_item_id < 1 or first_property_id < 1:
+            raise InvalidArgumentError("The first ids of the new entities must be 1 or higher")
+        self.entities: Dict[str, ModelEntity] = OrderedDict()
+        # ids of the entities created in the model, by uri
+        self.allocated_ids: Dict[str, str] = OrderedDict()
+        # ids of the existing entities found in the uri factory, by uri
+        self.known_ids: Dict[str, str] = {}
+        self.uris_factory = factory_of_uris if factory_of_uris is not None else InMemoryURIFactory()
+        self._next_ids = {'item': first_item_id, 'property': first_property_id}
+        self._related_link_prop = related_link_prop
+        self._mappings_prop = mappings_prop
+        self._uri_set_for_sameas = set_of_uris_for_asio
+        self._literal_converter = LiteralBatchConverter()
+        self._lock = threading.RLock()
+
+    def prepare(self, triples: Iterable[TripleInfo]) -> None:
+        """ Convert in bulk the literals and look up the ids of the triples that are going to be applied. """
+        triples = list(triples)
+        self._literal_converter.convert(triple.object for triple in triples if triple.object.is_literal())
+        with self._lock:
+            uris = {element.uri for triple in triples for element in triple.content if not element.is_literal()}
+            uris = [uri for uri in uris if uri not in self.allocated_ids and uri not in self.known_ids]
+        found = self.uris_factory.get_uris(uris) if uris else {}
+        with self._lock:
+            self.known_ids.update(found)
+
+    def apply(self, triple: TripleInfo, added: bool = None) -> str:
+        """ Apply the addition or removal of a triple to the entity of its subject.
+
+        Parameters
+        ----------
+        triple : :obj:`TripleInfo`
+            Triple to be applied.
+        added : bool, optional
+            Whether the triple is added or removed. By default, the isAdded attribute
+            of the triple is used.
+
+        Returns
+        -------
+        str
+            Id of the entity of the subject.
+        """
+        with self._lock:
+            subject, predicate, objct = triple.content
+            entity = self.entity_of(self.id_of(subject, subject.wdi_proptype), subject.etype)
+            added = is_added(triple, added)
+            if WikibaseAdapter.is_wb_label(predicate):
+                entity.set_label(objct.content if added else None, get_lang_from_literal(objct))
+            elif WikibaseAdapter.is_wb_description(predicate):
+                entity.set_description(objct.content[:MAX_CHARACTERS_DESC] if added else None,
+                                       get_lang_from_literal(objct))
+            elif WikibaseAdapter.is_wb_alias(predicate):
+                if added:
+                    entity.add_alias(objct.content, get_lang_from_literal(objct))
+                else:
+                    entity.remove_alias(objct.content, get_lang_from_literal(objct))
+            elif added:
+                entity.add_claim(self._statement_of(predicate, objct).get_json_representation())
+            else:
+                self._remove_claims(entity, predicate, objct)
+            return entity.id
+
+    def entity_of(self, entity_id: str, etype: str = 'item') -> ModelEntity:
+        """ Return the entity of an id, adding it to the model as an existing entity if needed. """
+        with self._lock:
+            entity = self.entities.get(entity_id)
+            if entity is None:
+                entity = ModelEntity(entity_id, etype)
+                self.entities[entity_id] = entity
+            return entity
+
+    def id_of(self, element: NonLiteralElement, proptype: str = None) -> str:
+        """ Return the id of the entity of an uri, creating the entity in the model if needed.
+
+        Parameters
+        ----------
+        element : :obj:`URIElement` or :obj:`AnonymousElement`
+            Element of the uri.
+        proptype : str, optional
+            Datatype of the entity if it has to be created as a property.
+
+        Returns
+        -------
+        str
+            Id of the entity.
+        """
+        with self._lock:
+            entity_id = self.allocated_ids.get(element.uri) or self.known_ids.get(element.uri)
+            if entity_id is not None:
+                return entity_id
+            entity_id = self.uris_factory.get_uri(element)
+            if entity_id is not None:
+                self.known_ids[element.uri] = entity_id
+                return entity_id
+
+            entity = self.new_entity(element.etype, proptype)
+            label = try_infer_label_from(element)
+            if label is None:
+                logger.warning("Label for URI %s could not be inferred.", element)
+            else:
+                entity.set_label(label)
+            if is_same_as_activated(element, self._uri_set_for_sameas):
+                entity.add_claim(wdi_core.WDUrl(value=element.uri, prop_nr=self.mappings_prop)
+                                 .get_json_representation())
+            entity.add_claim(wdi_core.WDUrl(value=element.uri, prop_nr=self.related_link_prop)
+                             .get_json_representation())
+            self.allocated_ids[element.uri] = entity.id
+            return entity.id
+
+    def new_entity(self, etype: str = 'item', datatype: str = None) -> ModelEntity:
+        """ Create an entity in the model with the next free id of its type.
+
+        Parameters
+        ----------
+        etype : str
+            Type of the entity ('item' or 'property').
+        datatype : str, optional
+            Datatype of the entity if it is a property. By default, properties are strings.
+
+        Returns
+        -------
+        :obj:`ModelEntity`
+            New entity.
+        """
+        if etype not in ID_PREFIXES:
+            raise InvalidArgumentError(f"Invalid entity type {etype}, valid values are: {list(ID_PREFIXES)}")
+        with self._lock:
+            entity_id = f"{ID_PREFIXES[etype]}{self._next_ids[etype]}"
+            self._next_ids[etype] += 1
+            if etype == 'property':
+                datatype = datatype or wdi_core.WDString.DTYPE
+            entity = ModelEntity(entity_id, etype, datatype if etype == 'property' else None, is_new=True)
+            self.entities[entity_id] = entity
+            return entity
+
+    @property
+    def mappings_prop(self) -> str:
+        """ Id of the same as property, created in the model on first use if it was not given. """
+        with self._lock:
+            if self._mappings_prop is None:
+                self._mappings_prop = self._new_url_prop(MAPPINGS_PROP_LABEL, MAPPINGS_PROP_DESC)
+            return self._mappings_prop
+
+    @property
+    def related_link_prop(self) -> str:
+        """ Id of the related link property, created in the model on first use if it was not given. """
+        with self._lock:
+            if self._related_link_prop is None:
+                self._related_link_prop = self._new_url_prop(RELATED_LINK_LABEL, RELATED_LINK_DESC)
+            return self._related_link_prop
+
+    def new_entities(self) -> List[ModelEntity]:
+        """ Return the entities created in the model, in the order of their creation. """
+        with self._lock:
+            return [entity for entity in self.entities.values() if entity.is_new]
+
+    def changed_entities(self) -> List[ModelEntity]:
+        """ Return the existing entities changed in the model. """
+        with self._lock:
+            return [entity for entity in self.entities.values() if not entity.is_new and entity.has_changes]
+
+    def _new_url_prop(self, label: str, description: str) -> str:
+        prop = self.new_entity('property', wdi_core.WDUrl.DTYPE)
+        prop.set_label(label)
+        prop.set_description(description)
+        return prop.id
+
+    def _remove_claims(self, entity: ModelEntity, predicate: TripleElement, objct: TripleElement):
+        try:
+            value = self._statement_of(predicate, objct).get_json_representation()['mainsnak']['datavalue']['value']
+        except (ValueError, TypeError, KeyError):
+            logger.warning("Value %s could not be converted. Removing every claim of %s...", objct, predicate)
+            value = None
+        entity.remove_claims(self._property_id_of(predicate, objct), value)
+
+    def _statement_of(self, predicate: TripleElement, objct: TripleElement) -> wdi_core.WDBaseDataType:
+        object_id = self.id_of(objct, objct.wdi_proptype) if not objct.is_literal() else None
+        prop_nr = self._property_id_of(predicate, objct)
+        if objct.is_literal():
+            return self._literal_converter.to_wdi_datatype(objct, prop_nr=prop_nr)
+        return objct.wdi_class(value=object_id, prop_nr=prop_nr)
+
+    def _property_id_of(self, predicate: TripleElement, objct: TripleElement) -> str:
+        predicate.etype = 'property'
+        return self.id_of(predicate, objct.wdi_dtype)
+
+
+def _terms_json(terms: dict) -> dict:
+    return {lang: {'language': lang, 'value': value} for lang, value in terms.items() if value is not None}
@@ -0,0 +1,361 @@
+""" In-memory implementation of the mediawiki API actions used by the wikibase adapter.
+
+It is intended to measure and tune the throughput of the adapter without a real
+wikibase. A :obj:`FakeWikibase` can be used in-process through a
+:obj:`FakeWikibaseTransport`, or served over HTTP with `start_server`, which also
+answers the token and login requests of the wikidataintegrator login.
+
+Only the writes of an adapter with `direct_writes=True` go through these actions.
+The item engines of wikidataintegrator also run SPARQL queries, which the fake
+doesn't implement, so benchmarks with it only cover the `direct_writes` path.
+"""
+import copy
+import json
+import logging
+import threading
+import time
+import uuid
+
+from collections import Counter
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable
+from urllib.parse import parse_qsl, urlsplit
+
+from .transport import Transport
+
+logger = logging.getLogger(__name__)
+
+# token returned for every type of token, like the anonymous token of mediawiki
+FAKE_TOKEN = '+\\'
+# parts of an entity returned by wbgetentities for each value of props
+INFO_FIELDS = ('pageid', 'ns', 'title', 'lastrevid', 'modified')
+ENTITY_PARTS = ('labels', 'descriptions', 'aliases', 'claims', 'sitelinks', 'datatype')
+
+
+class FakeWikibase():
+    """ In-memory wikibase that implements wbsearchentities, wbgetentities and wbeditentity.
+
+    The tokens query and the login action are also answered, so clients can log in
+    with any user and password.
+
+    Edits with a base revision older than the last revision of the entity are rejected
+    with an edit conflict, and claims of unknown properties are rejected like in a
+    real wikibase.
+
+    Parameters
+    ----------
+    latency : float
+        Seconds added to the handling of each request.
+    sleep : callable
+        Function used to wait for the latency.
+    """
+
+    def __init__(self, latency: float = 0.0, sleep: Callable[[float], None] = time.sleep):
+        self.latency = latency
+        self.entities = {}
+        self.request_counts = Counter()
+        self._sleep = sleep
+        self._last_ids = {'item': 0, 'property': 0}
+        self._last_revision = 0
+        self._lock = threading.RLock()
+
+    def handle(self, params: dict) -> dict:
+        """ Handle a request to the API.
+
+        Parameters
+        ----------
+        params : dict
+            Query string or form data of the request.
+
+        Returns
+        -------
+        dict
+            JSON response of the API.
+        """
+        action = params.get('action')
+        with self._lock:
+            self.request_counts[action] += 1
+        if self.latency > 0:
+            self._sleep(self.latency)
+
+        handler = self._handlers.get(action)
+        if handler is None:
+            return _error('unknown_action', f'Unrecognized value for parameter "action": {action}.')
+        with self._lock:
+            return handler(self, params)
+
+    def _get_entities(self, params: dict) -> dict:
+        props = params.get('props')
+        props = set(props.split('|')) if props else None
+        entities = {}
+        for entity_id in params.get('ids', '').split('|'):
+            entity = self.entities.get(entity_id)
+            if entity is None:
+                entities[entity_id] = {'id': entity_id, 'missing': ''}
+            else:
+                entities[entity_id] = _select_props(entity, props)
+        return {'entities': entities, 'success': 1}
+
+    def _search_entities(self, params: dict) -> dict:
+        search = params.get('search', '').lower()
+        lang = params.get('language', 'en')
+        etype = params.get('type', 'item')
+        results = []
+        for entity in self.entities.values():
+            label = entity['labels'].get(lang, {}).get('value')
+            if entity['type'] != etype or label is None or not label.lower().startswith(search):
+                continue
+            result = {'id': entity['id'], 'label': label}
+            description = entity['descriptions'].get(lang, {}).get('value')
+            if description is not None:
+                result['description'] = description
+            results.append(result)
+        return {'search': results, 'success': 1}
+
+    def _edit_entity(self, params: dict) -> dict:
+        try:
+            data = json.loads(params.get('data', '{}'))
+        except ValueError:
+            return _error('invalid-json', 'Invalid JSON in data')
+
+        if 'new' in params:
+            etype = params['new']
+            if etype not in self._last_ids:
+                return _error('param-illegal', f'Unknown entity type {etype}')
+            if etype == 'property' and 'datatype' not in data:
+                return _error('param-illegal', 'No datatype given')
+            entity = _new_entity(None, etype)
+        else:
+            entity_id = params.get('id')
+            if entity_id not in self.entities:
+                return _error('no-such-entity', f'Could not find an entity with the ID "{entity_id}".')
+            baserevid = params.get('baserevid')
+            if baserevid is not None and int(baserevid) != self.entities[entity_id]['lastrevid']:
+                return _error('editconflict', 'Edit conflict.')
+            entity = copy.deepcopy(self.entities[entity_id])
+            if 'clear' in params:
+                entity = dict(_new_entity(entity_id, entity['type']), lastrevid=entity['lastrevid'])
+
+        _apply_terms(entity['labels'], data.get('labels', {}))
+        _apply_terms(entity['descriptions'], data.get('descriptions', {}))
+        _apply_aliases(entity['aliases'], data.get('aliases', {}))
+        if entity['type'] == 'property' and 'datatype' in data:
+            entity['datatype'] = data['datatype']
+
+        claims = data.get('claims', {})
+        claims = [claim for prop_claims in claims.values() for claim in prop_claims] \
+            if isinstance(claims, dict) else claims
+        for claim in claims:
+            prop_nr = claim.get('mainsnak', {}).get('property')
+            if 'remove' not in claim and prop_nr not in self.entities:
+                return {'error': {
+                    'code': 'modification-failed',
+                    'info': f'Property {prop_nr} not found',
+                    'messages': [{'name': 'wikibase-validator-no-such-property', 'parameters': [prop_nr]}]
+                }}
+
+        if entity['id'] is None:
+            self._last_ids[entity['type']] += 1
+            entity['id'] = ('P' if entity['type'] == 'property' else 'Q') + str(self._last_ids[entity['type']])
+        _apply_claims(entity, claims)
+
+        self._last_revision += 1
+        entity['lastrevid'] = self._last_revision
+        entity['modified'] = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+        self.entities[entity['id']] = entity
+        return {'entity': copy.deepcopy(entity), 'success': 1}
+
+    def _query(self, params: dict) -> dict:
+        if params.get('meta') != 'tokens':
+            return _error('badvalue', 'Only the tokens query is supported.')
+        token_types = params.get('type', 'csrf').split('|')
+        return {'batchcomplete': '', 'query': {'tokens': {f'{token_type}token': FAKE_TOKEN
+                                                          for token_type in token_types}}}
+
+    def _login(self, params: dict) -> dict:
+        if params.get('lgtoken') != FAKE_TOKEN:
+            return {'login': {'result': 'NeedToken', 'token': FAKE_TOKEN}}
+        return {'login': {'result': 'Success', 'lguserid': 1, 'lgusername': params.get('lgname', '')}}
+
+    _handlers = {
+        'login': _login,
+        'query': _query,
+        'wbeditentity': _edit_entity,
+        'wbgetentities': _get_entities,
+        'wbsearchentities': _search_entities
+    }
+
+
+class FakeLogin():
+    """ Login of a :obj:`FakeWikibase`, compatible with the logins of wikidataintegrator. """
+
+    def __init__(self, wikibase: FakeWikibase):
+        self.wikibase = wikibase
+
+    def get_edit_token(self) -> str:
+        return FAKE_TOKEN
+
+    def get_session(self) -> 'FakeSession':
+        return FakeSession(self.wikibase)
+
+
+class FakeSession():
+    """ Requests session that sends every request to a :obj:`FakeWikibase`. """
+
+    def __init__(self, wikibase: FakeWikibase):
+        self.wikibase = wikibase
+
+    def request(self, method, url, params=None, data=None, **kwargs) -> 'FakeResponse':
+        request_params = dict(parse_qsl(urlsplit(url).query))
+        request_params.update(params or {})
+        request_params.update(data or {})
+        return FakeResponse(self.wikibase.handle(request_params))
+
+
+class FakeResponse():
+    def __init__(self, json_data: dict):
+        self.status_code = 200
+        self.headers = {}
+        self._json_data = json_data
+        self.text = json.dumps(json_data)
+
+    def json(self) -> dict:
+        return self._json_data
+
+    def raise_for_status(self):
+        pass
+
+
+class FakeWikibaseTransport(Transport):
+    """ Transport that sends every request of the adapter to a :obj:`FakeWikibase`.
+
+    Parameters
+    ----------
+    wikibase : :obj:`FakeWikibase`
+        Wikibase that handles the requests.
+    """
+
+    def __init__(self, wikibase: FakeWikibase):
+        self.wikibase = wikibase
+
+    def get(self, url: str) -> dict:
+        return self.wikibase.handle(dict(parse_qsl(urlsplit(url).query)))
+
+    def login(self, username: str, password: str, mediawiki_api_url: str) -> FakeLogin:
+        return FakeLogin(self.wikibase)
+
+    def post(self, url: str, data: dict, login) -> dict:
+        return self.wikibase.handle(dict(data))
+
+
+def start_server(wikibase: FakeWikibase, host: str = 'localhost', port: int = 0) -> ThreadingHTTPServer:
+    """ Serve the API of a fake wikibase over HTTP in a background thread.
+
+    Parameters
+    ----------
+    wikibase : :obj:`FakeWikibase`
+        Wikibase that handles the requests.
+    host : str
+        Host of the server.
+    port : int
+        Port of the server. If 0, a free port is used.
+
+    Returns
+    -------
+    :obj:`http.server.ThreadingHTTPServer`
+        Running server. The API is available at any path of `server.server_address`,
+        and the server is stopped with `server.shutdown()`.
+    """
+    class WikibaseRequestHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            self._respond(dict(parse_qsl(urlsplit(self.path).query)))
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length', 0))
+            params = dict(parse_qsl(urlsplit(self.path).query))
+            params.update(parse_qsl(self.rfile.read(length).decode('utf-8')))
+            self._respond(params)
+
+        def _respond(self, params):
+            body = json.dumps(wikibase.handle(params)).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            logger.debug(format, *args)
+
+    server = ThreadingHTTPServer((host, port), WikibaseRequestHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def _apply_aliases(aliases: dict, changes):
+    if isinstance(changes, dict):
+        changes = [alias for lang_aliases in changes.values() for alias in lang_aliases]
+    replaced = set()
+    for change in changes:
+        lang, value = change['language'], change['value']
+        values = aliases.setdefault(lang, [])
+        if 'remove' in change:
+            values[:] = [alias for alias in values if alias['value'] != value]
+            continue
+        if 'add' not in change and lang not in replaced:
+            # aliases given without add or remove replace the aliases of the language
+            values.clear()
+            replaced.add(lang)
+        if all(alias['value'] != value for alias in values):
+            values.append({'language': lang, 'value': value})
+    for lang in [lang for lang, values in aliases.items() if not values]:
+        del aliases[lang]
+
+
+def _apply_claims(entity: dict, claims: list):
+    entity_claims = entity['claims']
+    for claim in claims:
+        if 'remove' in claim:
+            for prop_nr, prop_claims in list(entity_claims.items()):
+                entity_claims[prop_nr] = [curr for curr in prop_claims if curr['id'] != claim['id']]
+                if not entity_claims[prop_nr]:
+                    del entity_claims[prop_nr]
+            continue
+
+        claim = copy.deepcopy(claim)
+        prop_claims = entity_claims.setdefault(claim['mainsnak']['property'], [])
+        positions = [i for i, curr in enumerate(prop_claims) if curr['id'] == claim.get('id')]
+        if positions:
+            prop_claims[positions[0]] = claim
+        else:
+            claim['id'] = f"{entity['id']}${uuid.uuid4()}"
+            prop_claims.append(claim)
+
+
+def _apply_terms(terms: dict, changes):
+    if isinstance(changes, list):
+        changes = {change['language']: change for change in changes}
+    for lang, change in changes.items():
+        if 'remove' in change or not change.get('value'):
+            terms.pop(lang, None)
+        else:
+            terms[lang] = {'language': lang, 'value': change['value']}
+
+
+def _error(code: str, info: str) -> dict:
+    return {'error': {'code': code, 'info': info}}
+
+
+def _new_entity(entity_id, etype: str) -> dict:
+    return {'id': entity_id, 'type': etype, 'labels': {}, 'descriptions': {},
+            'aliases': {}, 'claims': {}, 'sitelinks': {}}
+
+
+def _select_props(entity: dict, props) -> dict:
+    entity = copy.deepcopy(entity)
+    if props is None:
+        return entity
+    return {key: value for key, value in entity.items()
+            if key in ('id', 'type') or (key in INFO_FIELDS and 'info' in props) or
+            (key in ENTITY_PARTS and key in props)}
@@ -0,0 +1,99 @@
+import logging
+
+from collections import Counter
+from typing import Dict, List, Optional
+
+from . import TripleElement, TripleInfo, TripleStoreManager, ModificationResult
+from .entity_model import EntityModel, ModelEntity
+from .metrics import MetricsHook, measure
+from .wikibase_adapter import is_added
+from ..external.uri_factory import InMemoryURIFactory
+
+logger = logging.getLogger(__name__)
+
+
+class InMemoryTripleStore(TripleStoreManager):
+    """ Triple store manager that applies the triples to wikibase entities held in memory.
+
+    Triples are applied like in a wikibase: each subject is an entity with labels,
+    descriptions and aliases per language and claims per property, and new uris get
+    an entity with the same label and related link as in the wikibase adapter. As it
+    makes no I/O, it can be used to benchmark the synchronization separately from the
+    network and to check the final state of a plan.
+
+    The number of times each operation is called is kept in `operation_counts`, along
+    with the number of triples added and removed.
+
+    Parameters
+    ----------
+    model : :obj:`EntityModel`, optional
+        Model where the triples are applied. By default, a new model whose uris are
+        kept in an :obj:`InMemoryURIFactory`.
+    metrics : :obj:`MetricsHook`, optional
+        Hook where every operation is recorded with its latency.
+    """
+
+    def __init__(self, model: EntityModel = None, metrics: MetricsHook = None):
+        self.model = model if model is not None else EntityModel(InMemoryURIFactory())
+        self.metrics = metrics
+        self.operation_counts = Counter()
+
+    def batch_update(self, subject: TripleElement, triples: List[TripleInfo]) -> ModificationResult:
+        """ Apply the changes of a set of triples with a given subject.
+
+        Returns
+        -------
+        :obj:`ModificationResult`
+            Result of the operation, with the id of the subject.
+        """
+        return self._apply('batch_update', triples)
+
+    def create_triple(self, triple_info: TripleInfo) -> ModificationResult:
+        """ Apply the addition of a triple.
+
+        Returns
+        -------
+        :obj:`ModificationResult`
+            Result of the operation, with the id of the subject.
+        """
+        return self._apply('create_triple', [triple_info], added=True)
+
+    def remove_triple(self, triple_info: TripleInfo) -> ModificationResult:
+        """ Apply the removal of a triple.
+
+        Returns
+        -------
+        :obj:`ModificationResult`
+            Result of the operation, with the id of the subject.
+        """
+        return self._apply('remove_triple', [triple_info], added=False)
+
+    def prepare(self, triples: List[TripleInfo]) -> None:
+        """ Convert in bulk the literals of the triples that are going to be applied. """
+        self.operation_counts['prepare'] += 1
+        with measure(self.metrics, 'prepare'):
+            self.model.prepare(triples)
+
+    def entity(self, uri: str) -> Optional[ModelEntity]:
+        """ Return the entity of an uri, or None if no triple of the uri has been applied. """
+        entity_id = self.model.allocated_ids.get(uri) or \
+            self.model.uris_factory.lookup(uri)
+        return self.model.entities.get(entity_id) if entity_id is not None else None
+
+    def entities_json(self) -> Dict[str, dict]:
+        """ Return the JSON of every entity of the store, by id. """
+        return {entity_id: entity.to_json() for entity_id, entity in list(self.model.entities.items())}
+
+    def _apply(self, operation: str, triples: List[TripleInfo], added: bool = None) -> ModificationResult:
+        self.operation_counts[operation] += 1
+        entity_id = None
+        try:
+            with measure(self.metrics, operation):
+                for triple in triples:
+                    entity_id = self.model.apply(triple, added)
+                    self.operation_counts['triples_added' if is_added(triple, added) else 'triples_removed'] += 1
+        except (ValueError, TypeError, NotImplementedError) as err:
+            logger.warning("Triple %s could not be applied: %s", triple, err)
+            self.operation_counts['failures'] += 1
+            return ModificationResult(successful=False, message=str(err))
+        return ModificationResult(successful=True, res=entity_id)
@@ -0,0 +1,132 @@
+import threading
+import time
+
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Sequence
+
+# upper bounds, in seconds, of the buckets of the latency histograms
+DEFAULT_LATENCY_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float('inf'))
+
+# hooks where the calls of each thread are also recorded, see collect_calls
+_collectors = threading.local()
+
+
+class MetricsHook(ABC):
+    """ Receives a record of each call made by a triple store to its backend. """
+
+    @abstractmethod
+    def record(self, action: str, latency: float, payload_size: int, successful: bool) -> None:
+        """ Record a call.
+
+        Parameters
+        ----------
+        action : str
+            Action of the call, like the mediawiki API action.
+        latency : float
+            Seconds taken by the call.
+        payload_size : int
+            Size in bytes of the data sent by the call.
+        successful : bool
+            Whether the call succeeded.
+        """
+
+    def summary(self) -> Dict[str, dict]:
+        """ Return the metrics recorded so far for each action.
+
+        Hooks that export the metrics elsewhere can keep the default, which returns
+        an empty summary.
+        """
+        return {}
+
+
+class InMemoryMetrics(MetricsHook):
+    """ Keeps counters and latency histograms of the calls of each action in memory.
+
+    Parameters
+    ----------
+    buckets : sequence of float
+        Upper bounds, in seconds, of the buckets of the latency histograms.
+    """
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        if not self.buckets or self.buckets[-1] != float('inf'):
+            self.buckets += (float('inf'),)
+        self._lock = threading.Lock()
+        self.reset()
+
+    def record(self, action: str, latency: float, payload_size: int, successful: bool) -> None:
+        with self._lock:
+            stats = self._actions[action]
+            stats['calls'] += 1
+            stats['failures'] += 0 if successful else 1
+            stats['latency'] += latency
+            stats['payload_bytes'] += payload_size
+            stats['latency_histogram'][bisect_left(self.buckets, latency)] += 1
+
+    def reset(self) -> None:
+        """ Remove every recorded call. """
+        with self._lock:
+            self._actions = defaultdict(lambda: {'calls': 0, 'failures': 0, 'latency': 0.0, 'payload_bytes': 0,
+                                                 'latency_histogram': [0] * len(self.buckets)})
+
+    def summary(self) -> Dict[str, dict]:
+        """ Return the metrics recorded for each action.
+
+        Returns
+        -------
+        dict
+            Dictionary from each action to its number of calls and failures, total latency
+            and payload bytes, and its latency histogram as a dictionary from the upper
+            bound of each bucket to the number of calls in it.
+        """
+        with self._lock:
+            return {action: dict(stats, latency_histogram=dict(zip(self.buckets, stats['latency_histogram'])))
+                    for action, stats in self._actions.items()}
+
+
+@contextmanager
+def measure(metrics: Optional[MetricsHook], action: str, payload_size: int = 0):
+    """ Record the latency of the enclosed block as a call, failed if the block raises. """
+    if metrics is None:
+        yield
+        return
+    start = time.perf_counter()
+    successful = False
+    try:
+        yield
+        successful = True
+    finally:
+        record_call(metrics, action, time.perf_counter() - start, payload_size, successful)
+
+
+def record_call(metrics: MetricsHook, action: str, latency: float, payload_size: int, successful: bool) -> None:
+    """ Record a call in a hook and in the collectors of the current thread. """
+    metrics.record(action, latency, payload_size, successful)
+    for collector in getattr(_collectors, 'stack', ()):
+        collector.record(action, latency, payload_size, successful)
+
+
+@contextmanager
+def collect_calls(buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS) -> Iterator[InMemoryMetrics]:
+    """ Collect the calls recorded by the current thread while the block runs.
+
+    Unlike the difference of two summaries of a hook, the calls recorded by other
+    threads using the same hook are left out.
+
+    Yields
+    ------
+    :obj:`InMemoryMetrics`
+        Metrics with the calls recorded by the block.
+    """
+    collector = InMemoryMetrics(buckets)
+    stack = _collectors.__dict__.setdefault('stack', [])
+    stack.append(collector)
+    try:
+        yield collector
+    finally:
+        stack.remove(collector)
+
@@ -0,0 +1,202 @@
+import logging
+import threading
+
+from typing import List
+
+import requests
+
+from requests.adapters import HTTPAdapter
+from rdflib.term import Literal, URIRef
+
+from . import TripleElement, TripleInfo, TripleStoreManager, ModificationResult
+from .metrics import MetricsHook, measure
+from ..util.error import InvalidArgumentError
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_PAYLOAD_BYTES = 1 << 20
+DEFAULT_POOL_SIZE = 4
+DEFAULT_TIMEOUT = 60.0
+SPARQL_UPDATE_CONTENT_TYPE = 'application/sparql-update; charset=utf-8'
+# bytes of the header and separators of an INSERT DATA or DELETE DATA block
+BLOCK_OVERHEAD_BYTES = len("DELETE DATA {\n} ;\n")
+
+
+class SparqlUpdateManager(TripleStoreManager):
+    """ Triple store manager that writes the triples to a SPARQL 1.1 Update endpoint.
+
+    Changes are buffered and sent in large requests, each one made of consecutive
+    INSERT DATA and DELETE DATA blocks that keep the order of the changes, up to a
+    maximum payload size. Requests are sent over a pooled HTTP session. Blank nodes
+    are written as their skolem IRIs, so the same blank node can be removed later.
+
+    The buffer is flushed when the next change would exceed the payload size, when
+    `flush` is called, or when the manager is used as a context manager and the
+    context is exited.
+
+    Parameters
+    ----------
+    update_endpoint : str
+        Url of the SPARQL Update endpoint.
+    max_payload_bytes : int
+        Maximum size in bytes of the body of each request. Single triples bigger
+        than it are sent in a request of their own.
+    session : :obj:`requests.Session`, optional
+        Session used to send the requests. By default, a new session with a pool of
+        `pool_size` connections is used.
+    pool_size : int
+        Number of pooled connections of the default session.
+    auth : optional
+        Authentication of the requests, in any format accepted by requests.
+    timeout : float
+        Seconds to wait for each response.
+    metrics : :obj:`MetricsHook`, optional
+        Hook where every request is recorded as a 'sparql-update' call.
+    """
+
+    def __init__(self, update_endpoint: str, max_payload_bytes: int = DEFAULT_MAX_PAYLOAD_BYTES,
+                 session: requests.Session = None, pool_size: int = DEFAULT_POOL_SIZE, auth=None,
+                 timeout: float = DEFAULT_TIMEOUT, metrics: MetricsHook = None):
+        if max_payload_bytes < 1:
+            raise InvalidArgumentError("The maximum payload size must be 1 or higher")
+        self.update_endpoint = update_endpoint
+        self.max_payload_bytes = max_payload_bytes
+        self.timeout = timeout
+        self.metrics = metrics
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+        if auth is not None:
+            session.auth = auth
+        self._session = session
+        self._lock = threading.RLock()
+        self._reset()
+
+    def batch_update(self, subject: TripleElement, triples: List[TripleInfo]) -> ModificationResult:
+        """ Buffer the changes of a set of triples with a given subject.
+
+        Returns
+        -------
+        :obj:`ModificationResult`
+            Result of the flush triggered by the changes, if any, or a successful result.
+        """
+        return self._enqueue([(triple, triple.isAdded) for triple in triples])
+
+    def create_triple(self, triple_info: TripleInfo) -> ModificationResult:
+        """ Buffer the addition of a triple.
+
+        Returns
+        -------
+        :obj:`ModificationResult`
+            Result of the flush triggered by the change, if any, or a successful result.
+        """
+        return self._enqueue([(triple_info, True)])
+
+    def remove_triple(self, triple_info: TripleInfo) -> ModificationResult:
+        """ Buffer the removal of a triple.
+
+        Returns
+        -------
+        :obj:`ModificationResult`
+            Result of the flush triggered by the change, if any, or a successful result.
+        """
+        return self._enqueue([(triple_info, False)])
+
+    def flush(self) -> List[ModificationResult]:
+        """ Send the buffered changes to the endpoint.
+
+        Returns
+        -------
+        list of :obj:`ModificationResult`
+            Result of each request sent.
+        """
+        with self._lock:
+            if not self._blocks:
+                return []
+            update = to_sparql_update(self._blocks)
+            num_triples = self._pending_count
+            self._reset()
+            return [self._send(update, num_triples)]
+
+    def _enqueue(self, changes) -> ModificationResult:
+        results = []
+        with self._lock:
+            for triple, added in changes:
+                statement = to_ntriples_statement(triple)
+                size = len(statement.encode('utf-8')) + 1
+                if self._pending_bytes + size + self._block_overhead(added) > self.max_payload_bytes:
+                    results.extend(self.flush())
+                if not self._blocks or self._blocks[-1][0] != added:
+                    self._pending_bytes += BLOCK_OVERHEAD_BYTES
+                    self._blocks.append((added, []))
+                self._blocks[-1][1].append(statement)
+                self._pending_bytes += size
+                self._pending_count += 1
+        failed = [res for res in results if not res.successful]
+        if failed:
+            return failed[0]
+        return ModificationResult(successful=True, message="Change buffered")
+
+    def _block_overhead(self, added: bool) -> int:
+        return 0 if self._blocks and self._blocks[-1][0] == added else BLOCK_OVERHEAD_BYTES
+
+    def _reset(self):
+        self._blocks = []
+        self._pending_bytes = 0
+        self._pending_count = 0
+
+    def _send(self, update: str, num_triples: int) -> ModificationResult:
+        body = update.encode('utf-8')
+        logger.debug("Sending %d changes (%d bytes) to %s", num_triples, len(body), self.update_endpoint)
+        try:
+            with measure(self.metrics, 'sparql-update', len(body)):
+                response = self._session.post(self.update_endpoint, data=body, timeout=self.timeout,
+                                              headers={'Content-Type': SPARQL_UPDATE_CONTENT_TYPE})
+                response.raise_for_status()
+        except requests.RequestException as err:
+            logger.warning("Error sending %d changes to %s: %s", num_triples, self.update_endpoint, err)
+            return ModificationResult(successful=False, message=str(err))
+        return ModificationResult(successful=True, res=num_triples)
+
+    def close(self):
+        """ Flush the buffered changes and close the session. """
+        self.flush()
+        self._session.close()
+
+    def __len__(self):
+        return self._pending_count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def to_ntriples_statement(triple: TripleInfo) -> str:
+    """ Return a triple in the N-Triples syntax used by the data blocks of SPARQL Update. """
+    return ' '.join(to_n3(element) for element in triple.content) + ' .'
+
+
+def to_n3(element: TripleElement) -> str:
+    """ Return the N3 representation of an element, with blank nodes as their skolem IRIs. """
+    if element.is_literal():
+        # the lexical form of the source is kept, so the statements of ill-typed or
+        # non canonical literals, like "01" for an integer, match the stored ones
+        content = element.lexical_form if element.lexical_form is not None else element.content
+        return Literal(content, lang=element.lang, datatype=element.datatype).n3()
+    return URIRef(element.uri).n3()
+
+
+def to_sparql_update(blocks) -> str:
+    """ Return a SPARQL Update request with a data block for each group of consecutive changes.
+
+    Parameters
+    ----------
+    blocks : list of tuple
+        Pairs of whether the statements are added and their N-Triples statements.
+    """
+    return ' ;\n'.join(f"{'INSERT' if added else 'DELETE'} DATA {{\n" + '\n'.join(statements) + '\n}'
+                       for added, statements in blocks)
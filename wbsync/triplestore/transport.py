@@ -0,0 +1,158 @@
+import json
+import time
+
+from abc import ABC, abstractmethod
+from typing import Callable
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+import requests
+
+from wikidataintegrator import wdi_core, wdi_login
+
+from .metrics import MetricsHook, measure, record_call
+
+# responses after which the calls of wikidataintegrator are retried
+RETRIED_STATUS_CODES = (503,)
+RETRIED_ERROR_CODES = ('maxlag', 'readonly')
+RETRIED_ERROR_MESSAGES = ('actionthrottledtext',)
+
+
+class Transport(ABC):
+    """ Channel used by the wikibase adapter to call the mediawiki API.
+
+    Transports let the adapter be run against other implementations of the API, like
+    the in-memory wikibase of :mod:`wbsync.triplestore.fake_wikibase`.
+    """
+
+    @abstractmethod
+    def get(self, url: str) -> dict:
+        """ Send a GET request to the mediawiki API.
+
+        Parameters
+        ----------
+        url : str
+            Full url of the request, including its query string.
+
+        Returns
+        -------
+        dict
+            JSON response of the API.
+        """
+
+    @abstractmethod
+    def login(self, username: str, password: str, mediawiki_api_url: str):
+        """ Log in the mediawiki API.
+
+        Returns
+        -------
+        :obj:`wikidataintegrator.wdi_login.WDLogin`
+            Login whose session and edit tokens are used by the writes.
+        """
+
+    @abstractmethod
+    def post(self, url: str, data: dict, login) -> dict:
+        """ Send a POST request to the mediawiki API with the session of a login.
+
+        Parameters
+        ----------
+        url : str
+            Url of the mediawiki API.
+        data : dict
+            Form data of the request.
+        login : :obj:`wikidataintegrator.wdi_login.WDLogin`
+            Login returned by this transport.
+
+        Returns
+        -------
+        dict
+            JSON response of the API.
+        """
+
+
+class RequestsTransport(Transport):
+    """ Transport that calls the mediawiki API over HTTP. """
+
+    def get(self, url: str) -> dict:
+        return json.loads(requests.get(url).text)
+
+    def login(self, username: str, password: str, mediawiki_api_url: str):
+        return wdi_login.WDLogin(username, password, mediawiki_api_url)
+
+    def post(self, url: str, data: dict, login) -> dict:
+        return wdi_core.WDItemEngine.mediawiki_api_call('POST', url, session=login.get_session(), data=data)
+
+
+class InstrumentedTransport(Transport):
+    """ Transport that records every call of another transport in a metrics hook.
+
+    Calls are recorded with their mediawiki API action, and are successful if they
+    don't raise and their response has no error. The attempts retried by
+    wikidataintegrator through the session of the login, like the ones rejected by
+    maxlag or rate limits, are recorded as failed calls too. Attempts that fail to
+    connect are not seen, since they get no response.
+
+    Parameters
+    ----------
+    transport : :obj:`Transport`
+        Transport that makes the calls.
+    metrics : :obj:`MetricsHook`
+        Hook where the calls are recorded.
+    """
+
+    def __init__(self, transport: Transport, metrics: MetricsHook):
+        self.transport = transport
+        self.metrics = metrics
+
+    def get(self, url: str) -> dict:
+        action = dict(parse_qsl(urlsplit(url).query)).get('action')
+        return self._call(action, len(url.encode('utf-8')), lambda: self.transport.get(url))
+
+    def login(self, username: str, password: str, mediawiki_api_url: str):
+        with measure(self.metrics, 'login'):
+            login = self.transport.login(username, password, mediawiki_api_url)
+        session = login.get_session() if hasattr(login, 'get_session') else None
+        if isinstance(session, requests.Session):
+            session.hooks['response'].append(self._record_retried_attempt)
+        return login
+
+    def post(self, url: str, data: dict, login) -> dict:
+        return self._call(data.get('action'), len(urlencode(data).encode('utf-8')),
+                          lambda: self.transport.post(url, data, login))
+
+    def _call(self, action: str, payload_size: int, call: Callable[[], dict]) -> dict:
+        start = time.perf_counter()
+        successful = False
+        try:
+            response = call()
+            successful = 'error' not in response
+            return response
+        finally:
+            record_call(self.metrics, action, time.perf_counter() - start, payload_size, successful)
+
+    def _record_retried_attempt(self, response: requests.Response, *args, **kwargs):
+        # the last attempt of a call is recorded by the caller, as the result of the call
+        if not is_retried(response):
+            return
+        request = response.request
+        body = request.body or ''
+        if isinstance(body, bytes):
+            body = body.decode('utf-8', 'replace')
+        params = dict(parse_qsl(urlsplit(request.url).query))
+        params.update(parse_qsl(body))
+        record_call(self.metrics, params.get('action'), response.elapsed.total_seconds(),
+                    len(body.encode('utf-8')), False)
+
+
+def is_retried(response: requests.Response) -> bool:
+    """ Return whether wikidataintegrator retries a call after getting the given response. """
+    if response.status_code in RETRIED_STATUS_CODES:
+        return True
+    try:
+        data = response.json()
+    except ValueError:
+        return False
+    error = data.get('error') if isinstance(data, dict) else None
+    if not isinstance(error, dict):
+        return False
+    messages = {message.get('name') for message in error.get('messages', [])}
+    return error.get('code') in RETRIED_ERROR_CODES or any(name in messages for name in RETRIED_ERROR_MESSAGES)
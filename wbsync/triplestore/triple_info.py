@@ -9,7 +9,7 @@ from wikidataintegrator.wdi_core import WDBaseDataType, WDItemID, WDMonolingualT
 
 
 from ..util.error import InvalidArgumentError
-from ..util.mappings import datatype2wdidtype, datatype2wdiobject
+from ..util.mappings import datatype2wdiclass, datatype2wdidtype, datatype2wdiobject
 from ..util.uri_constants import ASIO_BASE
 
 logger = logging.getLogger(__name__)
@@ -22,13 +22,16 @@ class TripleElement(ABC):
     """
 
     @classmethod
-    def from_rdflib(cls, rdflib_element):
+    def from_rdflib(cls, rdflib_element, registry: 'ElementRegistry' = None):
         """ Create a TripleElement from a rdflib term.
 
         Parameters
         ----------
         rdflib_element : :obj:`rdflib.term`
             Rdflib element used to create the TripleElement.
+        registry : :obj:`ElementRegistry`, optional
+            If given, URIs and blank nodes are interned in the registry, so equal
+            terms return the same TripleElement instance.
 
         Returns
         -------
@@ -38,12 +41,14 @@ class TripleElement(ABC):
         elmnt_type = type(rdflib_element)
         res = None
         if elmnt_type == URIRef:
-            res = URIElement(str(rdflib_element))
+            res = URIElement(str(rdflib_element)) if registry is None \
+                else registry.uri_element(str(rdflib_element))
         elif elmnt_type == Literal:
             res = LiteralElement(rdflib_element.value, rdflib_element.datatype,
-                                 rdflib_element.language)
+                                 rdflib_element.language, lexical_form=str(rdflib_element))
         elif elmnt_type == BNode:
-            res = AnonymousElement(str(rdflib_element))
+            res = AnonymousElement(str(rdflib_element)) if registry is None \
+                else registry.anonymous_element(str(rdflib_element))
         return res
 
     @abstractmethod
@@ -212,6 +217,9 @@ class LiteralElement(TripleElement):
         URI of the xsd schema of the literal's datatype.
     lang : str
         If the literal is a language tagged string, language of it.
+    lexical_form : str, optional
+        Lexical form of the literal in the source, like "01" for an integer 1, if it
+        is known.
 
     Raises
     ------
@@ -219,20 +227,26 @@ class LiteralElement(TripleElement):
         If both the datatype and lang parameters are provided.
     """
 
-    def __init__(self, content, datatype=None, lang=None):
+    def __init__(self, content, datatype=None, lang=None, lexical_form=None):
         self.content = content
         if datatype and lang:
             raise InvalidArgumentError("Both datatype and language can't be set.")
         self.datatype = datatype
         self.lang = lang
+        self.lexical_form = lexical_form
 
     @property
     def wdi_class(self) -> Type[WDBaseDataType]:
         if self.lang:
             return WDMonolingualText
-        elif self.datatype:
+        elif str(self.datatype) in datatype2wdiclass:
+            return datatype2wdiclass[str(self.datatype)]
+        elif str(self.datatype) in datatype2wdiobject:
+            # datatypes whose conversion is not implemented yet, like booleans, fail here
+            # before a property of the wrong type is created
             return self._datatype_to_wdiobject(prop_nr=-1).__class__
         else:
+            # unsupported datatypes are converted to strings by _datatype_to_wdiobject
             return WDString
 
     @property
@@ -272,6 +286,45 @@ class LiteralElement(TripleElement):
         return ''.join(res)
 
 
+class ElementRegistry():
+    """ Registry of interned TripleElements for a single synchronization run.
+
+    Every occurrence of an URI (or blank node) in the run is represented by the
+    same element instance, so the wikibase id and etype resolved for it are shared
+    by all the triples where it appears.
+    """
+
+    def __init__(self):
+        self._uris = {}
+        self._anonymous = {}
+
+    def uri_element(self, uri: str) -> URIElement:
+        """ Return the interned URIElement of the given uri, creating it if needed. """
+        element = self._uris.get(uri)
+        if element is None:
+            element = URIElement(uri)
+            self._uris[uri] = element
+        return element
+
+    def anonymous_element(self, uid: str) -> AnonymousElement:
+        """ Return the interned AnonymousElement of the given uid, creating it if needed. """
+        element = self._anonymous.get(uid)
+        if element is None:
+            element = AnonymousElement(uid)
+            self._anonymous[uid] = element
+        return element
+
+    def __contains__(self, uri):
+        return uri in self._uris
+
+    def __iter__(self):
+        yield from self._uris.values()
+        yield from self._anonymous.values()
+
+    def __len__(self):
+        return len(self._uris) + len(self._anonymous)
+
+
 class TripleInfo():
     """ Encapsulate the elements of a semantic triple.
 
@@ -293,10 +346,10 @@ class TripleInfo():
         self.isAdded = isAdded
 
     @classmethod
-    def from_rdflib(cls, rdflib_triple, isAdded=True):
-        subject = TripleElement.from_rdflib(rdflib_triple[0])
-        predicate = TripleElement.from_rdflib(rdflib_triple[1])
-        objct = TripleElement.from_rdflib(rdflib_triple[2])
+    def from_rdflib(cls, rdflib_triple, isAdded=True, registry: ElementRegistry = None):
+        subject = TripleElement.from_rdflib(rdflib_triple[0], registry)
+        predicate = TripleElement.from_rdflib(rdflib_triple[1], registry)
+        objct = TripleElement.from_rdflib(rdflib_triple[2], registry)
         return TripleInfo(subject, predicate, objct, isAdded)
 
     @property
@@ -1,6 +1,8 @@
 from abc import ABC, abstractmethod
+from typing import List, Optional
 
 from . import TripleInfo
+from .metrics import MetricsHook
 
 class ModificationResult():
     def __init__(self, successful: bool, message: str = "", res=""):
@@ -15,6 +17,9 @@ class TripleStoreManager(ABC):
     adapter to allow the execution of SyncOperations on the triplestore.
     """
 
+    # hook where the triplestore records the calls made to its backend, if any
+    metrics: Optional[MetricsHook] = None
+
     @abstractmethod
     def create_triple(self, triple_info: TripleInfo) -> ModificationResult:
         """ Adds a new triple to the triplestore.
@@ -30,6 +35,26 @@ class TripleStoreManager(ABC):
             Result of the operation.
         """
 
+    def prepare(self, triples: List[TripleInfo]) -> None:
+        """ Prepare the triplestore before synchronizing a set of triples.
+
+        Triplestores can override this method to do in bulk, ahead of the execution
+        of the operations, the work needed by each individual triple. By default it
+        does nothing.
+
+        Parameters
+        ----------
+        triples : list of :obj:`TripleInfo`
+            Triples that are going to be synchronized.
+        """
+
+    def finish(self) -> None:
+        """ Release the state kept by the triplestore for the synchronization of a set of operations.
+
+        It is called after the last operation of a run, so triplestores can drop the
+        caches filled while preparing and executing it. By default it does nothing.
+        """
+
     @abstractmethod
     def remove_triple(self, triple_info: TripleInfo) -> ModificationResult:
         """ Remove a triple from the triplestore.
@@ -1,14 +1,24 @@
 import json
 import logging
-import requests
+import threading
 
-from typing import List, Union
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Tuple, Union
 
-from wikidataintegrator import wdi_core, wdi_login
+from wikidataintegrator import wdi_core
 
 from . import TripleInfo, TripleStoreManager, ModificationResult, \
     TripleElement, URIElement, AnonymousElement, LiteralElement
-from ..external.uri_factory import URIFactoryMock, URIFactory
+from .edit_entity_writer import EditEntityWriter, EntityEdit
+from .entity_cache import EntityCache
+from .metrics import MetricsHook, measure
+from .transport import InstrumentedTransport, RequestsTransport, Transport
+from ..external.bootstrap_cache import BootstrapCache
+from ..external.uri_factory import SQLiteURIFactory, URIFactory
+from ..util.error import EntityCreationError, InvalidArgumentError
+from ..util.literal_conversion import LiteralBatchConverter
 from ..util.uri_constants import RDFS_LABEL, RDFS_COMMENT, SCHEMA_NAME, \
     SCHEMA_DESCRIPTION, SKOS_ALTLABEL, SKOS_PREFLABEL
 
@@ -17,15 +27,35 @@ NonLiteralElement = Union[URIElement, AnonymousElement]
 logger = logging.getLogger(__name__)
 
 DEFAULT_LANG = 'es'
+ERR_CODE_EDIT_CONFLICT = 'editconflict'
 ERR_CODE_LANGUAGE = 'not-recognized-language'
+ERR_CODE_NO_SUCH_PROPERTY = 'no-such-property'
+ERR_MSG_NO_SUCH_PROPERTY = 'wikibase-validator-no-such-property'
 MAPPINGS_PROP_LABEL = "same as"
 MAPPINGS_PROP_DESC = "Mapping of an item to its original URI"
 MAX_CHARACTERS_DESC = 250
+MAX_ENTITIES_PER_REQUEST = 50
+DEFAULT_LOAD_WORKERS = 8
+DEFAULT_WARM_UP_PAGE_SIZE = 10000
 
 # related link to the original URI
 RELATED_LINK_LABEL = "related link"
 RELATED_LINK_DESC = "Link or Mapping of an item to its original URI"
 
+# entities with a related link, given the id of the related link property
+RELATED_LINKS_QUERY = """PREFIX wikibase: <http://wikiba.se/ontology#>
+SELECT ?entity ?uri WHERE {{
+  ?property wikibase:directClaim ?directClaim .
+  FILTER(STRENDS(STR(?property), "/{prop_id}"))
+  ?entity ?directClaim ?uri .
+}}
+ORDER BY ?entity ?uri
+LIMIT {limit} OFFSET {offset}"""
+
+# keys of the bootstrap properties in the bootstrap cache
+MAPPINGS_PROP_KEY = 'mappings_prop'
+RELATED_LINK_PROP_KEY = 'related_link_prop'
+
 class WikibaseAdapter(TripleStoreManager):
     """ Adapter to execute operations on a wikibase instance.
 
@@ -42,23 +72,78 @@ class WikibaseAdapter(TripleStoreManager):
 
     password : str
         Password of the account.
+
+    factory_of_uris : :obj:`URIFactory`, optional
+        Factory where the wikibase id of each synchronized URI is stored. By default,
+        ids are stored in a SQLite database of the working directory.
+
+    bootstrap_cache : :obj:`BootstrapCache`, optional
+        Cache of the ids of the mappings and related link properties. The properties
+        are looked up in the wikibase the first time they are needed if their ids are
+        not cached. By default, ids are cached in a file of the working directory.
+
+    direct_writes : bool
+        If True, entities are created and edited with minimal wbeditentity requests that
+        only contain the changes of each write, instead of through wikidataintegrator
+        item engines.
+
+    lightweight_term_edits : bool
+        If True, writes that only change labels, descriptions or aliases are sent as
+        minimal wbeditentity requests even if direct writes are disabled, so the claims
+        of the entity are neither fetched nor sent again.
+
+    transport : :obj:`Transport`, optional
+        Transport used to log in and to call the mediawiki API. By default, the API
+        is called over HTTP. Item engines are only used through the session of the
+        login, so a fully in-memory transport also requires direct writes.
+
+    metrics : :obj:`MetricsHook`, optional
+        Hook where every call to the wikibase is recorded with its action, latency,
+        payload size and result. Reads and writes of item engines are recorded as
+        wbgetentities and wbeditentity calls.
+
+    Notes
+    -----
+    An adapter can be shared by several threads, as long as its uri factory is thread
+    safe. Entities of uris that are not in the factory yet are created once, even if
+    several threads need them at the same time.
     """
 
     def __init__(self, mediawiki_api_url, sparql_endpoint_url, username, password, set_of_uris_for_asio=set(),
-                 factory_of_uris: URIFactory = URIFactoryMock()):
+                 factory_of_uris: URIFactory = None, bootstrap_cache: BootstrapCache = None,
+                 direct_writes: bool = False, lightweight_term_edits: bool = True,
+                 transport: Transport = None, metrics: MetricsHook = None):
         self.api_url = mediawiki_api_url
         self.sparql_url = sparql_endpoint_url
         self._local_item_engine = wdi_core.WDItemEngine. \
             wikibase_item_engine_factory(mediawiki_api_url, sparql_endpoint_url)
-        self._local_login = wdi_login.WDLogin(username, password, mediawiki_api_url)
-        self._mappings_prop = self._get_or_create_mappings_prop()
+        self.metrics = metrics
+        self._transport = transport if transport is not None else RequestsTransport()
+        if metrics is not None:
+            self._transport = InstrumentedTransport(self._transport, metrics)
+        self._local_login = self._transport.login(username, password, mediawiki_api_url)
         self._init_callbacks()
-        # added the related link to original URI
-        self._related_link_prop = self._get_or_create_related_link_prop()
+        # mappings and related link properties are resolved on first use
+        self._bootstrap_cache = bootstrap_cache if bootstrap_cache is not None else BootstrapCache()
+        self._bootstrap_lock = threading.Lock()
+        # number of times the ids of the bootstrap properties were found stale
+        self._bootstrap_invalidations = 0
+        self._mappings_prop = None
+        self._related_link_prop = None
         # for same As
         self._uri_set_for_sameas = set_of_uris_for_asio
         # Uris factory
-        self._uris_factory = factory_of_uris
+        self._uris_factory = factory_of_uris if factory_of_uris is not None else SQLiteURIFactory()
+        # locks of the uris being created, with the number of threads using each of them
+        self._creations_lock = threading.Lock()
+        self._creations = {}
+        # memoized conversions of the literals of the synchronized triples
+        self._literal_converter = LiteralBatchConverter()
+        # last known state of the entities touched in this run, cleared by finish
+        self._entity_cache = EntityCache()
+        self._edit_writer = EditEntityWriter(mediawiki_api_url, self._local_login, self._transport)
+        self._direct_writes = direct_writes
+        self._lightweight_term_edits = lightweight_term_edits
 
     def batch_update(self, subject: TripleElement, triples: List[TripleInfo]) -> ModificationResult:
         """ Update a set of triples with a given subject in a single transaction
@@ -77,14 +162,11 @@ class WikibaseAdapter(TripleStoreManager):
             ModificationResult object with the results of the operation.
         """
         logger.info(f"Batch update: {subject}")
-        subject.id = self._get_wb_id_of(subject, subject.wdi_proptype)
-        entity = self._local_item_engine(subject.id)
-        for triple in triples:
-            _, predicate, objct = triple.content
-            update_callbacks = self._create_callbacks if triple.isAdded else self._remove_callbacks
-            self._update_entity(entity, predicate, objct, update_callbacks)
-        return self._try_write(entity, entity_type=subject.etype,
-                               property_datatype=subject.wdi_proptype)
+        try:
+            subject.id = self._get_wb_id_of(subject, subject.wdi_proptype)
+            return self._write_entity(subject, triples)
+        except EntityCreationError as err:
+            return ModificationResult(successful=False, message=str(err))
 
     def create_triple(self, triple_info: TripleInfo) -> ModificationResult:
         """ Creates the given triple in the wikibase instance.
@@ -100,12 +182,183 @@ class WikibaseAdapter(TripleStoreManager):
             ModificationResult object with the results of the operation.
         """
         logger.info(f"Create triple: {triple_info}")
-        subject, predicate, objct = triple_info.content
-        subject.id = self._get_wb_id_of(subject, subject.wdi_proptype)
-        entity = self._local_item_engine(subject.id)
-        self._update_entity(entity, predicate, objct, self._create_callbacks)
-        return self._try_write(entity, entity_type=subject.etype,
-                               property_datatype=subject.wdi_proptype)
+        subject = triple_info.subject
+        try:
+            subject.id = self._get_wb_id_of(subject, subject.wdi_proptype)
+            return self._write_entity(subject, [triple_info], added=True)
+        except EntityCreationError as err:
+            return ModificationResult(successful=False, message=str(err))
+
+    def initial_load(self, triples: List[TripleInfo],
+                     max_workers: int = DEFAULT_LOAD_WORKERS) -> List[ModificationResult]:
+        """ Load a set of triples into the wikibase in two phases.
+
+        This mode is intended for the first synchronization of an ontology. In the first
+        phase, every entity referenced by the triples that does not exist yet is created
+        in parallel, in a single write with its labels, descriptions, aliases and related
+        link. In the second phase the statements of each subject are written in parallel,
+        with one edit per entity.
+
+        Parameters
+        ----------
+        triples: list of :obj:`TripleInfo`
+            Triples to be loaded into the wikibase.
+        max_workers: int
+            Maximum number of writes performed concurrently.
+
+        Returns
+        -------
+        list of :obj:`ModificationResult`
+            Results of the creation of each entity followed by the results of the edit
+            of each subject. An entity that fails doesn't stop the load, it gets a failed
+            result instead.
+        """
+        try:
+            return self._initial_load(triples, max_workers)
+        finally:
+            self.finish()
+
+    def _initial_load(self, triples: List[TripleInfo], max_workers: int) -> List[ModificationResult]:
+        self.prepare(triples)
+        new_entities, pending_triples = self._plan_initial_load(triples)
+        results = []
+        engines = {}
+        failed_uris = set()
+
+        logger.info("Initial load: creating %d entities", len(new_entities))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            creations = executor.map(self._try_create_planned_entity, new_entities.values())
+            for new_entity, (engine, result) in zip(new_entities.values(), creations):
+                results.append(result)
+                if not result.successful:
+                    failed_uris.add(new_entity.uri)
+                    continue
+                new_entity.set_id(result.result)
+                engines[result.result] = engine
+                self._uris_factory.post_uri(new_entity.elements[0], result.result) #factory
+
+        subject_to_triples = OrderedDict()
+        for triple in pending_triples:
+            if any(not element.is_literal() and element.uri in failed_uris for element in triple):
+                results.append(ModificationResult(successful=False,
+                                                  message=f"Entities of triple {triple} could not be created"))
+                continue
+            subject_to_triples.setdefault(triple.subject.uri, []).append(triple)
+
+        logger.info("Initial load: editing %d entities", len(subject_to_triples))
+        subjects, subjects_triples = [], []
+        for subject_triples in subject_to_triples.values():
+            subject = subject_triples[0].subject
+            try:
+                subject.id = self._get_wb_id_of(subject, subject.wdi_proptype)
+            except EntityCreationError as err:
+                results.append(ModificationResult(successful=False, message=str(err)))
+                continue
+            subjects.append(subject)
+            subjects_triples.append(subject_triples)
+        self.prefetch_entities(subject.id for subject in subjects if subject.id not in engines)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results.extend(executor.map(self._try_load_entity, subjects, subjects_triples,
+                                        [engines.get(subject.id) for subject in subjects]))
+        return results
+
+    def _try_create_planned_entity(self, new_entity: '_PlannedEntity') -> Tuple[wdi_core.WDItemEngine,
+                                                                                 ModificationResult]:
+        try:
+            return self._create_planned_entity(new_entity)
+        except Exception as err:
+            # a failed entity doesn't stop the load
+            logger.exception("Entity of %s could not be created", new_entity.uri)
+            return None, ModificationResult(successful=False, message=str(err))
+
+    def _try_load_entity(self, subject: TripleElement, triples: List[TripleInfo],
+                         entity: wdi_core.WDItemEngine = None) -> ModificationResult:
+        try:
+            return self._write_entity(subject, triples, entity)
+        except EntityCreationError as err:
+            return ModificationResult(successful=False, message=str(err))
+        except Exception as err:
+            # a failed entity doesn't stop the load
+            logger.exception("Entity %s could not be edited", subject.id)
+            return ModificationResult(successful=False, message=str(err))
+
+    def finish(self) -> None:
+        """ Forget the state of the entities read and written in this run.
+
+        The entities cached while synchronizing a set of operations may be edited by
+        others before the next run, so they are fetched again by it.
+        """
+        self._entity_cache.clear()
+
+    def prefetch_entities(self, entity_ids: Iterable[str]) -> None:
+        """ Fetch in bulk the given entities, so they are not fetched one by one when edited.
+
+        Entities are requested with wbgetentities in groups of up to 50 ids, and stored
+        in the entity cache of the adapter.
+
+        Parameters
+        ----------
+        entity_ids: iterable of str
+            Ids of the wikibase entities to be fetched.
+        """
+        pending_ids = [entity_id for entity_id in dict.fromkeys(entity_ids)
+                       if entity_id is not None and entity_id not in self._entity_cache]
+        for i in range(0, len(pending_ids), MAX_ENTITIES_PER_REQUEST):
+            ids = pending_ids[i:i + MAX_ENTITIES_PER_REQUEST]
+            query_res = self._transport.get(f"{self.api_url}?action=wbgetentities" +
+                                            f"&ids={'|'.join(ids)}&format=json")
+            for entity_id, entity_json in query_res.get('entities', {}).items():
+                if 'missing' not in entity_json:
+                    self._entity_cache.update(entity_id, entity_json)
+        logger.debug("Prefetched %d entities", len(pending_ids))
+
+    def prepare(self, triples: List[TripleInfo]) -> None:
+        """ Prepare the synchronization of a set of triples.
+
+        The typed literals of the triples are converted in batches, the ids of all
+        their uris are looked up at once in the uri factory and the subjects that
+        already exist in the wikibase are prefetched in bulk.
+
+        Parameters
+        ----------
+        triples: list of :obj:`TripleInfo`
+            Triples that are going to be synchronized.
+        """
+        self._literal_converter.convert(triple.object for triple in triples
+                                        if triple.object.is_literal())
+        self.resolve_ids(triples)
+        subjects = {id(triple.subject): triple.subject for triple in triples}.values()
+        self.prefetch_entities(subject.id for subject in subjects)
+
+    def resolve_ids(self, triples: List[TripleInfo]) -> int:
+        """ Set the wikibase ids of the uris of the given triples that are in the uri factory.
+
+        Every uri is looked up in a single call to the factory, so the ids are not
+        looked up one by one when the triples are synchronized.
+
+        Parameters
+        ----------
+        triples: list of :obj:`TripleInfo`
+            Triples whose subjects, predicates and objects are resolved.
+
+        Returns
+        -------
+        int
+            Number of elements whose id was set.
+        """
+        elements = {id(element): element for triple in triples for element in triple.content
+                    if not element.is_literal() and element.id is None}.values()
+        if not elements:
+            return 0
+        found = self._uris_factory.get_uris({element.uri for element in elements})
+        resolved = 0
+        for element in elements:
+            wb_uri = found.get(element.uri)
+            if wb_uri is not None:
+                element.id = wb_uri
+                resolved += 1
+        logger.debug("Resolved the ids of %d of %d elements", resolved, len(elements))
+        return resolved
 
     def remove_triple(self, triple_info: TripleInfo) -> ModificationResult:
         """ Removes the given triple from the wikibase instance.
@@ -121,12 +374,56 @@ class WikibaseAdapter(TripleStoreManager):
             ModificationResult object with the results of the operation.
         """
         logger.info(f"Remove triple: {triple_info}")
-        subject, predicate, objct = triple_info.content
-        subject.id = self._get_wb_id_of(subject, subject.wdi_proptype)
-        entity = self._local_item_engine(subject.id)
-        self._update_entity(entity, predicate, objct, self._remove_callbacks)
-        return self._try_write(entity, entity_type=subject.etype,
-                               property_datatype=subject.wdi_proptype)
+        subject = triple_info.subject
+        try:
+            subject.id = self._get_wb_id_of(subject, subject.wdi_proptype)
+            return self._write_entity(subject, [triple_info], added=False)
+        except EntityCreationError as err:
+            return ModificationResult(successful=False, message=str(err))
+
+    def warm_up_uri_factory(self, page_size: int = DEFAULT_WARM_UP_PAGE_SIZE) -> int:
+        """ Load into the URI factory the entities of the wikibase that have a related link.
+
+        The related links of every entity are fetched with a paginated SPARQL query, and
+        the URIs that the factory doesn't know yet are posted to it at once. This avoids
+        creating duplicated entities when the factory of the adapter is missing or stale.
+
+        Parameters
+        ----------
+        page_size: int
+            Number of results requested in each page of the SPARQL query.
+
+        Returns
+        -------
+        int
+            Number of URIs added to the factory.
+        """
+        if page_size < 1:
+            raise InvalidArgumentError(f"Page size must be positive, not {page_size}")
+        related_links = {}
+        offset = 0
+        while True:
+            query = RELATED_LINKS_QUERY.format(prop_id=self._related_link_prop, limit=page_size, offset=offset)
+            with measure(self.metrics, 'sparql', len(query.encode('utf-8'))):
+                query_res = wdi_core.WDItemEngine.execute_sparql_query(query, endpoint=self.sparql_url)
+            bindings = query_res['results']['bindings']
+            for binding in bindings:
+                uri = binding['uri']['value']
+                entity_id = binding['entity']['value'].rsplit('/', 1)[-1]
+                if related_links.setdefault(uri, entity_id) != entity_id:
+                    logger.warning("URI %s is linked to several entities (%s, %s). Using %s...",
+                                   uri, related_links[uri], entity_id, related_links[uri])
+            if len(bindings) < page_size:
+                break
+            offset += page_size
+
+        known_uris = self._uris_factory.get_uris(list(related_links))
+        missing_uris = {uri: entity_id for uri, entity_id in related_links.items() if uri not in known_uris}
+        if missing_uris:
+            self._uris_factory.post_uris(missing_uris)
+        logger.info("URI factory warm-up: %d related links found, %d URIs added",
+                    len(related_links), len(missing_uris))
+        return len(missing_uris)
 
     def _add_mappings_to_entity(self, entity: wdi_core.WDItemEngine, uri: str):
         same_as = wdi_core.WDUrl(value=uri, prop_nr=self._mappings_prop)
@@ -145,6 +442,55 @@ class WikibaseAdapter(TripleStoreManager):
 
     def _create_new_wb_item(self, uriref: NonLiteralElement,
                             proptype: str) -> ModificationResult:
+        if self._direct_writes:
+            return self._try_write_edit(self._new_entity_edit(uriref, uriref.etype, proptype))
+        entity = self._new_wb_item(uriref)
+        return self._try_write(entity, entity_type=uriref.etype,
+                               property_datatype=proptype)
+
+    def _create_url_prop(self, label: str, description: str) -> str:
+        if self._direct_writes:
+            edit = EntityEdit(entity_type='property', property_datatype='url')
+            edit.set_label(label, lang='en')
+            edit.set_description(description, lang='en')
+            return self._edit_writer.write(edit)['id']
+
+        prop = self._local_item_engine(new_item=True)
+        prop.set_label(label, lang='en')
+        prop.set_description(description, lang='en')
+        return prop.write(self._local_login, entity_type='property', property_datatype='url')
+
+    def _create_planned_entity(self, new_entity: '_PlannedEntity') -> Tuple[wdi_core.WDItemEngine,
+                                                                             ModificationResult]:
+        uriref = new_entity.elements[0]
+        if self._direct_writes:
+            edit = self._new_entity_edit(uriref, new_entity.etype, new_entity.proptype)
+            for triple in new_entity.term_triples:
+                self._update_entity(edit, triple.predicate, triple.object, self._edit_create_callbacks)
+            # phase 2 edits the new entity from the state returned by this write
+            return None, self._try_write_edit(edit)
+
+        entity = self._new_wb_item(uriref)
+        for triple in new_entity.term_triples:
+            self._update_entity(entity, triple.predicate, triple.object, self._create_callbacks)
+        result = self._try_write(entity, entity_type=new_entity.etype,
+                                 property_datatype=new_entity.proptype)
+        return entity, result
+
+    def _new_entity_edit(self, uriref: NonLiteralElement, etype: str, proptype: str) -> EntityEdit:
+        edit = EntityEdit(entity_type=etype, property_datatype=proptype)
+        label = try_infer_label_from(uriref)
+        if label is None:
+            logging.warning("Label for URI %s could not be inferred.", uriref)
+        else:
+            edit.set_label(label)
+
+        if is_same_as_activated(uriref, self._uri_set_for_sameas):
+            edit.add_claim(wdi_core.WDUrl(value=uriref.uri, prop_nr=self._mappings_prop))
+        edit.add_claim(wdi_core.WDUrl(value=uriref.uri, prop_nr=self._related_link_prop))
+        return edit
+
+    def _new_wb_item(self, uriref: NonLiteralElement) -> wdi_core.WDItemEngine:
         entity = self._local_item_engine(new_item=True)
         label = try_infer_label_from(uriref)
         if label is None:
@@ -157,21 +503,71 @@ class WikibaseAdapter(TripleStoreManager):
 
         # adding related links
         self._add_related_link_to_entity(entity, uriref.uri)
-
-        return self._try_write(entity, entity_type=uriref.etype,
-                               property_datatype=proptype)
+        return entity
 
     def _create_statement(self, entity: wdi_core.WDItemEngine, predicate: TripleElement,
                           objct: TripleElement) -> wdi_core.WDItemEngine:
-        statement = objct.to_wdi_datatype(prop_nr=predicate.id)
-        data = [statement]
+        data = [self._to_wdi_statement(predicate, objct)]
         entity.update(data=data, append_value=[predicate.id])
         return entity
 
+    def _to_wdi_statement(self, predicate: TripleElement, objct: TripleElement) -> wdi_core.WDBaseDataType:
+        if objct.is_literal():
+            return self._literal_converter.to_wdi_datatype(objct, prop_nr=predicate.id)
+        return objct.to_wdi_datatype(prop_nr=predicate.id)
+
+    def _get_item_engine(self, entity_id: str) -> wdi_core.WDItemEngine:
+        item_data = self._entity_cache.get(entity_id)
+        if item_data is None:
+            with measure(self.metrics, 'wbgetentities'):
+                return self._local_item_engine(entity_id)
+        entity = self._local_item_engine(entity_id, item_data=item_data)
+        bind_base_revision(entity, item_data['lastrevid'])
+        return entity
+
+    @property
+    def _mappings_prop(self) -> str:
+        return self._get_bootstrap_prop('_mappings_prop_id', MAPPINGS_PROP_KEY,
+                                        self._get_or_create_mappings_prop)
+
+    @_mappings_prop.setter
+    def _mappings_prop(self, prop_id: str):
+        self._mappings_prop_id = prop_id
+
+    @property
+    def _related_link_prop(self) -> str:
+        return self._get_bootstrap_prop('_related_link_prop_id', RELATED_LINK_PROP_KEY,
+                                        self._get_or_create_related_link_prop)
+
+    @_related_link_prop.setter
+    def _related_link_prop(self, prop_id: str):
+        self._related_link_prop_id = prop_id
+
+    def _get_bootstrap_prop(self, attr: str, key: str, get_or_create) -> str:
+        prop_id = getattr(self, attr)
+        if prop_id is not None:
+            return prop_id
+        with self._bootstrap_lock:
+            prop_id = getattr(self, attr)
+            if prop_id is None:
+                prop_id = self._bootstrap_cache.get(self.api_url, key)
+                if prop_id is None:
+                    prop_id = get_or_create()
+                    self._bootstrap_cache.set(self.api_url, key, prop_id)
+                setattr(self, attr, prop_id)
+        return prop_id
+
+    def _invalidate_bootstrap_props(self):
+        with self._bootstrap_lock:
+            self._bootstrap_cache.invalidate(self.api_url)
+            self._mappings_prop_id = None
+            self._related_link_prop_id = None
+            self._bootstrap_invalidations += 1
+
     def _get_or_create_mappings_prop(self):
         mappings_prop_id = None
-        query_res = json.loads(requests.get(f"{self.api_url}?action=wbsearchentities" +
-                                            f"&search={MAPPINGS_PROP_LABEL}&format=json&language=en&type=property").text)
+        query_res = self._transport.get(f"{self.api_url}?action=wbsearchentities" +
+                                        f"&search={MAPPINGS_PROP_LABEL}&format=json&language=en&type=property")
         if 'search' in query_res and len(query_res['search']) > 0:
             for search_result in query_res['search']:
                 if search_result['label'] == MAPPINGS_PROP_LABEL and \
@@ -182,18 +578,14 @@ class WikibaseAdapter(TripleStoreManager):
 
         if mappings_prop_id is None:
             logger.info("Mappings property was not found in the wikibase. Creating it...")
-            mappings_item = self._local_item_engine(new_item=True)
-            mappings_item.set_label(MAPPINGS_PROP_LABEL, lang='en')
-            mappings_item.set_description(MAPPINGS_PROP_DESC, lang='en')
-            mappings_prop_id = mappings_item.write(self._local_login, entity_type='property',
-                                                   property_datatype='url')
+            mappings_prop_id = self._create_url_prop(MAPPINGS_PROP_LABEL, MAPPINGS_PROP_DESC)
             logger.info("Mappings property has been created: %s", mappings_prop_id)
         return mappings_prop_id
 
     def _get_or_create_related_link_prop(self):
         rel_link_prop_id = None
-        query_res = json.loads(requests.get(f"{self.api_url}?action=wbsearchentities" +
-                                            f"&search={RELATED_LINK_LABEL}&format=json&language=en&type=property").text)
+        query_res = self._transport.get(f"{self.api_url}?action=wbsearchentities" +
+                                        f"&search={RELATED_LINK_LABEL}&format=json&language=en&type=property")
         if 'search' in query_res and len(query_res['search']) > 0:
             for search_result in query_res['search']:
                 if search_result['label'] == RELATED_LINK_LABEL and \
@@ -204,33 +596,105 @@ class WikibaseAdapter(TripleStoreManager):
 
         if rel_link_prop_id is None:
             logger.info("Related Link property was not found in the wikibase. Creating it...")
-            link_item = self._local_item_engine(new_item=True)
-            link_item.set_label(RELATED_LINK_LABEL, lang='en')
-            link_item.set_description(RELATED_LINK_DESC, lang='en')
-            rel_link_prop_id = link_item.write(self._local_login, entity_type='property',
-                                               property_datatype='url')
+            rel_link_prop_id = self._create_url_prop(RELATED_LINK_LABEL, RELATED_LINK_DESC)
             logger.info("Related Link property has been created: %s", rel_link_prop_id)
         return rel_link_prop_id
 
     def _get_wb_id_of(self, uriref: NonLiteralElement, proptype: str):
-        wb_uri = self._uris_factory.get_uri(uriref) #factory
-        if wb_uri is not None:
-            logging.debug("Id of %s in wikibase: %s", uriref, wb_uri)
-            return wb_uri
-
-        logging.debug("Entity %s doesn't exist in wikibase. Creating it...", uriref)
-        modification_result = self._create_new_wb_item(uriref, proptype)
-        entity_id = modification_result.result
-
-        # update uri factory with new item
-        self._uris_factory.post_uri(uriref, entity_id) #factory
-        return entity_id
+        if uriref.id is not None:
+            # already resolved, interned elements carry their id across triples
+            return uriref.id
+
+        # single flight: concurrent lookups of the same unknown uri wait for its creation
+        with self._uri_creation_lock(uriref.uri):
+            wb_uri = self._uris_factory.get_uri(uriref) #factory
+            if wb_uri is not None:
+                logging.debug("Id of %s in wikibase: %s", uriref, wb_uri)
+                return wb_uri
+
+            logging.debug("Entity %s doesn't exist in wikibase. Creating it...", uriref)
+            invalidations = self._bootstrap_invalidations
+            modification_result = self._create_new_wb_item(uriref, proptype)
+            if not modification_result.successful and self._bootstrap_invalidations != invalidations:
+                # the write dropped the cached ids of deleted bootstrap properties, retry with new ones
+                logger.info("Creating %s again with the bootstrap properties looked up again...", uriref)
+                modification_result = self._create_new_wb_item(uriref, proptype)
+            if not modification_result.successful:
+                # nothing is posted to the factory, so the entity is created again when needed
+                logger.error("Entity of %s could not be created: %s", uriref, modification_result.message)
+                raise EntityCreationError(modification_result.message)
+            entity_id = modification_result.result
+
+            # update uri factory with new item
+            self._uris_factory.post_uri(uriref, entity_id) #factory
+            return entity_id
+
+    @contextmanager
+    def _uri_creation_lock(self, uri: str):
+        with self._creations_lock:
+            lock, waiting = self._creations.get(uri, (threading.Lock(), 0))
+            self._creations[uri] = (lock, waiting + 1)
+        try:
+            with lock:
+                yield
+        finally:
+            with self._creations_lock:
+                lock, waiting = self._creations[uri]
+                if waiting == 1:
+                    del self._creations[uri]
+                else:
+                    self._creations[uri] = (lock, waiting - 1)
 
     def _init_callbacks(self):
         self._create_callbacks = dict(onAlias=self._set_alias, onDesc=self._set_description,
                                       onLabel=self._set_label, onStatement=self._create_statement)
         self._remove_callbacks = dict(onAlias=self._remove_alias, onDesc=self._remove_description,
                                       onLabel=self._remove_label, onStatement=self._remove_statement)
+        # callbacks of the direct writes, applied to an EntityEdit
+        self._edit_create_callbacks = dict(
+            onAlias=lambda edit, objct: edit.add_alias(objct.content, get_lang_from_literal(objct)),
+            onDesc=lambda edit, objct: edit.set_description(objct.content[:MAX_CHARACTERS_DESC],
+                                                            get_lang_from_literal(objct)),
+            onLabel=lambda edit, objct: edit.set_label(objct.content, get_lang_from_literal(objct)),
+            onStatement=lambda edit, predicate, objct: edit.add_claim(self._to_wdi_statement(predicate, objct)))
+        self._edit_remove_callbacks = dict(
+            onAlias=lambda edit, objct: edit.remove_alias(objct.content, get_lang_from_literal(objct)),
+            onDesc=lambda edit, objct: edit.set_description("", get_lang_from_literal(objct)),
+            onLabel=lambda edit, objct: edit.set_label("", get_lang_from_literal(objct)),
+            onStatement=self._remove_claims)
+
+    def _plan_initial_load(self, triples: List[TripleInfo]) -> Tuple[Dict[str, '_PlannedEntity'],
+                                                                      List[TripleInfo]]:
+        new_entities = OrderedDict()
+
+        def plan(element: NonLiteralElement, proptype: str, as_property=False):
+            # resolve_ids already set the ids of every element in the factory
+            if element.id is not None:
+                return None
+            new_entity = new_entities.setdefault(element.uri, _PlannedEntity(element.uri))
+            new_entity.add(element, proptype, as_property)
+            return new_entity
+
+        pending_triples = []
+        for triple in triples:
+            subject, predicate, objct = triple.content
+            new_subject = plan(subject, subject.wdi_proptype)
+            if self.is_wb_term(predicate):
+                if new_subject is not None and triple.isAdded:
+                    new_subject.term_triples.append(triple)
+                else:
+                    pending_triples.append(triple)
+                continue
+
+            if not objct.is_literal():
+                plan(objct, objct.wdi_proptype)
+            try:
+                plan(predicate, objct.wdi_dtype, as_property=True)
+            except NotImplementedError as err:
+                # left for the regular path, which fails before writing anything
+                logger.warning("Property %s can't be planned: %s", predicate, err)
+            pending_triples.append(triple)
+        return new_entities, pending_triples
 
     def _remove_alias(self, entity: wdi_core.WDItemEngine, objct: LiteralElement) -> wdi_core.WDItemEngine:
         lang = get_lang_from_literal(objct)
@@ -263,6 +727,17 @@ class WikibaseAdapter(TripleStoreManager):
         entity.update(data=data)
         return entity
 
+    def _remove_claims(self, edit: EntityEdit, predicate: TripleElement, objct: TripleElement) -> EntityEdit:
+        try:
+            value = self._to_wdi_statement(predicate, objct) \
+                .get_json_representation()['mainsnak']['datavalue']['value']
+        except (ValueError, TypeError, KeyError):
+            logging.warning("Value %s could not be converted. Removing every claim of %s...",
+                            objct, predicate.id)
+            value = None
+        edit.remove_claims(predicate.id, value)
+        return edit
+
     def _set_alias(self, entity: wdi_core.WDItemEngine, objct: LiteralElement) -> wdi_core.WDItemEngine:
         lang = get_lang_from_literal(objct)
         logging.debug("Changing alias @%s of %s", lang, entity)
@@ -283,15 +758,90 @@ class WikibaseAdapter(TripleStoreManager):
 
     def _try_write(self, entity: wdi_core.WDItemEngine, **kwargs) -> ModificationResult:
         try:
+            return self._write(entity, **kwargs)
+        except wdi_core.WDApiError as err:
+            return self._write_error_result(err)
+
+    def _write(self, entity: wdi_core.WDItemEngine, **kwargs) -> ModificationResult:
+        payload_size = json_size(entity.wd_json_representation) if self.metrics is not None else 0
+        with measure(self.metrics, 'wbeditentity', payload_size):
             eid = entity.write(self._local_login, **kwargs)
-            return ModificationResult(successful=True, res=eid)
+        # the entity returned by the write is the latest revision of the entity
+        self._entity_cache.update(eid, entity.wd_json_representation, entity.lastrevid)
+        return ModificationResult(successful=True, res=eid)
+
+    def _write_error_result(self, err: wdi_core.WDApiError) -> ModificationResult:
+        logger.warning(err.wd_error_msg['error'])
+        err_code = err.wd_error_msg['error']['code']
+        msg = err.wd_error_msg['error']['info']
+        if err_code == ERR_CODE_LANGUAGE:
+            logger.warning("Language was not recognized. Skipping it...")
+        elif is_no_such_property_error(err.wd_error_msg):
+            # the cached ids of the bootstrap properties may belong to deleted properties
+            logger.warning("Unknown property. Bootstrap properties will be looked up again...")
+            self._invalidate_bootstrap_props()
+        return ModificationResult(successful=False, message=msg)
+
+    def _write_entity(self, subject: TripleElement, triples: List[TripleInfo],
+                      entity: wdi_core.WDItemEngine = None, added: bool = None) -> ModificationResult:
+        if entity is None and (self._direct_writes or
+                               (self._lightweight_term_edits and self.are_wb_terms(triples))):
+            return self._write_entity_edit(subject, triples, added)
+
+        from_cache = entity is None and subject.id in self._entity_cache
+        if entity is None:
+            entity = self._get_item_engine(subject.id)
+        # the cached state becomes stale with this edit, the write will store the new one
+        self._entity_cache.invalidate(subject.id)
+        for triple in triples:
+            _, predicate, objct = triple.content
+            callbacks = self._create_callbacks if is_added(triple, added) else self._remove_callbacks
+            self._update_entity(entity, predicate, objct, callbacks)
+        try:
+            return self._write(entity, entity_type=subject.etype,
+                               property_datatype=subject.wdi_proptype)
+        except wdi_core.WDApiError as err:
+            if from_cache and err.wd_error_msg['error']['code'] == ERR_CODE_EDIT_CONFLICT:
+                logger.info("Entity %s was modified after it was cached. Fetching it again...", subject.id)
+                return self._write_entity(subject, triples, added=added)
+            return self._write_error_result(err)
+
+    def _write_entity_edit(self, subject: TripleElement, triples: List[TripleInfo],
+                           added: bool = None) -> ModificationResult:
+        edit = EntityEdit(subject.id, subject.etype, subject.wdi_proptype)
+        for triple in triples:
+            _, predicate, objct = triple.content
+            callbacks = self._edit_create_callbacks if is_added(triple, added) else self._edit_remove_callbacks
+            self._update_entity(edit, predicate, objct, callbacks)
+
+        entity_json = self._entity_cache.get(subject.id)
+        from_cache = entity_json is not None
+        if entity_json is None and edit.needs_state:
+            entity_json = self._edit_writer.fetch(subject.id, edit.state_props)
+        try:
+            return self._write_edit(edit, entity_json)
         except wdi_core.WDApiError as err:
-            logger.warning(err.wd_error_msg['error'])
-            err_code = err.wd_error_msg['error']['code']
-            msg = err.wd_error_msg['error']['info']
-            if err_code == ERR_CODE_LANGUAGE:
-                logger.warning("Language was not recognized. Skipping it...")
-            return ModificationResult(successful=False, message=msg)
+            self._entity_cache.invalidate(subject.id)
+            if from_cache and err.wd_error_msg['error']['code'] == ERR_CODE_EDIT_CONFLICT:
+                logger.info("Entity %s was modified after it was cached. Fetching it again...", subject.id)
+                try:
+                    return self._write_edit(edit, self._edit_writer.fetch(subject.id, edit.state_props))
+                except wdi_core.WDApiError as retry_err:
+                    err = retry_err
+            return self._write_error_result(err)
+
+    def _try_write_edit(self, edit: EntityEdit, entity_json: dict = None) -> ModificationResult:
+        try:
+            return self._write_edit(edit, entity_json)
+        except wdi_core.WDApiError as err:
+            return self._write_error_result(err)
+
+    def _write_edit(self, edit: EntityEdit, entity_json: dict = None) -> ModificationResult:
+        entity = self._edit_writer.write(edit, entity_json)
+        if entity is None:
+            return ModificationResult(successful=True, res=edit.entity_id)
+        self._entity_cache.update(entity['id'], entity)
+        return ModificationResult(successful=True, res=entity['id'])
 
     def _update_entity(self, entity: wdi_core.WDItemEngine, predicate: TripleElement,
                        objct: TripleElement, update_callbacks) -> wdi_core.WDItemEngine:
@@ -311,6 +861,16 @@ class WikibaseAdapter(TripleStoreManager):
         predicate.id = self._get_wb_id_of(predicate, objct.wdi_dtype)
         return update_callbacks['onStatement'](entity, predicate, objct)
 
+    @classmethod
+    def are_wb_terms(cls, triples: List[TripleInfo]) -> bool:
+        """ Returns whether every triple corresponds to a label, description or alias in wikibase. """
+        return all(cls.is_wb_term(triple.predicate) for triple in triples)
+
+    @classmethod
+    def is_wb_term(cls, predicate: URIElement) -> bool:
+        """ Returns whether the predicate corresponds to a label, description or alias in wikibase. """
+        return cls.is_wb_label(predicate) or cls.is_wb_description(predicate) or cls.is_wb_alias(predicate)
+
     @classmethod
     def is_wb_alias(cls, predicate: URIElement) -> bool:
         """ Returns whether the predicate corresponds to an alias in wikibase. """
@@ -327,6 +887,55 @@ class WikibaseAdapter(TripleStoreManager):
         return predicate in [RDFS_LABEL, SKOS_PREFLABEL, SCHEMA_NAME]
 
 
+class _PlannedEntity():
+    """ Entity that will be created by the first phase of an initial load.
+
+    Parameters
+    ----------
+    uri : str
+        URI of the entity.
+    """
+
+    def __init__(self, uri: str):
+        self.uri = uri
+        self.elements = []
+        self.etype = 'item'
+        self.proptype = None
+        self.term_triples = []
+
+    def add(self, element: NonLiteralElement, proptype: str, as_property: bool):
+        """ Add an occurrence of the entity, which can be used as a property. """
+        if all(element is not other for other in self.elements):
+            self.elements.append(element)
+        if (as_property or element.etype == 'property') and self.proptype is None:
+            # the datatype is given by the first occurrence of the entity as a property
+            self.etype = 'property'
+            self.proptype = proptype
+
+    def set_id(self, entity_id: str):
+        """ Set the id of the created entity in every occurrence of it. """
+        for element in self.elements:
+            element.id = entity_id
+            element.etype = self.etype
+
+
+def bind_base_revision(entity: wdi_core.WDItemEngine, baserevid: int):
+    """ Make the writes of an entity send the revision its data was read from.
+
+    The wikibase rejects the write with an edit conflict if the entity has been
+    modified after that revision in a way that can't be merged.
+    """
+    api_call = entity.mediawiki_api_call
+
+    def mediawiki_api_call(method, mediawiki_api_url=None, session=None, **kwargs):
+        data = kwargs.get('data')
+        if isinstance(data, dict) and data.get('action') == 'wbeditentity':
+            data['baserevid'] = baserevid
+        return api_call(method, mediawiki_api_url, session=session, **kwargs)
+
+    entity.mediawiki_api_call = mediawiki_api_call
+
+
 def get_lang_from_literal(objct):
     if not hasattr(objct, 'lang') or objct.lang is None:
         logging.warning("Literal %s has no language. Defaulting to '%s'",
@@ -335,6 +944,23 @@ def get_lang_from_literal(objct):
     return objct.lang
 
 
+def json_size(obj) -> int:
+    try:
+        return len(json.dumps(obj).encode('utf-8'))
+    except TypeError:
+        return 0
+
+
+def is_added(triple: TripleInfo, added: bool = None) -> bool:
+    return triple.isAdded if added is None else added
+
+
+def is_no_such_property_error(wd_error_msg: dict) -> bool:
+    error = wd_error_msg['error']
+    return error['code'] == ERR_CODE_NO_SUCH_PROPERTY or \
+        any(message.get('name') == ERR_MSG_NO_SUCH_PROPERTY for message in error.get('messages', []))
+
+
 def is_same_as_activated(uriref: NonLiteralElement, same_as_uris: set) -> bool:
     return uriref.uri in same_as_uris
 
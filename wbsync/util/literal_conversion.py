@@ -0,0 +1,218 @@
+""" Module to convert the typed literals of a synchronization plan to wdi datavalues in batches. """
+
+import datetime
+import logging
+
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Type
+
+from wikidataintegrator import wdi_core
+
+from .mappings import WDTIME_FORMAT, WDTIME_PRECISION, datatype2quantitybounds, \
+                      datatype2wdiclass, parse_wkt_point
+
+try:
+    import pandas as pd
+except ImportError:
+    pd = None
+
+logger = logging.getLogger(__name__)
+
+# date used by strftime when formatting a time without date
+TIME_BASE_DATE = datetime.date(1900, 1, 1)
+
+PreparedValue = Tuple[Type[wdi_core.WDBaseDataType], dict]
+
+
+class LiteralBatchConverter():
+    """ Converts the typed literals of a synchronization plan to wdi datavalues.
+
+    Literals are grouped by datatype and each group is converted in a single pass,
+    formatting date and coordinate columns with pandas when it is available.
+    Quantities are kept as they are, since wdi formats them without losing
+    precision, so they are only validated. The converted values are memoized by
+    datatype and lexical form, so repeated literals are only converted once and
+    only the property of the statement is set when they are used.
+    """
+
+    def __init__(self):
+        self._prepared: Dict[tuple, PreparedValue] = {}
+
+    def convert(self, literals: Iterable) -> None:
+        """ Convert and memoize the values of the given literals.
+
+        Parameters
+        ----------
+        literals : iterable of :obj:`LiteralElement`
+            Literals to be converted. Language tagged and untyped literals are ignored.
+        """
+        groups = defaultdict(dict)
+        for literal in literals:
+            key = _literal_key(literal)
+            if key is not None and key not in self._prepared:
+                groups[key[0]].setdefault(key[1], literal.content)
+
+        for datatype, contents in groups.items():
+            if datatype not in datatype2converter:
+                continue
+            wdi_class = datatype2wdiclass[datatype]
+            for lexical_form, values in zip(contents, _convert_group(datatype, list(contents.values()))):
+                if values is not None:
+                    self._prepared[(datatype, lexical_form)] = (wdi_class, values)
+
+    def to_wdi_datatype(self, literal, **kwargs) -> wdi_core.WDBaseDataType:
+        """ Return the wdi instance of a literal, using its memoized value if present.
+
+        Parameters
+        ----------
+        literal : :obj:`LiteralElement`
+            Literal to be converted.
+        kwargs
+            Additional arguments of the wdi datatype, like the prop_nr of the statement.
+
+        Returns
+        -------
+        :obj:`wikidataintegrator.wdi_core.WDBaseDataType`
+            Instance of a wdi datatype that represents the literal.
+        """
+        key = _literal_key(literal)
+        prepared = self._prepared.get(key) if key is not None else None
+        if prepared is None:
+            return literal.to_wdi_datatype(**kwargs)
+        wdi_class, values = prepared
+        return wdi_class(**values, **kwargs)
+
+    def __contains__(self, literal):
+        key = _literal_key(literal)
+        return key is not None and key in self._prepared
+
+    def __len__(self):
+        return len(self._prepared)
+
+
+def _literal_key(literal) -> Optional[Tuple[str, str]]:
+    # equal values with different lexical forms, like 1.1 and 1.10 or the same instant
+    # in two timezones, may be converted to different datavalues
+    if literal.lang or not literal.datatype:
+        return None
+    lexical_form = literal.lexical_form if literal.lexical_form is not None else str(literal.content)
+    return str(literal.datatype), lexical_form
+
+
+def _convert_group(datatype: str, contents: list) -> List[Optional[dict]]:
+    converter = datatype2converter[datatype]
+    if pd is not None:
+        try:
+            return converter(datatype, contents)
+        except (ValueError, TypeError, OverflowError) as err:
+            logger.debug("Vectorized conversion of %s failed (%s), converting values one by one",
+                         datatype, err)
+    return [_convert_one(datatype, content) for content in contents]
+
+
+def _convert_one(datatype: str, content) -> Optional[dict]:
+    # values that can't be converted are left to the wdi object constructors,
+    # which will report the error when the statement is created
+    try:
+        return datatype2valueconverter[datatype](datatype, content)
+    except (ValueError, TypeError, AttributeError, OverflowError):
+        return None
+
+
+def _geo_values(_, content) -> dict:
+    latitude, longitude, precision = parse_wkt_point(content)
+    return dict(latitude=latitude, longitude=longitude, precision=precision)
+
+
+def _quantity_values(datatype: str, content) -> dict:
+    if isinstance(content, bool) or not isinstance(content, (str, int, float, Decimal)):
+        raise TypeError(f"{content!r} is not a number")
+    if isinstance(content, str):
+        # textual numbers are kept as they are, so no precision is lost
+        try:
+            number = Decimal(content)
+        except InvalidOperation:
+            raise ValueError(f"{content!r} is not a number")
+        if not number.is_finite():
+            raise ValueError(f"{content!r} is not a finite number")
+    return dict(value=content, **datatype2quantitybounds.get(datatype, {}))
+
+
+def _string_values(_, content) -> dict:
+    return dict(value=content)
+
+
+def _time_values(_, content) -> dict:
+    return dict(time=content.strftime(WDTIME_FORMAT), precision=WDTIME_PRECISION)
+
+
+def _convert_geo_group(datatype: str, contents: list) -> List[Optional[dict]]:
+    coordinates = pd.Series(contents, dtype=object).str.slice(5).str.strip('()') \
+                    .str.split(" ", expand=True)
+    if coordinates.shape[1] != 2 or coordinates.isna().any().any():
+        raise ValueError("Invalid point representation")
+    latitudes = pd.to_numeric(coordinates[0]).tolist()
+    longitudes = pd.to_numeric(coordinates[1]).tolist()
+    precisions = pd.concat([coordinates[0].str[::-1].str.find('.'),
+                            coordinates[1].str[::-1].str.find('.')], axis=1).max(axis=1).tolist()
+    return [dict(latitude=latitude, longitude=longitude, precision=int(precision))
+            for latitude, longitude, precision in zip(latitudes, longitudes, precisions)]
+
+
+def _convert_quantity_group(datatype: str, contents: list) -> List[Optional[dict]]:
+    # parsing the numbers as floats would lose the precision of decimals, and wdi
+    # formats them itself, so they are only validated
+    return [_convert_one(datatype, content) for content in contents]
+
+
+def _convert_time_group(datatype: str, contents: list) -> List[Optional[dict]]:
+    positions = []
+    timestamps = []
+    for i, content in enumerate(contents):
+        if isinstance(content, datetime.time):
+            content = datetime.datetime.combine(TIME_BASE_DATE, content)
+        if isinstance(content, datetime.date):
+            # strftime formats the wall time of aware datetimes
+            if isinstance(content, datetime.datetime) and content.tzinfo is not None:
+                content = content.replace(tzinfo=None)
+            positions.append(i)
+            timestamps.append(content)
+
+    values = [None] * len(contents)
+    if timestamps:
+        formatted = pd.to_datetime(pd.Series(timestamps, dtype=object)).dt.strftime(WDTIME_FORMAT)
+        for position, time in zip(positions, formatted.tolist()):
+            values[position] = dict(time=time, precision=WDTIME_PRECISION)
+    return values
+
+
+def _convert_string_group(_, contents: list) -> List[Optional[dict]]:
+    return [dict(value=content) for content in contents]
+
+
+def _datatypes_of(wdi_class: Type[wdi_core.WDBaseDataType]) -> List[str]:
+    return [datatype for datatype, cls in datatype2wdiclass.items() if cls == wdi_class]
+
+
+def _table_for(converters: Dict[Type[wdi_core.WDBaseDataType], Callable]) -> Dict[str, Callable]:
+    return {datatype: converter
+            for wdi_class, converter in converters.items()
+            for datatype in _datatypes_of(wdi_class)}
+
+
+# Converts every literal of a datatype group in a single pass
+datatype2converter = _table_for({
+    wdi_core.WDGlobeCoordinate: _convert_geo_group,
+    wdi_core.WDQuantity: _convert_quantity_group,
+    wdi_core.WDString: _convert_string_group,
+    wdi_core.WDTime: _convert_time_group
+})
+
+# Converts a single literal of a datatype
+datatype2valueconverter = _table_for({
+    wdi_core.WDGlobeCoordinate: _geo_values,
+    wdi_core.WDQuantity: _quantity_values,
+    wdi_core.WDString: _string_values,
+    wdi_core.WDTime: _time_values
+})
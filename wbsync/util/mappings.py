@@ -3,17 +3,25 @@
 import datetime
 
 from functools import partial
-from typing import Union
+from typing import Tuple, Union
 
 from wikidataintegrator import wdi_core
 
 from .uri_constants import ASIO_BASE, GEO_BASE, XSD_BASE
 
-def create_geo_coordinate_from(content: str, **kwargs) -> wdi_core.WDGlobeCoordinate:
-    """ Create a WDGlobecoordinate object from the point representation in a str. """
+WDTIME_FORMAT = "+%Y-%m-%dT%H:%M:%SZ"
+WDTIME_PRECISION = 11
+
+def parse_wkt_point(content: str) -> Tuple[float, float, int]:
+    """ Parse the point representation in a str into its latitude, longitude and precision. """
     latitude, longitude = content[5:].strip('()').split(" ")
     precision = max(latitude[::-1].find('.'), longitude[::-1].find('.'))
-    return wdi_core.WDGlobeCoordinate(float(latitude), float(longitude), precision, **kwargs)
+    return float(latitude), float(longitude), precision
+
+def create_geo_coordinate_from(content: str, **kwargs) -> wdi_core.WDGlobeCoordinate:
+    """ Create a WDGlobecoordinate object from the point representation in a str. """
+    latitude, longitude, precision = parse_wkt_point(content)
+    return wdi_core.WDGlobeCoordinate(latitude, longitude, precision, **kwargs)
 
 def create_wdquantity(content, upper_bound=None, lower_bound=None, **kwargs) -> wdi_core.WDQuantity:
     """ Create a WDQantity object from a number value and its bounds. """
@@ -35,7 +43,14 @@ def create_wdstring(content: str, **kwargs) -> wdi_core.WDString:
 def create_wdtime(content: Union[datetime.date, datetime.datetime, datetime.time],
                   **kwargs) -> wdi_core.WDTime:
     """ Create a WDTime object from a given datetime object. """
-    return wdi_core.WDTime(content.strftime("+%Y-%m-%dT%H:%M:%SZ"), precision=11, **kwargs)
+    return wdi_core.WDTime(content.strftime(WDTIME_FORMAT), precision=WDTIME_PRECISION, **kwargs)
+
+# Bounds of the quantities of each numeric datatype
+datatype2quantitybounds = {
+    f"{XSD_BASE}negativeInteger": dict(upper_bound=0),
+    f"{XSD_BASE}nonNegativeInteger": dict(lower_bound=0),
+    f"{XSD_BASE}positiveInteger": dict(lower_bound=1)
+}
 
 # Creates a wdi object from the given datatype
 datatype2wdiobject = {
@@ -48,16 +63,40 @@ datatype2wdiobject = {
     f"{XSD_BASE}int": create_wdquantity,
     f"{XSD_BASE}integer": create_wdquantity,
     f"{XSD_BASE}long": create_wdquantity,
-    f"{XSD_BASE}negativeInteger": partial(create_wdquantity, upper_bound=0),
-    f"{XSD_BASE}nonNegativeInteger": partial(create_wdquantity, lower_bound=0),
+    f"{XSD_BASE}negativeInteger": partial(create_wdquantity,
+                                          **datatype2quantitybounds[f"{XSD_BASE}negativeInteger"]),
+    f"{XSD_BASE}nonNegativeInteger": partial(create_wdquantity,
+                                             **datatype2quantitybounds[f"{XSD_BASE}nonNegativeInteger"]),
     f"{XSD_BASE}normalizedString": create_wdstring,
-    f"{XSD_BASE}positiveInteger": partial(create_wdquantity, lower_bound=1),
+    f"{XSD_BASE}positiveInteger": partial(create_wdquantity,
+                                          **datatype2quantitybounds[f"{XSD_BASE}positiveInteger"]),
     f"{XSD_BASE}short": create_wdquantity,
     f"{XSD_BASE}string": create_wdstring,
     f"{XSD_BASE}time": create_wdtime,
     f"{XSD_BASE}token": create_wdstring
 }
 
+# Converts a datatype to the wdi class created by datatype2wdiobject. Booleans are left out until
+# create_wditemid_from_bool is implemented
+datatype2wdiclass = {
+    f"{GEO_BASE}wktLiteral": wdi_core.WDGlobeCoordinate,
+    f"{XSD_BASE}date": wdi_core.WDTime,
+    f"{XSD_BASE}dateTime": wdi_core.WDTime,
+    f"{XSD_BASE}decimal": wdi_core.WDQuantity,
+    f"{XSD_BASE}double": wdi_core.WDQuantity,
+    f"{XSD_BASE}int": wdi_core.WDQuantity,
+    f"{XSD_BASE}integer": wdi_core.WDQuantity,
+    f"{XSD_BASE}long": wdi_core.WDQuantity,
+    f"{XSD_BASE}negativeInteger": wdi_core.WDQuantity,
+    f"{XSD_BASE}nonNegativeInteger": wdi_core.WDQuantity,
+    f"{XSD_BASE}normalizedString": wdi_core.WDString,
+    f"{XSD_BASE}positiveInteger": wdi_core.WDQuantity,
+    f"{XSD_BASE}short": wdi_core.WDQuantity,
+    f"{XSD_BASE}string": wdi_core.WDString,
+    f"{XSD_BASE}time": wdi_core.WDTime,
+    f"{XSD_BASE}token": wdi_core.WDString
+}
+
 # Converts a datatype to a wdi DTYPE string
 datatype2wdidtype = {
     f"{ASIO_BASE}item": 'wikibase-item',